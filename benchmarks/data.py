@@ -0,0 +1,43 @@
+"""Deterministic synthetic workdays for the benchmarks.
+
+The same arguments always give the same rows, loaded through the regular
+importer so the benchmark databases look like real ones.
+"""
+import os
+import sys
+import json
+import random
+from io import StringIO
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import stamp # NOQA
+from stamp.db import Database # NOQA
+from stamp.importer import import_workdays # NOQA
+
+FIRST_DAY = datetime(2015, 1, 1)
+
+
+def workday_lines(workdays, customers=10, projects=3, tags=1, seed=0, first_day=FIRST_DAY):
+    """JSON Lines workdays, one per customer per day going forward from first_day."""
+    rng = random.Random(seed)
+    for number in range(workdays):
+        day, customer = divmod(number, customers)
+        start = first_day + timedelta(days=day, hours=7, minutes=rng.randrange(0, 120, 15))
+        end = start + timedelta(minutes=rng.randrange(240, 600, 15))
+        yield json.dumps({'customer': 'Benchmark Company %d' % customer,
+                          'project': 'Benchmark Project %d' % rng.randrange(projects),
+                          'start': start.isoformat(' '),
+                          'end': end.isoformat(' '),
+                          'tags': ['Task %d.%d' % (number, tag) for tag in range(tags)]})
+
+
+def create_database(db_file, workdays, **kwargs):
+    db = Database(db_file, ask=False)
+    with redirect_stdout(StringIO()):
+        import_workdays(db, StringIO('\n'.join(workday_lines(workdays, **kwargs))), 'jsonl',
+                        batch_size=20000)
+    db.commit()
+    return db
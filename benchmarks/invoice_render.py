@@ -0,0 +1,64 @@
+"""Per invoice cost of rendering many invoice PDFs back to back.
+
+Reports the one off cost of preparing an InvoiceRenderer and the cost of
+each invoice rendered with it, the way export --all-customers renders.
+
+    python benchmarks/invoice_render.py --invoices 40 --days 20
+"""
+import os
+import argparse
+from io import StringIO
+from time import perf_counter
+from tempfile import TemporaryDirectory
+from contextlib import redirect_stdout
+
+from data import create_database
+
+from stamp.config import Config # NOQA
+from stamp.export import InvoiceRenderer, export_all_invoices # NOQA
+
+
+def time_setup(config, rounds=20):
+    started = perf_counter()
+    for _ in range(rounds):
+        InvoiceRenderer(config)
+    return (perf_counter() - started) / rounds
+
+
+def time_batch(invoices, save_dir, renderer):
+    started = perf_counter()
+    for invoice in invoices:
+        renderer.render(invoice.workdays, save_dir, invoice.id)
+    return (perf_counter() - started) / len(invoices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--invoices', type=int, default=40)
+    parser.add_argument('--days', type=int, default=20, help='Workdays per invoice')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    config = Config(None)
+    with TemporaryDirectory() as tmp:
+        db = create_database(os.path.join(tmp, 'benchmark.db'), args.invoices * args.days,
+                             customers=args.invoices, tags=2)
+        with redirect_stdout(StringIO()):
+            export_all_invoices(db, 2015, 'jan', config)
+        invoices = db.get('Invoice').all()
+        for invoice in invoices:
+            # Load everything up front so only rendering is timed
+            [(w.customer, w.project, w.invoice, w.tags) for w in invoice.workdays]
+
+        setup = time_setup(config)
+        renderer = InvoiceRenderer(config)
+        per_invoice = min(time_batch(invoices, tmp, renderer) for _ in range(args.rounds))
+        db.session.close()
+
+    print('%d invoices, %d workdays each' % (args.invoices, args.days))
+    print('renderer setup: %.2f ms (once per process)' % (setup * 1000))
+    print('render:         %.1f ms/invoice' % (per_invoice * 1000))
+
+
+if __name__ == '__main__':
+    main()
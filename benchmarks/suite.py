@@ -0,0 +1,244 @@
+"""Times the main commands against generated databases of several sizes.
+
+Each size gets a database of that many workdays from data.py, with tags
+and invoices for the first months, and every operation is timed over a
+few rounds starting from an empty session like a new invocation would.
+Results are written as JSON so runs on different commits can be compared.
+
+    python benchmarks/suite.py --sizes 1000 100000 1000000
+    python benchmarks/suite.py --compare results/old.json results/new.json
+
+Generated databases are kept in --data-dir when it is given, generating
+the 1M workday database takes a few minutes.
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+from io import StringIO
+from time import perf_counter
+from tempfile import mkdtemp
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+from data import FIRST_DAY, create_database
+
+from stamp.db import Database # NOQA
+from stamp.add import new_stamp # NOQA
+from stamp.end import end_stamp # NOQA
+from stamp.tag import tag_stamp # NOQA
+from stamp.config import Config # NOQA
+from stamp.status import Status # NOQA
+from stamp.mappings import Invoice, Workday # NOQA
+from stamp.helpers import get_month_names # NOQA
+from stamp.search import search_tags # NOQA
+from stamp.export import export_invoice, export_all_invoices, create_pdf # NOQA
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SIZES = (1000, 100000, 1000000)
+STATUS_ROWS = 1000
+# Stamps made by the benchmark, after every generated workday
+CYCLE_START = datetime(2200, 1, 1, 8)
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCHMARK_DIR, check=True,
+                                  stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                  universal_newlines=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    cwd=BENCHMARK_DIR, stdout=subprocess.PIPE,
+                                    universal_newlines=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return revision, dirty
+
+
+def invoice_months(workdays, customers, months):
+    """(year, month name) of the first months that have workdays."""
+    last_day = FIRST_DAY + timedelta(days=(workdays - 1) // customers)
+    names = get_month_names()
+    result = []
+    day = FIRST_DAY
+    while day <= last_day and len(result) < months:
+        result.append((day.year, names[day.month - 1]))
+        day = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return result
+
+
+def database(data_dir, size, customers, projects, tags, months, config):
+    """Path of a database with size workdays, generated unless data_dir has it."""
+    db_file = os.path.join(data_dir, 'benchmark_%d_%d_%d_%d_%d.db' % (size, customers, projects,
+                                                                    tags, months))
+    if os.path.isfile(db_file):
+        return db_file, None
+    started = perf_counter()
+    db = create_database(db_file + '.partial', size, customers=customers, projects=projects,
+                         tags=tags)
+    with redirect_stdout(StringIO()):
+        for year, month in invoice_months(size, customers, months):
+            export_all_invoices(db, year, month, config)
+    db.commit()
+    db.session.close()
+    # Everything into the main file so it can be renamed on its own
+    db.engine.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    db.engine.dispose()
+    for suffix in ('-wal', '-shm'):
+        if os.path.isfile(db_file + '.partial' + suffix):
+            os.remove(db_file + '.partial' + suffix)
+    os.rename(db_file + '.partial', db_file)
+    return db_file, perf_counter() - started
+
+
+def timed(db, rounds, function, *args, **kwargs):
+    """Milliseconds per round of function, each round from an empty session."""
+    times = []
+    for _ in range(rounds):
+        db.session.close()
+        db.names = None
+        with redirect_stdout(StringIO()):
+            started = perf_counter()
+            function(*args, **kwargs)
+            times.append((perf_counter() - started) * 1000)
+    return {'rounds': rounds,
+            'min_ms': round(min(times), 3),
+            'median_ms': round(statistics.median(times), 3)}
+
+
+def stamp_cycle(db, rounds):
+    """Times of stamping in, tagging and stamping out, committed like the commands."""
+    times = {'new_stamp': [], 'tag_stamp': [], 'end_stamp': []}
+    start = CYCLE_START
+    for number in range(rounds):
+        steps = (('new_stamp', lambda: new_stamp(db, 'Benchmark Company 0', 'Benchmark Project 0',
+                                                 start.date(), start.time(), ask=False)),
+                 ('tag_stamp', lambda: tag_stamp(db, start.date(), start.time(),
+                                                 db.current_stamp(), 'Benchmark tag')),
+                 ('end_stamp', lambda: end_stamp(db, start.date(), (start + timedelta(hours=8)).time())))
+        for name, step in steps:
+            db.session.close()
+            db.names = None
+            with redirect_stdout(StringIO()):
+                started = perf_counter()
+                step()
+                db.commit()
+                times[name].append((perf_counter() - started) * 1000)
+        start += timedelta(days=1)
+    # Kept databases stay the same between runs
+    for workday in db.session.query(Workday).filter(Workday.start >= CYCLE_START):
+        db.session.delete(workday)
+    db.commit()
+    return {name: {'rounds': rounds,
+                   'min_ms': round(min(values), 3),
+                   'median_ms': round(statistics.median(values), 3)}
+            for name, values in times.items()}
+
+
+def write_status(db, config, query):
+    Status(query, config).write(StringIO())
+
+
+def run_size(db_file, size, customers, config, rounds, pdf_dir):
+    db = Database(db_file, ask=False)
+    last_day = (FIRST_DAY + timedelta(days=(size - 1) // customers)).date()
+    year, month = invoice_months(size, customers, 1)[0]
+    results = {}
+    results['status_workdays'] = timed(
+        db, rounds, lambda: write_status(db, config, db.filter_workdays(
+            db.get('Workday', eager=True), since=last_day - timedelta(days=STATUS_ROWS // customers))))
+    results['status_invoices'] = timed(
+        db, rounds, lambda: write_status(db, config, db.get('Invoice', eager=True)))
+    # Generated tags are 'Task <workday>.<tag>', so this matches every tag
+    results['search_tags'] = timed(db, rounds, search_tags, db, 'task')
+    results['search_tags_date'] = timed(db, rounds, search_tags, db, 'task', order='date')
+    results['export_invoice'] = timed(db, rounds, export_invoice, db, year, month,
+                                      'Benchmark Company 0', None, config, ask=False)
+    results['create_pdf'] = timed(
+        db, rounds, lambda: create_pdf(db.session.query(Invoice).order_by(Invoice.id).first().workdays,
+                                       pdf_dir, config))
+    results.update(stamp_cycle(db, rounds))
+    db.session.close()
+    return results
+
+
+def compare(old_file, new_file):
+    with open(old_file) as old_results, open(new_file) as new_results:
+        old, new = json.load(old_results), json.load(new_results)
+    print('%-10s %-18s %12s %12s %8s' % ('size', 'operation', 'old ms', 'new ms', 'ratio'))
+    for size, operations in new['results'].items():
+        for operation, result in operations.items():
+            if not isinstance(result, dict):
+                continue
+            previous = old['results'].get(size, {}).get(operation)
+            if previous:
+                print('%-10s %-18s %12.2f %12.2f %7.2fx' % (
+                    size, operation, previous['median_ms'], result['median_ms'],
+                    result['median_ms'] / previous['median_ms']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Workdays per database')
+    parser.add_argument('--customers', type=int, default=20)
+    parser.add_argument('--projects', type=int, default=5, help='Projects per customer')
+    parser.add_argument('--tags', type=int, default=2, help='Tags per workday')
+    parser.add_argument('--invoice-months', type=int, default=24,
+                        help='Months that get an invoice for every customer')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--data-dir', help='Keep generated databases here and reuse them')
+    parser.add_argument('--output', help='Result file, default is results/<commit>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='Print the change between two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    revision, dirty = git_revision()
+    output = args.output or os.path.join(BENCHMARK_DIR, 'results', '%s%s.json' % (
+        (revision or 'unknown')[:12], '-dirty' if dirty else ''))
+    data_dir = args.data_dir or mkdtemp()
+    os.makedirs(data_dir, exist_ok=True)
+    pdf_dir = mkdtemp()
+    config = Config(None)
+    results = {}
+    try:
+        for size in args.sizes:
+            db_file, generated = database(data_dir, size, args.customers, args.projects, args.tags,
+                                          args.invoice_months, config)
+            print('%d workdays%s' % (size, ' generated in %.1f s' % generated if generated else ''),
+                  file=sys.stderr)
+            results[str(size)] = run_size(db_file, size, args.customers, config, args.rounds, pdf_dir)
+            for operation, result in results[str(size)].items():
+                print('  %-18s %10.2f ms' % (operation, result['median_ms']), file=sys.stderr)
+            if not args.data_dir:
+                os.remove(db_file)
+    finally:
+        shutil.rmtree(pdf_dir)
+        if not args.data_dir:
+            shutil.rmtree(data_dir)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump({'commit': revision,
+                   'dirty': dirty,
+                   'created': datetime.now().isoformat(timespec='seconds'),
+                   'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'parameters': {'customers': args.customers,
+                                  'projects': args.projects,
+                                  'tags': args.tags,
+                                  'invoice_months': args.invoice_months,
+                                  'rounds': args.rounds},
+                   'results': results}, output_file, indent=2)
+        output_file.write('\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Monthly totals over a long history, WorkdayFrame against ORM objects.
+
+    python benchmarks/workday_frame.py --workdays 1000000
+"""
+import os
+import argparse
+from time import perf_counter
+from tempfile import TemporaryDirectory
+from collections import defaultdict
+
+from data import create_database
+
+from stamp.helpers import calculate_workhours # NOQA
+from stamp.mappings import Workday # NOQA
+
+
+def orm_monthly_hours(db):
+    hours = defaultdict(float)
+    for workday in db.session.query(Workday).filter(Workday.end.isnot(None)).yield_per(5000):
+        hours[workday.start.strftime('%Y-%m')] += calculate_workhours(workday.start, workday.end)
+    return hours
+
+
+def frame_monthly_hours(db):
+    return {month: seconds / 3600
+            for month, seconds, workdays in db.load_workday_frame().group_by('month')}
+
+
+def timed(function, *args):
+    started = perf_counter()
+    result = function(*args)
+    return perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workdays', type=int, default=1000000)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp:
+        started = perf_counter()
+        db = create_database(os.path.join(tmp, 'benchmark.db'), args.workdays, tags=0)
+        print('%d workdays generated in %.1f s' % (args.workdays, perf_counter() - started))
+
+        orm_time, orm_hours = timed(orm_monthly_hours, db)
+        db.session.expunge_all()
+        frame_time, frame_hours = timed(frame_monthly_hours, db)
+        load_time, frame = timed(db.load_workday_frame)
+        group_time, _ = timed(frame.group_by, 'month')
+        db.session.close()
+
+    assert orm_hours.keys() == frame_hours.keys()
+    assert all(abs(orm_hours[month] - frame_hours[month]) < 1e-6 for month in orm_hours)
+    print('ORM objects:  %.2f s' % orm_time)
+    print('WorkdayFrame: %.2f s (load %.2f s, group by month %.3f s)' % (frame_time, load_time, group_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -82,10 +82,15 @@ setup(
     keywords='work hours time log register stamp',
     python_requires='>=3',
     install_requires=install_requires,
+    extras_require={
+        # WorkdayFrame in stamp/frame.py
+        'analytics': ['numpy'],
+    },
     packages=find_packages(exclude=['tests', 'locale']),
     entry_points={
         'console_scripts': [
             'stamp = stamp.stamp:run',
+            'stampd = stamp.daemon:main',
         ]
     }
 )
@@ -65,9 +65,13 @@ def create_invoice(db, workdays, customer, year, month):
     if isinstance(db, str):
         db = Database(db)
 
-    customer = db.get('Customer').filter(Customer.name == customer).first()
+    customer = db.get_by_name(Customer, customer)
 
-    invoice = Invoice(workdays=workdays.all(),
+    workdays = workdays.all()
+    for workday in workdays:
+        workday.invoiced_start = workday.start
+        workday.invoiced_end = workday.end
+    invoice = Invoice(workdays=workdays,
                       customer_id=customer.id,
                       year=year,
                       month=month,
@@ -81,7 +85,7 @@ def create_invoice(db, workdays, customer, year, month):
 def new_stamp(db, customer, project, date, time, ask=True):
     try:
         if customer:
-            customer_query = db.get('Customer').filter(Customer.name == customer).first()
+            customer_query = db.get_by_name(Customer, customer)
         else:
             customer_query = db.get_last_workday_entry('customer')
     except NoMatchingDatabaseEntryError:
@@ -98,7 +102,7 @@ def new_stamp(db, customer, project, date, time, ask=True):
     # Validate project
     try:
         if project:
-            project_query = db.get('Project').filter(Project.name == project).first()
+            project_query = db.get_by_name(Project, project, customer_query.id)
         else:
             project_query = db.get_last_workday_entry('project')
     except NoMatchingDatabaseEntryError:
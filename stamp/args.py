@@ -1,18 +1,41 @@
 import argparse
 import os
+from datetime import datetime
+from functools import lru_cache
 
 from . import __version__
 from .args_helpers import *
-from .main import stamp_in, stamp_out, tag, status, export, delete, edit, config
+from .main import stamp_in, stamp_out, tag, status, export, delete, edit, config, import_hours, dump, report, search
 from .exceptions import RequiredValueError
 from .config import Config
 from .constants import DATA_DIR, DB_FILE, CONFIG_DIR, CONFIG_FILE
 
 __all__ = ['parse']
 
-settings = Config(None)
+CONFIG_COMMANDS = ('config', 'c')
+# Main parser options followed by a value, which is not the subcommand
+VALUE_OPTIONS = ('--db', '--config', '--profile-output')
+
+
+def _config_requested(args):
+    # The config edit options are generated from every config value, only
+    # build them when the subcommand is config
+    args = iter(args)
+    for arg in args:
+        if arg in VALUE_OPTIONS:
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg in CONFIG_COMMANDS
+    return False
+
 
 def parse(args):
+    return resolve_now(build_parser(_config_requested(args)).parse_args(args))
+
+
+@lru_cache(maxsize=None)
+def build_parser(config_options=False):
+    """The argument parser, built once per process."""
     # [Main parser]
     main_parser = argparse.ArgumentParser(description='''Register work hours.
                                           Hours get automatically sorted by date, and
@@ -23,6 +46,11 @@ def parse(args):
                              help='Display current version.')
     main_parser.add_argument('--db', action=DbAction)
     main_parser.add_argument('--config', action=ConfigAction)
+    main_parser.add_argument('--profile', action='store_true',
+                             help='''Show the time spent per phase, the SQL statements and
+                             the slowest functions of the command on stderr.''')
+    main_parser.add_argument('--profile-output', type=str, metavar='FILE',
+                             help='Write the profile to FILE as JSON instead.')
 
     # [Parent paramaters]
 
@@ -38,6 +66,17 @@ def parse(args):
     filter_parameters.add_argument('--time_from')
     filter_parameters.add_argument('--time_to')
 
+    # Date and time filters applied by report and search
+    workday_filter_parameters = argparse.ArgumentParser(add_help=False)
+    workday_filter_parameters.add_argument('--date_from', action=DateAction, default=None,
+                                           help='Only include workdays started on or after this date.')
+    workday_filter_parameters.add_argument('--date_to', action=DateAction, default=None,
+                                           help='Only include workdays started on or before this date.')
+    workday_filter_parameters.add_argument('--time_from', action=TimeAction, default=None,
+                                           help='Only include workdays started at or after this time of day.')
+    workday_filter_parameters.add_argument('--time_to', action=TimeAction, default=None,
+                                           help='Only include workdays ended at or before this time of day.')
+
     # Company parameters
     customer_parameters = argparse.ArgumentParser(add_help=False)
     customer_parameters.add_argument('-c', '--customer', action=FromEnvAction,
@@ -87,6 +126,16 @@ def parse(args):
                                                parents=[filter_parameters,
                                                         customer_parameters,
                                                         project_parameters])
+    status_parser.add_argument('--format', choices=('text', 'json'), default='text',
+                               help='Output format of the current stamp.')
+    status_parser.add_argument('--watch', action='store_true',
+                               help='''Keep running and print the current stamp again
+                               whenever it changes.''')
+    status_parser.add_argument('--interval', type=float, default=1.0,
+                               help='Seconds between checks for changes with --watch.')
+    status_parser.add_argument('--sidecar', type=str,
+                               help='''With --watch, also keep the last printed line in this
+                               file for shell prompts to read.''')
     status_parser.set_defaults(func=status, parser_object=status_parser.prog)
 
     status_subparsers = status_parser.add_subparsers()
@@ -95,28 +144,141 @@ def parse(args):
                                                           help='Show status of workdays.',
                                                           parents=[date_parameters])
     status_workdays_parser.add_argument('id', type=int, nargs='?')
+    status_workdays_parser.add_argument('--limit', type=int,
+                                        help='Show at most this many workdays.')
+    status_workdays_parser.add_argument('--offset', type=int,
+                                        help='Skip this many workdays before showing any.')
+    status_workdays_parser.add_argument('--after', type=int,
+                                        help='''Only show workdays after the workday with this id,
+                                        unlike --offset this is just as fast far into the history.''')
+    status_workdays_parser.add_argument('--since', action=DateAction, default=None,
+                                        help='Only show workdays started on or after this date.')
+    status_workdays_parser.add_argument('--until', action=DateAction, default=None,
+                                        help='Only show workdays started on or before this date.')
+    status_workdays_parser.add_argument('--pager', action='store_true',
+                                        help='Show output in $PAGER.')
     status_workdays_parser.set_defaults(func=status, parser_object=status_workdays_parser.prog)
 
     status_invoices_parser = status_subparsers.add_parser('invoices', aliases=['i'],
                                                           help='Show status of invoices.',
                                                           parents=[date_parameters])
     status_invoices_parser.add_argument('id', type=int, nargs='?')
+    status_invoices_parser.add_argument('--pager', action='store_true',
+                                        help='Show output in $PAGER.')
     status_invoices_parser.set_defaults(func=status, parser_object=status_invoices_parser.prog)
 
 
+    status_summary_parser = status_subparsers.add_parser('summary', aliases=['sum'],
+                                                         help='Show hours per customer, project or month for a year.')
+    status_summary_parser.add_argument('-y', '--year', type=int, default=Now(lambda: datetime.now().year),
+                                       help='Year to summarize, default is this year.')
+    status_summary_parser.add_argument('-b', '--by', choices=('customer', 'project', 'month'),
+                                       default='customer', help='What to group the hours by.')
+    status_summary_parser.add_argument('--rebuild', action='store_true',
+                                       help='Recompute the monthly totals from every workday first.')
+    status_summary_parser.set_defaults(func=status, parser_object=status_summary_parser.prog)
+
+
+    # Report parser
+    report_parser = main_subparsers.add_parser('report', aliases=['r'],
+                                               help='Show hours per period and customer, project, invoice or paid state.',
+                                               parents=[workday_filter_parameters,
+                                                        customer_parameters,
+                                                        project_parameters])
+    report_parser.add_argument('--per', choices=('day', 'week', 'month', 'year'), default='month',
+                               help='Period to total the hours by.')
+    report_parser.add_argument('-b', '--by', choices=('customer', 'project', 'invoice', 'paid'),
+                               default='customer', help='What to group the hours by within each period.')
+    report_parser.add_argument('--pager', action='store_true',
+                               help='Show output in $PAGER.')
+    report_parser.set_defaults(func=report)
+
+
+    # Search parser
+    search_parser = main_subparsers.add_parser('search', aliases=['f'],
+                                               help='Find tags containing words.',
+                                               parents=[workday_filter_parameters,
+                                                        customer_parameters,
+                                                        project_parameters])
+    search_parser.add_argument('query', type=str, nargs='*',
+                               help='''Words that all have to be in the tag, end a word
+                               with * to match words starting with it.''')
+    search_parser.add_argument('--sort', choices=('rank', 'date'), default='rank',
+                               help='Best matches first, or newest workdays first.')
+    search_parser.add_argument('--limit', type=int, default=20,
+                               help='Show at most this many tags.')
+    search_parser.add_argument('--raw', action='store_true',
+                               help='''Pass the query to SQLite FTS5 as it is, for OR, NOT,
+                               NEAR and phrase searches.''')
+    search_parser.add_argument('--rebuild', action='store_true',
+                               help='Create the search index again from every tag first.')
+    search_parser.add_argument('--pager', action='store_true',
+                               help='Show output in $PAGER.')
+    search_parser.set_defaults(func=search)
+
+
     # Export parser
     export_parser = main_subparsers.add_parser('export', aliases=['x'],
                                                help='Export hours to file.',
                                                parents=[filter_parameters])
     export_parser.add_argument('month', type=str)
     export_parser.add_argument('year', type=int)
-    export_parser.add_argument('customer', type=str)
+    export_parser.add_argument('customer', type=str, nargs='?')
     export_parser.add_argument('-p', '--pdf', action='store_true',
                                help='Export to PDF.')
     export_parser.add_argument('project', type=str, nargs='?')
+    export_parser.add_argument('-a', '--all-customers', action='store_true',
+                               help='''Create or refresh the invoice of every customer
+                               with workdays in the month without asking.''')
+    export_parser.add_argument('-j', '--jobs', type=int,
+                               help='''Number of processes rendering PDFs with
+                               --all-customers, default is the number of CPUs.''')
+    export_parser.add_argument('--force', action='store_true',
+                               help='''Render PDFs again even when nothing in the
+                               invoice has changed since the last export.''')
     export_parser.set_defaults(func=export)
 
 
+    # Import parser
+    import_parser = main_subparsers.add_parser('import',
+                                               help='''Import completed workdays from a
+                                               CSV or JSON Lines file without asking
+                                               any questions.''',
+                                               description='''CSV files need customer, project,
+                                               start and end columns and may have a tags column
+                                               with one tag per line. JSON Lines files have the
+                                               same keys with tags as a list. Times are written
+                                               as YYYY-mm-dd HH:MM.''')
+    import_parser.add_argument('file', type=str,
+                               help='File to import, - reads from stdin.')
+    import_parser.add_argument('-f', '--format', choices=('csv', 'jsonl'),
+                               help='Format of the file, guessed from the file extension by default.')
+    import_parser.add_argument('-b', '--batch_size', type=int, default=5000,
+                               help='Number of workdays to insert per statement.')
+    # Nobody is there to answer questions, a new database is created without asking
+    import_parser.set_defaults(func=import_hours, ask=False)
+
+
+    # Dump parser
+    dump_parser = main_subparsers.add_parser('dump',
+                                             help='''Write completed workdays with customer,
+                                             project, hours, wage, invoice id and tags as CSV
+                                             or JSON Lines.''')
+    dump_parser.add_argument('-f', '--format', choices=('csv', 'jsonl'), default='jsonl',
+                             help='Output format, default is jsonl.')
+    dump_parser.add_argument('-o', '--output', type=str,
+                             help='File to write to instead of stdout.')
+    dump_parser.add_argument('--since', action=DateAction, default=None,
+                             help='Only dump workdays started on or after this date.')
+    dump_parser.add_argument('--until', action=DateAction, default=None,
+                             help='Only dump workdays started on or before this date.')
+    dump_parser.add_argument('-c', '--customer', type=str,
+                             help='Only dump workdays of this customer.')
+    dump_parser.add_argument('-i', '--invoice', type=int,
+                             help='Only dump workdays of this invoice id.')
+    dump_parser.set_defaults(func=dump)
+
+
     # Delete parser
     delete_parser = main_subparsers.add_parser('delete', aliases=['d'],
                                                help='Delete a registered worktime. \
@@ -199,7 +361,7 @@ def parse(args):
 
 
     # Config parser
-    config_parser = main_subparsers.add_parser('config', aliases=['c'],
+    config_parser = main_subparsers.add_parser(CONFIG_COMMANDS[0], aliases=list(CONFIG_COMMANDS[1:]),
                                                help='See and edit config options.',
                                                description='Config file path is %s' % os.path.join(CONFIG_DIR, CONFIG_FILE))
     config_subparsers = config_parser.add_subparsers()
@@ -210,15 +372,17 @@ def parse(args):
     # Edit config
     config_edit_parser = config_subparsers.add_parser('edit', aliases=['e'],
                                                       help='Edit configuration values.')
-    for key, value in settings.values.__dict__.items():
-        if value.choices:
-            config_edit_parser.add_argument('--%s' % key, type=str, choices=value.choices)
-        else:
-            config_edit_parser.add_argument('--%s' % key, type=str)
+    if config_options:
+        settings = Config(None)
+        for key, value in settings.values.__dict__.items():
+            if value.choices:
+                config_edit_parser.add_argument('--%s' % key, type=str, choices=value.choices)
+            else:
+                config_edit_parser.add_argument('--%s' % key, type=str)
     config_edit_parser.set_defaults(func=config, parser_object=config_edit_parser.prog)
     # Provision config
     config_provision_parser = config_subparsers.add_parser('provision', aliases=['p'],
                                                            help='Provision a new config file with default values.')
     config_provision_parser.set_defaults(func=config, parser_object=config_provision_parser.prog)
 
-    return main_parser.parse_args(args)
+    return main_parser
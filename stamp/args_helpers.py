@@ -7,10 +7,33 @@ from .constants import DATA_DIR, DB_FILE, CONFIG_DIR, CONFIG_FILE
 
 __all__ = ['DateAction',
            'TimeAction',
+           'Now',
+           'resolve_now',
            'DbAction',
            'FromEnvAction',
            'ConfigAction']
 
+class Now(object):
+    """Default of DateAction and TimeAction.
+
+    Resolved when the arguments are parsed instead of when the parser is
+    built, so one parser can be reused by a long running process.
+    """
+    def __init__(self, resolve):
+        self.resolve = resolve
+
+
+TODAY = Now(lambda: datetime.now().date())
+CURRENT_TIME = Now(lambda: datetime.now().time().replace(second=0, microsecond=0))
+
+
+def resolve_now(namespace):
+    for key, value in vars(namespace).items():
+        if isinstance(value, Now):
+            setattr(namespace, key, value.resolve())
+    return namespace
+
+
 class DateAction(argparse.Action):
     date_format = '%x'
 
@@ -20,7 +43,7 @@ class DateAction(argparse.Action):
                  help='Set date manually. With current date on this systems locale settings the format is: \'%s\'. Default date is now!' % datetime.today().strftime(date_format), # NOQA
                  type=str, # NOQA
                  required=False,
-                 default=datetime.now().date()):
+                 default=TODAY):
         super(DateAction, self).__init__(option_strings=option_strings,
                                          dest=dest,
                                          help=help,
@@ -45,7 +68,7 @@ class TimeAction(argparse.Action):
                  help='Set time manually. With current time the format is \'%s\'. Default is time now!' % datetime.today().strftime(time_format), # NOQA
                  type=str, # NOQA
                  required=False,
-                 default=datetime.now().time().replace(second=0, microsecond=0)):
+                 default=CURRENT_TIME):
         super(TimeAction, self).__init__(option_strings,
                                          dest,
                                          help=help,
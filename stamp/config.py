@@ -3,15 +3,32 @@
 import os
 import sys
 import re
+import pickle
 from datetime import datetime
 
-import yaml
-
-from .constants import DATA_DIR, INVOICE_DIR
+from .constants import DATA_DIR, INVOICE_DIR, CACHE_DIR
 from .helpers import error_handler
 from .exceptions import ConfigValueError
 
-__all__ = ['Config']
+__all__ = ['Config',
+           'load_config',
+           'engine_profile',
+           'ENGINE_DEFAULTS']
+
+CONFIG_CACHE_FILE = os.path.join(CACHE_DIR, 'config.pickle')
+
+# SQLite settings of engine_profile when nothing else is configured, a
+# Database opened without a profile uses them without building a Config
+JOURNAL_MODE = 'WAL'
+SYNCHRONOUS = 'NORMAL'
+BUSY_TIMEOUT = 5000
+MMAP_SIZE = 67108864
+CACHE_SIZE = -16000
+ENGINE_DEFAULTS = {'journal_mode': JOURNAL_MODE,
+                   'synchronous': SYNCHRONOUS,
+                   'busy_timeout': BUSY_TIMEOUT,
+                   'mmap_size': MMAP_SIZE,
+                   'cache_size': CACHE_SIZE}
 
 
 class ConfigValue(object):
@@ -218,6 +235,44 @@ class MailAddress(ConfigValue):
         self.set_validation_type('email')
 
 
+class JournalMode(ConfigValue):
+    def __init__(self):
+        super().__init__()
+        self.add_default_value(JOURNAL_MODE)
+        self.choices = ['WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY']
+
+
+class Synchronous(ConfigValue):
+    def __init__(self):
+        super().__init__()
+        self.add_default_value(SYNCHRONOUS)
+        self.choices = ['OFF', 'NORMAL', 'FULL', 'EXTRA']
+
+
+class BusyTimeout(ConfigValue):
+    """Milliseconds to wait for a lock held by another stamp process."""
+    def __init__(self):
+        super().__init__()
+        self.type = int
+        self.add_default_value(BUSY_TIMEOUT)
+
+
+class MmapSize(ConfigValue):
+    """Bytes of the database file to memory map, 0 turns it off."""
+    def __init__(self):
+        super().__init__()
+        self.type = int
+        self.add_default_value(MMAP_SIZE)
+
+
+class CacheSize(ConfigValue):
+    """Page cache size, negative values are in KiB as with PRAGMA cache_size."""
+    def __init__(self):
+        super().__init__()
+        self.type = int
+        self.add_default_value(CACHE_SIZE)
+
+
 class ValuesWrapper(object):
     def __repr__(self):
         repr_string = '\n'
@@ -257,6 +312,11 @@ class Config(object):
         self.values.add(CompanyAccountNumber())
         self.values.add(PhoneNumber())
         self.values.add(MailAddress())
+        self.values.add(JournalMode())
+        self.values.add(Synchronous())
+        self.values.add(BusyTimeout())
+        self.values.add(MmapSize())
+        self.values.add(CacheSize())
 
         if config_path:
             try:
@@ -280,8 +340,10 @@ class Config(object):
         """
         try:
             with open(self.config_path, 'r') as config_readout:
+                # Only needed when there is a config file to read
+                import yaml
                 try:
-                    config = yaml.load(config_readout)
+                    config = yaml.safe_load(config_readout)
                     self.file_exists = True
                 except yaml.YAMLError as err:
                     print(err)
@@ -304,6 +366,7 @@ class Config(object):
                         error_handler(err_msg)
 
     def write(self, value):
+        import yaml
         if not os.path.exists(os.path.dirname(self.config_path)):
             os.makedirs(os.path.dirname(self.config_path))
         with open(self.config_path, 'w') as config_readout:
@@ -312,3 +375,57 @@ class Config(object):
             except yaml.YAMLError as err:
                 print(err)
                 sys.exit(64)
+
+
+def config_cache_key(config_path):
+    """Everything a built Config depends on besides the stamp version."""
+    try:
+        config_stat = os.stat(config_path)
+        config_file = (config_stat.st_mtime_ns, config_stat.st_size)
+    except (OSError, TypeError):
+        config_file = None
+    return (config_path, config_file,
+            # Changes to the ConfigValue classes themselves
+            os.stat(__file__).st_mtime_ns,
+            DATA_DIR, INVOICE_DIR,
+            sorted((key, value) for key, value in os.environ.items() if key.startswith('STAMP_')))
+
+
+def load_config(config_path, cache_file=CONFIG_CACHE_FILE):
+    """Config for config_path, from the snapshot cache when nothing changed.
+
+    A snapshot of the validated Config is kept in cache_file together with
+    the mtime and size of the config file and the STAMP_* environment. As
+    long as those match, the config file is neither parsed nor validated
+    again. The cache is only an optimization, any problem reading or writing
+    it falls back to building the Config.
+    """
+    key = config_cache_key(config_path)
+    try:
+        with open(cache_file, 'rb') as cache:
+            cached_key, config = pickle.load(cache)
+        if cached_key == key:
+            return config
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError,
+            TypeError, ValueError):
+        pass
+
+    config = Config(config_path)
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temporary_file = '%s.%d' % (cache_file, os.getpid())
+        with open(temporary_file, 'wb') as cache:
+            pickle.dump((key, config), cache, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_file, cache_file)
+    except OSError:
+        pass
+    return config
+
+
+def engine_profile(config):
+    """SQLite settings for Database taken from the config values."""
+    return {'journal_mode': config.values.journal_mode.value,
+            'synchronous': config.values.synchronous.value,
+            'busy_timeout': config.values.busy_timeout.value,
+            'mmap_size': config.values.mmap_size.value,
+            'cache_size': config.values.cache_size.value}
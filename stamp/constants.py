@@ -17,6 +17,10 @@ DATA_DIR = os.path.join(os.environ.get('XDG_DATA_HOME',
                                        os.path.join(os.environ.get('HOME'),
                                                     '.local/share/')),
                         'stamp/')
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME',
+                                        os.path.join(os.environ.get('HOME'),
+                                                     '.cache/')),
+                         'stamp/')
 DB_FILE = os.environ.get('STAMP_DEV_DB_FILE',
                          os.environ.get('STAMP_DB_FILE', 'default'))
 FILE_DIR = os.path.expanduser(os.environ.get('STAMP_FILE_DIR', DEFAULT_DIR))
@@ -0,0 +1,261 @@
+"""Optional background process serving stamp commands from a warm process.
+
+`stampd` keeps the interpreter, SQLAlchemy, the mappers, the configs and
+the database engines loaded and listens on a Unix socket. `stamp` sends
+its arguments there when the daemon is running and prints the output it
+gets back, otherwise it runs the command itself.
+
+Only commands that never need the terminal are served. A command that
+turns out to need an answer from the user is rolled back in the daemon
+and run by the client instead, as is every request from a client whose
+environment differs from the daemon's.
+
+This module is imported by every `stamp` run, so the client half only
+uses the standard library.
+"""
+
+import os
+import sys
+import json
+import socket
+import shutil
+
+from .constants import CACHE_DIR
+
+__all__ = ['SOCKET_PATH',
+           'forward',
+           'create_server',
+           'serve',
+           'main']
+
+SOCKET_PATH = os.environ.get('STAMP_SOCKET',
+                             os.path.join(os.environ.get('XDG_RUNTIME_DIR', CACHE_DIR), 'stampd.sock'))
+# Exports may render pdfs for a while
+CLIENT_TIMEOUT = 300
+# Variables that change paths, translations or parsed defaults
+ENVIRONMENT_PREFIXES = ('STAMP_', 'XDG_', 'LC_')
+ENVIRONMENT_KEYS = ('HOME', 'LANG', 'LANGUAGE')
+FALLBACK = {'fallback': True}
+
+
+def environment():
+    return sorted((key, value) for key, value in os.environ.items()
+                  if key.startswith(ENVIRONMENT_PREFIXES) or key in ENVIRONMENT_KEYS)
+
+
+def _send(connection, message):
+    connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def _receive(connection):
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return json.loads(data.decode('utf-8'))
+
+
+def forward(args, socket_path=SOCKET_PATH):
+    """Run the command in stampd and return its exit code.
+
+    Returns None when there is no daemon or the daemon declined the
+    command, the caller then runs it in-process. Set STAMP_NO_DAEMON to
+    never use the daemon.
+    """
+    if os.environ.get('STAMP_NO_DAEMON') or not os.path.exists(socket_path):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        connection.close()
+        return None
+    try:
+        connection.settimeout(CLIENT_TIMEOUT)
+        _send(connection, {'args': list(args),
+                           'cwd': os.getcwd(),
+                           'env': environment(),
+                           'columns': shutil.get_terminal_size((80, 80)).columns})
+        response = _receive(connection)
+    except (OSError, ValueError) as err:
+        # The command may or may not have run, never run it twice
+        print(_('Lost connection to stampd: %s') % err, file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+    if response.get('fallback'):
+        return None
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['code']
+
+
+class NeedsTerminal(Exception):
+    pass
+
+
+class NoTerminal(object):
+    """sys.stdin while serving, any attempt to ask the user ends the request."""
+    def __getattr__(self, name):
+        raise NeedsTerminal
+
+    def fileno(self):
+        raise NeedsTerminal
+
+    def isatty(self):
+        return False
+
+
+def create_server(socket_path=SOCKET_PATH):
+    """Bind the daemon to socket_path, None when another daemon already has it."""
+    # Everything heavy is only needed by the daemon itself
+    import socketserver
+    import traceback
+    from io import StringIO
+    from importlib import import_module
+    from contextlib import redirect_stdout, redirect_stderr
+
+    from . import main as commands
+    from .args import parse
+    from .db import Database
+    from .config import load_config, config_cache_key, engine_profile
+
+    served_commands = {commands.stamp_in, commands.stamp_out, commands.tag,
+                       commands.status, commands.report, commands.export,
+                       commands.search}
+
+    class StampDaemon(socketserver.UnixStreamServer):
+        def __init__(self, socket_path):
+            self.environment = environment()
+            self.configs = {}
+            self.databases = {}
+            # Import what the served commands import lazily before the first request
+            for module in ('add', 'end', 'tag', 'status', 'report', 'export', 'rollup', 'search'):
+                import_module('.' + module, __package__)
+            super().__init__(socket_path, RequestHandler)
+
+        def config(self, config_path):
+            key = config_cache_key(config_path)
+            cached = self.configs.get(config_path)
+            if not cached or cached[0] != key:
+                cached = self.configs[config_path] = (key, load_config(config_path))
+            return cached[1]
+
+        def database(self, db_file, profile):
+            key = (db_file, tuple(sorted(profile.items())))
+            if key not in self.databases:
+                self.databases[key] = Database(db_file, ask=False, profile=profile)
+            return self.databases[key]
+
+        def run_command(self, request):
+            # JSON turns the (key, value) pairs into lists
+            client_environment = [tuple(item) for item in request['env']]
+            if client_environment != self.environment or not os.path.isdir(request['cwd']):
+                return FALLBACK
+            os.chdir(request['cwd'])
+            columns = os.environ.get('COLUMNS')
+            os.environ['COLUMNS'] = str(request['columns'])
+            stdout, stderr = StringIO(), StringIO()
+            code = 0
+            db = None
+            stdin, sys.stdin = sys.stdin, NoTerminal()
+            try:
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    try:
+                        parser = parse(request['args'])
+                        if (getattr(parser, 'func', None) not in served_commands
+                                or getattr(parser, 'pager', False)
+                                or getattr(parser, 'watch', False)
+                                or parser.profile or parser.profile_output
+                                or not os.path.isfile(parser.db)):
+                            return FALLBACK
+                        parser.config = self.config(parser.config)
+                        parser.db = db = self.database(parser.db, engine_profile(parser.config))
+                        parser.func(parser)
+                    except SystemExit as err:
+                        if isinstance(err.code, int) or err.code is None:
+                            code = err.code or 0
+                        else:
+                            print(err.code, file=sys.stderr)
+                            code = 1
+                    except NeedsTerminal:
+                        if db:
+                            db.session.rollback()
+                        return FALLBACK
+                    except Exception:
+                        traceback.print_exc()
+                        code = 1
+            finally:
+                sys.stdin = stdin
+                if columns is None:
+                    del os.environ['COLUMNS']
+                else:
+                    os.environ['COLUMNS'] = columns
+                if db:
+                    db.session.close()
+            return {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'code': code}
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = self.rfile.readline()
+            # daemon_running() connects without sending anything
+            if not request:
+                return
+            response = self.server.run_command(json.loads(request.decode('utf-8')))
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+    if os.path.exists(socket_path):
+        if daemon_running(socket_path):
+            return None
+        os.remove(socket_path)
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    # Only the user may talk to the daemon
+    umask = os.umask(0o077)
+    try:
+        return StampDaemon(socket_path)
+    finally:
+        os.umask(umask)
+
+
+def serve(socket_path=SOCKET_PATH):
+    server = create_server(socket_path)
+    if not server:
+        print(_('stampd is already running on %s') % socket_path, file=sys.stderr)
+        return 1
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+    return 0
+
+
+def daemon_running(socket_path):
+    """True when a daemon accepts connections on socket_path."""
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        connection.close()
+
+
+def main(args=sys.argv[1:]):
+    import signal
+    import argparse
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    parser = argparse.ArgumentParser(prog='stampd',
+                                     description='Serve stamp commands from a warm background process.')
+    parser.add_argument('--socket', default=SOCKET_PATH,
+                        help='Unix socket to listen on, default is %(default)s.')
+    sys.exit(serve(parser.parse_args(args).socket))
+
+
+if __name__ == '__main__':
+    main()
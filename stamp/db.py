@@ -1,25 +1,62 @@
 import os
 import sys
+import random
+import sqlite3
+from time import sleep
+from itertools import chain
+from collections import defaultdict
+from datetime import datetime, time, timedelta
 
-from sqlalchemy import exc, create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, inspect, literal_column, func, and_, or_, not_, tuple_
+from sqlalchemy.orm import sessionmaker, joinedload
 from sqlalchemy.orm import exc as orm_exc
 
-from .mappings import Workday, Customer, Base, Invoice, Project, Tag
+from .mappings import Workday, Customer, Invoice, Project, Tag
 from .exceptions import (NoMatchingDatabaseEntryError,
                          TooManyMatchingDatabaseEntriesError,
                          CurrentStampNotFoundError, NonExistingId)
-from .constants import DATA_DIR
+from .migrations import migrate
+from .config import ENGINE_DEFAULTS
 from .formatting import yes_or_no
 
-__all__ = ['Database']
+__all__ = ['Database',
+           'get_tags_by_workday']
+
+# Retries after SQLite has already waited busy_timeout for the write lock
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.05
+
+# Workdays read per statement by iter_workdays
+ITERATION_BATCH_SIZE = 500
+
+# Relationships that are displayed for every row by Status
+STATUS_RELATIONSHIPS = {Workday: (Workday.customer, Workday.project, Workday.invoice),
+                        Invoice: (Invoice.customer,)}
+
+def get_tags_by_workday(session, workday_ids):
+    """Tags of all the workdays in one query, grouped by workday id.
+
+    Workday.tags stays dynamic for writes, reads that show the tags of many
+    workdays use this instead of a query per workday.
+    """
+    tags = defaultdict(list)
+    if not workday_ids:
+        return tags
+    query = session.query(Tag.id, Tag.workday_id, Tag.recorded, Tag.tag).filter(
+        Tag.workday_id.in_(workday_ids)).order_by(Tag.workday_id, Tag.recorded)
+    for tag in query:
+        tags[tag.workday_id].append(tag)
+    return tags
+
 
 class Database():
-    def __init__(self, db_file, ask=True):
-        self.engine = create_engine('sqlite:///' + db_file)
+    def __init__(self, db_file, ask=True, profile=None):
+        self.profile = profile or ENGINE_DEFAULTS
+        self.engine = create_engine('sqlite:///' + db_file,
+                                    connect_args={'timeout': self.profile['busy_timeout'] / 1000})
+        event.listen(self.engine, 'connect', self.apply_profile)
         if os.path.isfile(db_file):
             self.new_db = False
-            Base.metadata.create_all(self.engine)
         else:
             self.new_db = True
             if ask:
@@ -28,16 +65,47 @@ class Database():
                           no_function=sys.exit,
                           no_function_args=(0,),
                           yes_message='Creating database!')
-            try:
-                Base.metadata.create_all(self.engine)
-            except exc.OperationalError as err:
-                if not os.path.exists(DATA_DIR):
-                    os.makedirs(DATA_DIR)
-                    Base.metadata.create_all(self.engine)
-                else:
-                    raise err
+            db_dir = os.path.dirname(db_file)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+        # Only a pragma read when the schema is up to date
+        migrate(self.engine)
         session = sessionmaker(bind=self.engine)
         self.session = session()
+        # {Customer: {name: [id, ...]}, Project: {...}}, read when first needed
+        self.names = None
+        event.listen(self.session, 'after_flush', self.names_changed)
+        event.listen(self.session, 'before_flush', self.lock_for_writing)
+
+    def apply_profile(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+            # Pragmas do not take bound parameters
+            cursor.execute('PRAGMA %s = %s' % (pragma, self.profile[pragma]))
+        cursor.close()
+
+    def lock_for_writing(self, session, flush_context, instances):
+        """Take the write lock before the first write of a transaction.
+
+        Nothing has been written yet when BEGIN IMMEDIATE fails, so waiting
+        and trying again is safe here. A lock that is only asked for by the
+        first INSERT could time out in the middle of a command, after it
+        has printed or asked something, and the command would have to be
+        run again from the start.
+        """
+        connection = session.connection().connection.connection
+        if connection.in_transaction:
+            return
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as err:
+                message = str(err).lower()
+                if attempt == BUSY_RETRIES or not ('database is locked' in message
+                                                   or 'database is busy' in message):
+                    raise
+                sleep(BUSY_BACKOFF * 2 ** attempt * random.uniform(1, 1.5))
 
     def add(self, instance):
         self.session.add(instance)
@@ -65,19 +133,160 @@ class Database():
             raise NoMatchingDatabaseEntryError('Table was not found!')
         return table
 
-    def get(self, table_name, id=None):
+    def query(self, table, eager=False):
+        query = self.session.query(table)
+        if eager:
+            # Load the related rows in the same statement instead of one per row
+            query = query.options(*[joinedload(relation) for relation in
+                                    STATUS_RELATIONSHIPS.get(table, ())])
+        return query
+
+    def get(self, table_name, id=None, eager=False):
         table = self.resolve_table_name(table_name)
         if id:
-            query = self.session.query(table).get(id)
+            query = self.query(table, eager=eager).get(id)
             if not query:
                 raise NonExistingId('%s with %s as id does not exist!' % (table_name.capitalize(), id))
         else:
-            query = self.session.query(table)
-            if not query.count():
+            query = self.query(table, eager=eager)
+            if not self.exists(query):
                 raise NoMatchingDatabaseEntryError('No %ss created yet!' % table_name.lower())
 
         return query
 
+    def exists(self, query):
+        """True when query matches any row, SQLite stops at the first one."""
+        return self.session.query(query.exists()).scalar()
+
+    def first_or_raise(self, query, message):
+        """First row of query, reads a single row."""
+        row = query.first()
+        if row is None:
+            raise NoMatchingDatabaseEntryError(message)
+        return row
+
+    def names_changed(self, session, flush_context):
+        for instance in chain(session.new, session.dirty, session.deleted):
+            if isinstance(instance, (Customer, Project)):
+                attributes = inspect(instance).attrs
+                if (instance in session.new or instance in session.deleted
+                        or attributes.name.history.has_changes()
+                        or (isinstance(instance, Project) and attributes.customer_id.history.has_changes())):
+                    self.names = None
+                    return
+
+    def load_names(self):
+        names = {Customer: defaultdict(list), Project: defaultdict(list)}
+        tables = {'customer': Customer, 'project': Project}
+        query = self.session.query(literal_column("'customer'").label('kind'), Customer.name.label('name'),
+                                   Customer.id.label('id'), literal_column('NULL').label('customer_id')).union_all(
+            self.session.query(literal_column("'project'").label('kind'), Project.name.label('name'),
+                               Project.id.label('id'), Project.customer_id.label('customer_id')))
+        for table_name, name, object_id, customer_id in query:
+            names[tables[table_name]][name].append((object_id, customer_id))
+        for ids in chain(names[Customer].values(), names[Project].values()):
+            ids.sort()
+        return names
+
+    def get_by_name(self, table, name, customer_id=None, too_many_message=None):
+        """Customer or Project called name, the first one created if several are.
+
+        Projects are only looked for among the customer's projects when
+        customer_id is given. The ids of every name are read in one query
+        and kept until a customer or project is added, renamed or deleted,
+        after that a name costs a primary key lookup that the identity map
+        usually answers. Names are read again once when a cached id turns
+        out to be stale, as happens when another process changed them.
+        """
+        reloaded = False
+        while True:
+            if self.names is None:
+                self.names = self.load_names()
+                reloaded = True
+            found = []
+            stale = False
+            for object_id, owner_id in self.names[table].get(name, ()):
+                if customer_id is not None and owner_id != customer_id:
+                    continue
+                instance = self.session.query(table).get(object_id)
+                if (instance is None or instance.name != name
+                        or (customer_id is not None and instance.customer_id != customer_id)):
+                    stale = True
+                    continue
+                found.append(instance)
+                # Checking for several matches needs all of them
+                if not too_many_message:
+                    break
+            if reloaded or (found and not stale):
+                break
+            self.names = None
+        if not found:
+            raise NoMatchingDatabaseEntryError('No %s named %s!' % (table.__tablename__, name))
+        elif len(found) > 1:
+            raise TooManyMatchingDatabaseEntriesError(too_many_message)
+        return found[0]
+
+    def workday_key(self, workday_id):
+        """(start, id) of a workday, the position used by keyset pagination."""
+        return tuple(self.first_or_raise(
+            self.session.query(Workday.start, Workday.id).filter(Workday.id == workday_id),
+            'Workday with %s as id does not exist!' % workday_id))
+
+    def iter_workdays(self, after=None, limit=None, query=None, batch_size=ITERATION_BATCH_SIZE,
+                      since=None, until=None):
+        """Workdays ordered by (start, id) following the `after` key.
+
+        Read in batches that each continue from the last workday of the
+        previous one, so every batch is an index seek however far into the
+        table it is, unlike OFFSET which reads every skipped row. No read
+        is held open between batches. query may select columns instead of
+        Workday as long as it includes Workday.start and Workday.id.
+        """
+        query = query if query is not None else self.query(Workday, eager=True)
+        while limit is None or limit > 0:
+            size = batch_size if limit is None else min(batch_size, limit)
+            batch = self.filter_workdays(query, since, until, limit=size, after=after).all()
+            yield from batch
+            if len(batch) < size:
+                return
+            after = (batch[-1].start, batch[-1].id)
+            if limit is not None:
+                limit -= len(batch)
+
+    def workday_filters(self, date_from=None, date_to=None, time_from=None, time_to=None):
+        """Conditions for workdays started from date_from through date_to.
+
+        Both days are included. time_from and time_to limit the time of day
+        a workday started and ended.
+        """
+        filters = []
+        if date_from:
+            filters.append(Workday.start >= datetime.combine(date_from, time.min))
+        if date_to:
+            filters.append(Workday.start < datetime.combine(date_to + timedelta(days=1), time.min))
+        if time_from:
+            filters.append(func.time(Workday.start) >= time_from.strftime('%H:%M:%S'))
+        if time_to:
+            filters.append(func.time(Workday.end) <= time_to.strftime('%H:%M:%S'))
+        return filters
+
+    def workday_filters_sql(self, *args, **kwargs):
+        """workday_filters with the values written into the SQL, for hand-written statements."""
+        return [str(condition.compile(dialect=self.engine.dialect, compile_kwargs={'literal_binds': True}))
+                for condition in self.workday_filters(*args, **kwargs)]
+
+    def filter_workdays(self, query, since=None, until=None, limit=None, offset=None, after=None):
+        # Ordered on the start index so a page can be read without sorting the table
+        if after:
+            query = query.filter(tuple_(Workday.start, Workday.id) > tuple_(*after))
+        query = query.filter(*self.workday_filters(since, until))
+        query = query.order_by(Workday.start, Workday.id)
+        if offset:
+            query = query.offset(offset)
+        if limit:
+            query = query.limit(limit)
+        return query
+
     def current_stamp(self):
         stamp = self.session.query(Workday).filter_by(end=None).first()
         if stamp:
@@ -89,7 +298,7 @@ class Database():
         query = self.get(table_name)
         for key, value in export_filter.items():
             query = query.filter(value['op_func'](getattr(table_name, key), value['value']))
-        if query.count() == 0:
+        if not self.exists(query):
             raise NoMatchingDatabaseEntryError('No matching database entry found with search string: %s' % value['value'])
         else:
             return query
@@ -103,19 +312,80 @@ class Database():
                 query = getattr(query, attr)
             return query
 
-    def get_related_invoice(self, year, month):
-        invoices = self.get('Invoice').filter(Invoice.month == month,
+    def get_related_invoice(self, year, month, customer_id=None):
+        invoices = self.query(Invoice).filter(Invoice.month == month,
                                               Invoice.year == year).order_by(
                                                   Invoice.id.desc())
-        if invoices.count() == 0:
-            raise NoMatchingDatabaseEntryError('No invoice found for %s %s!' % (month, year))
-        else:
-            return invoices.first()
+        if customer_id:
+            invoices = invoices.filter(Invoice.customer_id == customer_id)
+        return self.first_or_raise(invoices, 'No invoice found for %s %s!' % (month, year))
+
+    def get_invoice_drift(self, invoice, workdays):
+        """Differences between an invoice and the workdays that belong on it now.
+
+        Returns the workdays that were added to or removed from the
+        workdays query since the invoice was created, and the invoiced
+        workdays whose start or end was edited afterwards, each labeled
+        'added', 'removed' or 'changed'. The comparison runs in a single
+        statement, an unchanged month returns no rows.
+        """
+        in_month = Workday.id.in_(workdays.with_entities(Workday.id).order_by(None))
+        on_invoice = Workday.invoice_id.is_(invoice.id)
+        unchanged = and_(Workday.start.is_(Workday.invoiced_start),
+                         Workday.end.is_(Workday.invoiced_end))
+        query = self.session.query(Workday.id, Workday.start, Workday.end,
+                                   Workday.invoiced_start, Workday.invoiced_end,
+                                   in_month.label('in_month'),
+                                   on_invoice.label('on_invoice')).filter(
+                                       or_(in_month, on_invoice),
+                                       not_(and_(in_month, on_invoice, unchanged))).order_by(
+                                           Workday.start, Workday.id)
+        drift = []
+        for row in query:
+            if not row.on_invoice:
+                change = 'added'
+            elif not row.in_month:
+                change = 'removed'
+            else:
+                change = 'changed'
+            drift.append((change, row))
+        return drift
+
+    def load_workday_frame(self, since=None, until=None, customer_id=None):
+        """Completed workdays as a frame.WorkdayFrame of numpy arrays.
 
-    def get_workdays(self, object_id, customer=None, invoice_id=None):
+        since and until are dates and both days are included, like in
+        filter_workdays. Rows go from the sqlite cursor straight into the
+        arrays without creating ORM objects. Requires numpy.
+        """
+        from .frame import WorkdayFrame, NO_INVOICE
+        conditions = ['"end" IS NOT NULL'] + self.workday_filters_sql(since, until)
+        params = {'no_invoice': NO_INVOICE}
+        if customer_id:
+            conditions.append('customer_id = :customer_id')
+            params['customer_id'] = customer_id
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.execute('''SELECT id,
+                                     CAST(strftime('%%s', start) AS INTEGER),
+                                     CAST(strftime('%%s', "end") AS INTEGER),
+                                     customer_id, project_id,
+                                     coalesce(invoice_id, :no_invoice)
+                              FROM workday WHERE %s ORDER BY start, id''' % ' AND '.join(conditions),
+                           params)
+            return WorkdayFrame.from_rows(cursor,
+                                          customer_names=dict(self.session.query(Customer.id, Customer.name)),
+                                          project_names=dict(self.session.query(Project.id, Project.name)))
+        finally:
+            cursor.close()
+
+    def get_tags_by_workday(self, workday_ids):
+        return get_tags_by_workday(self.session, workday_ids)
+
+    def get_workdays(self, object_id, customer=None, invoice_id=None, eager=False):
         # Used with delete or edit argument
         if object_id:
-            workdays = self.session.query(Workday).get(object_id)
+            workdays = self.query(Workday, eager=eager).get(object_id)
             if not workdays:
                 raise NoMatchingDatabaseEntryError('Specified id not found!')
 
@@ -123,23 +393,18 @@ class Database():
         else:
             try:
                 # Excluding current stamp
-                workdays = self.session.query(Workday).filter(Workday.end.isnot(None)).order_by(Workday.start)
+                workdays = self.query(Workday, eager=eager).filter(Workday.end.isnot(None)).order_by(Workday.start)
                 # Query with filter
                 if customer:
                     workdays = workdays.filter(Customer.name == customer)
                 if invoice_id:
                     workdays = workdays.filter(Workday.invoice_id == invoice_id)
-                if not workdays.count():
+                if not self.exists(workdays):
                     raise NoMatchingDatabaseEntryError('No workday has been completed yet!')
             except orm_exc.UnmappedInstanceError:
                 raise NoMatchingDatabaseEntryError('Specified id not found!')
         return workdays
 
     def get_project(self, project_name):
-        project = self.get('Project').filter(Project.name == project_name)
-        if project.count() == 0:
-            raise NoMatchingDatabaseEntryError('No matching project found for %s!' % project_name)
-        elif project.count() > 1:
-            raise TooManyMatchingDatabaseEntriesError('Several projects matches this string: %s!' % project_name)
-        else:
-            return project.first()
+        return self.get_by_name(Project, project_name,
+                                too_many_message='Several projects matches this string: %s!' % project_name)
@@ -4,6 +4,8 @@ __all__ = ['db_commit_decorator',
            'no_db_no_action_decorator']
 
 def db_commit_decorator(func):
+    # A busy database is waited for when the write lock is taken, see
+    # Database.lock_for_writing, so the command itself never runs twice
     def wrapper(args):
         x = func(args)
         args.db.commit()
@@ -16,7 +18,7 @@ def no_db_no_action_decorator(func):
             print('This action cannot be run before the selected database is populated!\n' \
                   'Selected database: %s\n' \
                   'Run `stamp add` to populate the database or select a different database with the --db argument.'
-                  % (args.db + '.db'))
+                  % args.db.engine.url.database)
             sys.exit(0)
         return func(args)
     return wrapper
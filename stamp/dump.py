@@ -0,0 +1,76 @@
+import csv
+import json
+from itertools import islice
+
+from .mappings import Workday, Customer, Project
+from .helpers import calculate_workhours, calculate_wage
+
+__all__ = ['dump_workdays']
+
+DUMP_FORMATS = ('csv', 'jsonl')
+# Also the number of ids in each tag query, stays below SQLite's variable limit
+BATCH_SIZE = 500
+FIELDS = ('id', 'customer', 'project', 'start', 'end', 'hours', 'wage', 'invoice_id', 'tags')
+
+
+def workday_rows(db, since=None, until=None, customer=None, invoice_id=None):
+    query = db.session.query(Workday.id, Workday.start, Workday.end, Workday.invoice_id,
+                             Customer.name.label('customer'), Project.name.label('project')).join(
+                                 Customer, Workday.customer_id == Customer.id).join(
+                                     Project, Workday.project_id == Project.id).filter(
+                                         Workday.end.isnot(None))
+    if customer:
+        query = query.filter(Customer.name == customer)
+    if invoice_id:
+        query = query.filter(Workday.invoice_id == invoice_id)
+    return db.iter_workdays(query=query, since=since, until=until, batch_size=BATCH_SIZE)
+
+
+def iter_batches(db, config, rows):
+    """Complete workday records, a batch at a time so tags take one query per batch."""
+    wage_per_hour = config.values.wage_per_hour.value
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        tags = db.get_tags_by_workday([row.id for row in batch])
+        records = []
+        for row in batch:
+            hours = calculate_workhours(row.start, row.end)
+            records.append({'id': row.id,
+                            'customer': row.customer,
+                            'project': row.project,
+                            'start': row.start.isoformat(' ', 'minutes'),
+                            'end': row.end.isoformat(' ', 'minutes'),
+                            'hours': round(hours, 2),
+                            'wage': round(calculate_wage(hours, wage_per_hour), 2),
+                            'invoice_id': row.invoice_id,
+                            'tags': [{'recorded': tag.recorded.isoformat(' ', 'minutes'), 'tag': tag.tag}
+                                     for tag in tags[row.id]]})
+        yield records
+
+
+def write_csv(batches, output):
+    # One tag per line in the tags cell, the same layout `stamp import` reads
+    writer = csv.DictWriter(output, FIELDS)
+    writer.writeheader()
+    for records in batches:
+        for record in records:
+            record['tags'] = '\n'.join(tag['tag'] for tag in record['tags'])
+        writer.writerows(records)
+
+
+def write_jsonl(batches, output):
+    for records in batches:
+        output.writelines(json.dumps(record) + '\n' for record in records)
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl}
+
+
+def dump_workdays(db, config, output, file_format='jsonl', since=None, until=None,
+                  customer=None, invoice_id=None):
+    rows = workday_rows(db, since, until, customer, invoice_id)
+    WRITERS[file_format](iter_batches(db, config, rows), output)
+    output.flush()
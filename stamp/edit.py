@@ -1,6 +1,8 @@
 import sys
 import re
 
+from .mappings import Customer
+
 __all__ = ['edit_workday',
            'edit_customer',
            'edit_project',
@@ -11,7 +13,7 @@ def edit_workday(args):
     if args.comment:
         workday.comment = args.comment
     if args.customer:
-        workday.customer = args.customer
+        workday.customer = args.db.get_by_name(Customer, args.customer)
     if args.project:
         workday.project = args.db.get_project(args.project)
     return workday
@@ -8,7 +8,10 @@ __all__ = ['TagOutsideTimeBoundaryError',
            'CurrentStampNotFoundError',
            'CanceledByUser',
            'RequiredValueError',
-           'DeleteNotAllowedError']
+           'DeleteNotAllowedError',
+           'InvalidImportRowError',
+           'InvalidSearchQueryError',
+           'SearchNotAvailableError']
 
 class StampError(Exception):
     pass
@@ -61,3 +64,15 @@ class DeleteNotAllowedError(StampError):
 
 class ConfigValueError(StampError):
     pass
+
+
+class InvalidImportRowError(StampError):
+    pass
+
+
+class InvalidSearchQueryError(StampError):
+    pass
+
+
+class SearchNotAvailableError(StampError):
+    pass
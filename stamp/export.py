@@ -1,14 +1,21 @@
 import os
 import sys
+import json
 import calendar
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy.orm import object_session
 
 from datetime import datetime, timedelta
 
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Spacer, Table, Paragraph, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Spacer, Table, TableStyle, Paragraph, PageBreak
+from reportlab.lib import colors
 from reportlab.lib.units import inch
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT, TA_CENTER
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.utils import ImageReader
 
 from .constants import FILE_DIR, INVOICE_DIR
 from .exceptions import (TooManyMatchesError, ArgumentError, NoMatchesError,
@@ -16,12 +23,15 @@ from .exceptions import (TooManyMatchesError, ArgumentError, NoMatchesError,
                          TooManyMatchingDatabaseEntriesError)
 from .helpers import calculate_workhours, calculate_wage, get_month_names, error_handler
 from .formatting import yes_or_no
-from .status import Status
+from .status import Status, InvoiceDrift
 from .add import create_invoice
 from .mappings import Workday, Customer, Project
-from .db import Database
+from .db import Database, get_tags_by_workday
+from .config import engine_profile
 
-__all__ = ['export_invoice']
+__all__ = ['InvoiceRenderer',
+           'export_invoice',
+           'export_all_invoices']
 
 
 class GetExportFilter(object):  # pylint: disable=too-few-public-methods
@@ -49,15 +59,20 @@ class GetExportFilter(object):  # pylint: disable=too-few-public-methods
             return ''.join(months)
 
     def _get_customer(self, customer):
+        if not customer:
+            return None
         try:
-            customer = self.db.get('Customer').filter(Customer.name == customer).first()
+            customer = self.db.get_by_name(Customer, customer)
         except NoMatchingDatabaseEntryError as err_msg:
             error_handler(err_msg)
         return customer
 
     def _get_project(self, project):
+        if not project:
+            return None
         try:
-            project = self.db.get('Project').filter(Project.name == project).first()
+            project = self.db.get_by_name(Project, project,
+                                          self.customer.id if self.customer else None)
         except NoMatchingDatabaseEntryError as err_msg:
             error_handler(err_msg)
         return project
@@ -71,33 +86,17 @@ class GetExportFilter(object):  # pylint: disable=too-few-public-methods
         return start + timedelta(days=_month_days)
 
 
-def create_pdf(workdays, save_dir, config, invoice_id=None): # NOQA
-    if invoice_id:
-        file_name = str(invoice_id) + '-invoice.pdf'
-    else:
-        file_name = 'report.pdf'
-
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
+class InvoiceRenderer(object):
+    """Renders invoice PDFs, reusable for any number of invoices.
 
-    file_dir = os.path.join(save_dir, file_name)
+    Paragraph and table styles, the decoded logo and the static parts of the
+    page decorations depend only on the config and are prepared once here,
+    so batch exports only pay for the per invoice content.
+    """
+    # Bump whenever the layout changes so fingerprinted PDFs are rendered again
+    version = 3
 
-    # Document settings
     PAGE_WIDTH, PAGE_HEIGHT = A4
-
-    styles = getSampleStyleSheet()
-    header_style = ParagraphStyle('header', alignment=TA_CENTER, fontName='Times-Bold',
-                                  textColor='white', backColor='black')
-    workday_style = ParagraphStyle('workday', alignment=TA_CENTER, fontName='Times-Roman')
-    workday_conclusion_style = ParagraphStyle('workday-conclusion', alignment=TA_CENTER, fontName='Times-Bold')
-    tag_header_style = ParagraphStyle('tag-header', alignment=TA_CENTER, fontName='Times-Bold',
-                                      fontSize=12)
-    tag_style = ParagraphStyle('tag', alignment=TA_CENTER, fontName='Times-Roman')
-
-    logo_file = os.path.join(FILE_DIR, 'logo.png')
-    invoice_date = workdays[0].invoice.created
-    maturity_date = datetime.now() + timedelta(days=60)
-    delivery_date = datetime.now()
     customer_height = PAGE_HEIGHT - 20
     customer_width = 50
     customer_height2 = PAGE_HEIGHT - 130
@@ -107,131 +106,236 @@ def create_pdf(workdays, save_dir, config, invoice_id=None): # NOQA
     bottom_width = 18
     bottom_end_width = PAGE_WIDTH - 108
     bottom_height = 18
-    output_hours = sum([calculate_workhours(w.start, w.end) for w in workdays])
-    output_wage = calculate_wage(output_hours, config.values.wage_per_hour.value)
 
-    def myFirstPage(canvas, doc):
-        canvas.saveState()
+    def __init__(self, config):
+        self.config = config
+        self.wage_per_hour = config.values.wage_per_hour.value
+        self.currency = config.values.currency.value
+        self.tag_style = ParagraphStyle('tag', alignment=TA_CENTER, fontName='Times-Roman')
+        # Project names are free text and have to wrap within their column
+        self.workday_style = ParagraphStyle('workday', alignment=TA_CENTER, fontName='Times-Roman')
+        # Plain strings styled per table are far cheaper than one Paragraph per cell
+        self.header_table_style = TableStyle([('FONT', (0, 0), (-1, -1), 'Times-Bold'),
+                                              ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                                              ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
+                                              ('BACKGROUND', (0, 0), (-1, -1), colors.black),
+                                              ('LEFTPADDING', (0, 0), (-1, -1), 0),
+                                              ('RIGHTPADDING', (0, 0), (-1, -1), 0)])
+        self.workday_table_style = TableStyle([('FONT', (0, 0), (-1, -1), 'Times-Roman'),
+                                               ('FONT', (0, -1), (-1, -1), 'Times-Bold'),
+                                               ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                                               ('ROWBACKGROUNDS', (0, 0), (-1, -1), [None, colors.lightgrey])])
+        # One flat table per workday, alternating tag header and tag text rows
+        self.tag_table_styles = {}
+        self.header_row = [[_('Date'), _('Project'), _('From'), _('To'), _('Hours'), _('To pay')]]
+
+        logo_file = os.path.join(FILE_DIR, 'logo.png')
         if os.path.isfile(logo_file):
-            canvas.drawImage(logo_file, PAGE_WIDTH - 110, customer_height - 75, width=81, height=81, mask=[0, 0, 0, 0, 0, 0],
-                             preserveAspectRatio=True)
-
-        # Sellers customer info
-        canvas.setFont('Times-Bold', 12)
-        canvas.drawString(customer_width, customer_height, config.values.company_name.value)
-        canvas.setFont('Times-Bold', 9)
-        canvas.drawString(customer_width, customer_height - 37, _("Organization number:"))
-        canvas.drawString(customer_width, customer_height - 48, _("Email:"))
-        canvas.drawString(customer_width, customer_height - 59, _("Phone number:"))
-        canvas.setFont('Times-Roman', 9)
-        canvas.drawString(customer_width, customer_height - 10, config.values.company_address.value)
-        canvas.drawString(customer_width, customer_height - 21, config.values.company_zip.value)
-        canvas.drawString(customer_width + 50, customer_height - 37, config.values.organization_number.value)
-        canvas.drawString(customer_width + 50, customer_height - 48, config.values.mail_address.value)
-        canvas.drawString(customer_width + 50, customer_height - 59, config.values.phone_number.value)
-
-        # Buyers customer info
-        canvas.setFont('Times-Bold', 14)
-        canvas.drawString(customer_width2, customer_height2,
-                          workdays[0].customer.name)
-        canvas.setFont('Times-Roman', 9)
-        canvas.drawString(customer_width2, customer_height2 - 15, str(workdays[0].customer.address))
-        canvas.drawString(customer_width2, customer_height2 - 26, str(workdays[0].customer.zip_code))
-
-        # Invoice
-        canvas.setFont('Times-Bold', 14)
-        canvas.drawString(invoice_width, invoice_height, _("Faktura"))
-        canvas.setFont('Times-Bold', 9)
-        canvas.drawString(invoice_width, invoice_height - 15, _("Kunde nr:"))
-        canvas.drawString(invoice_width, invoice_height - 26, _("Faktura nr:"))
-        canvas.drawString(invoice_width, invoice_height - 37, _("Faktura dato:"))
-        canvas.drawString(invoice_width, invoice_height - 48, _("Forfalls dato:"))
-        canvas.drawString(invoice_width, invoice_height - 59, _("Leverings dato:"))
-        canvas.setFont('Times-Roman', 9)
-        canvas.drawString(invoice_width + 80, invoice_height - 15, str(workdays[0].customer.id))
-        canvas.drawString(invoice_width + 80, invoice_height - 26, str(invoice_id))
-        canvas.drawString(invoice_width + 80, invoice_height - 37, invoice_date.strftime('%d.%m.%Y'))
-        canvas.drawString(invoice_width + 80, invoice_height - 48, maturity_date.strftime('%d.%m.%Y'))
-        canvas.drawString(invoice_width + 80, invoice_height - 59, delivery_date.strftime('%d.%m.%Y'))
-
-        # Bottom info
-        canvas.setFont('Times-Roman', 9)
-        canvas.drawCentredString(PAGE_WIDTH/2.0, bottom_height, str(round(output_wage, 2)))
-        canvas.drawString(bottom_width, bottom_height, config.values.company_name.value)
-        canvas.drawString(bottom_end_width, bottom_height, config.values.company_account_number.value)
-
-        canvas.restoreState()
-
-    def myLaterPages(canvas, doc):
-        canvas.saveState()
-        # Bottom info
+            self.logo = ImageReader(logo_file)
+            logo_stat = os.stat(logo_file)
+            logo_stat = (logo_stat.st_size, logo_stat.st_mtime)
+        else:
+            self.logo = None
+            logo_stat = None
+
+        # (font, size, x, y, text) drawn on the first page of every invoice
+        values = config.values
+        self.seller_lines = [
+            ('Times-Bold', 12, self.customer_width, self.customer_height, values.company_name.value),
+            ('Times-Bold', 9, self.customer_width, self.customer_height - 37, _("Organization number:")),
+            ('Times-Bold', 9, self.customer_width, self.customer_height - 48, _("Email:")),
+            ('Times-Bold', 9, self.customer_width, self.customer_height - 59, _("Phone number:")),
+            ('Times-Roman', 9, self.customer_width, self.customer_height - 10, values.company_address.value),
+            ('Times-Roman', 9, self.customer_width, self.customer_height - 21, values.company_zip.value),
+            ('Times-Roman', 9, self.customer_width + 50, self.customer_height - 37, values.organization_number.value),
+            ('Times-Roman', 9, self.customer_width + 50, self.customer_height - 48, values.mail_address.value),
+            ('Times-Roman', 9, self.customer_width + 50, self.customer_height - 59, values.phone_number.value),
+            ('Times-Bold', 14, self.invoice_width, self.invoice_height, _("Faktura")),
+            ('Times-Bold', 9, self.invoice_width, self.invoice_height - 15, _("Kunde nr:")),
+            ('Times-Bold', 9, self.invoice_width, self.invoice_height - 26, _("Faktura nr:")),
+            ('Times-Bold', 9, self.invoice_width, self.invoice_height - 37, _("Faktura dato:")),
+            ('Times-Bold', 9, self.invoice_width, self.invoice_height - 48, _("Forfalls dato:")),
+            ('Times-Bold', 9, self.invoice_width, self.invoice_height - 59, _("Leverings dato:")),
+        ]
+        self.company_name = values.company_name.value
+        self.company_account_number = values.company_account_number.value
+
+        # Everything besides the invoice itself that ends up in the document
+        self.static_fingerprint = json.dumps([self.version, logo_stat, self.seller_lines, self.header_row,
+                                              self.wage_per_hour, self.currency, self.company_account_number])
+
+    def fingerprint(self, invoice, workdays, tags_by_workday):
+        """Hash of every input of the invoice document.
+
+        The maturity and delivery dates are left out, they follow the day the
+        pdf is rendered.
+        """
+        customer = invoice.customer
+        content = [self.static_fingerprint, invoice.id, str(invoice.created),
+                   [customer.id, customer.name, customer.address, customer.zip_code],
+                   [[workday.id, str(workday.start), str(workday.end), workday.project.name,
+                     [[str(tag.recorded), tag.tag] for tag in tags_by_workday[workday.id]]]
+                    for workday in workdays]]
+        return hashlib.sha256(json.dumps(content).encode('utf-8')).hexdigest()
+
+    def _tag_table_style(self, tags):
+        try:
+            return self.tag_table_styles[tags]
+        except KeyError:
+            commands = [('ALIGN', (0, 0), (-1, -1), 'CENTER')]
+            for row in range(0, tags * 2, 2):
+                commands.extend([('FONT', (0, row), (0, row), 'Times-Bold', 12),
+                                 ('LINEBELOW', (0, row), (0, row), 0.1, colors.black),
+                                 ('BOTTOMPADDING', (0, row + 1), (0, row + 1), 12)])
+            commands.append(('BOTTOMPADDING', (0, -1), (-1, -1), 45))
+            style = self.tag_table_styles[tags] = TableStyle(commands)
+            return style
+
+    @staticmethod
+    def _draw_lines(canvas, lines):
+        for font, size, x, y, text in lines:
+            canvas.setFont(font, size)
+            canvas.drawString(x, y, text)
+
+    def _draw_footer(self, canvas, output_wage):
         canvas.setFont('Times-Roman', 9)
-        canvas.drawCentredString(PAGE_WIDTH/2.0, bottom_height, str(round(output_wage, 2)))
-        canvas.drawString(bottom_width, bottom_height, config.values.company_name.value)
-        canvas.drawString(bottom_end_width, bottom_height, config.values.company_account_number.value)
-        canvas.restoreState()
-
-    def new_page(canvas, doc):
-        canvas.showPage()
-        canvas.restoreState()
-
-    doc = SimpleDocTemplate(file_dir)
-    Story = [Spacer(1, 2*inch)]
-    workday_header = [[Paragraph(_('Date'), header_style),
-                      Paragraph(_('Project'), header_style),
-                      Paragraph(_('From'), header_style),
-                      Paragraph(_('To'), header_style),
-                      Paragraph(_('Hours'), header_style),
-                      Paragraph(_('To pay'), header_style)]]
-    Story.append(Table(workday_header, colWidths=100,
-                       style=[('LEFTPADDING', (0,0), (-1,-1), 0),
-                              ('RIGHTPADDING', (0,0), (-1,-1), 0)]))
-    workday_rows = []
-    tag_rows = []
-    for workday in workdays:
-        workday_tags = []
-        hours = calculate_workhours(workday.start, workday.end)
-        workday_rows.append([Paragraph(workday.start.date().isoformat(), workday_style),
-                             Paragraph(workday.project.name, workday_style),
-                             Paragraph(workday.start.time().strftime('%H:%M'), workday_style),
-                             Paragraph(workday.end.time().strftime('%H:%M'), workday_style),
-                             Paragraph(str(round(hours, 2)), workday_style),
-                             Paragraph('%s %s' % (str(round(calculate_wage(hours, config.values.wage_per_hour.value), 2)), config.values.currency.value), workday_style)])
-        for tag in workday.tags:
-            workday_tags.append([Table([[Paragraph(workday.start.date().isoformat() + ' ' + tag.recorded.strftime('%H:%M'), tag_header_style)],
-                                [Paragraph(tag.tag, tag_style)]], style=[('LINEBELOW', (0,0), (0,0), 0.1, 'black'),
-                                                                         ('BOTTOMPADDING', (0,1), (-1,-1), 12)])])
-        if workday_tags:
-            tag_rows.append([Table(workday_tags, style=[('BOTTOMPADDING', (-1,-1), (-1,-1), 45)])])
-    workday_rows.append(['', '', '', '', Paragraph(str(round(output_hours, 2)), workday_conclusion_style),
-                         Paragraph('%s %s' % (str(round(output_wage, 2)), config.values.currency.value), workday_conclusion_style)])
-
-
-    # Add workdays to story
-    Story.append(Table(workday_rows, colWidths=100,
-                       style=[('ROWBACKGROUNDS', (0,0), (-1,-1), [None, 'lightgrey'])]))
-
-    Story.append(PageBreak())
-
-    # Add tags to story
-    if tag_rows:
-        Story.append(Table(tag_rows, colWidths=500))
-
-    doc.build(Story, onFirstPage=myFirstPage, onLaterPages=myLaterPages)
-
-    return file_dir
-
-
-def export_pdf(db, year, month, customer, invoice, config):
+        canvas.drawCentredString(self.PAGE_WIDTH/2.0, self.bottom_height, str(round(output_wage, 2)))
+        canvas.drawString(self.bottom_width, self.bottom_height, self.company_name)
+        canvas.drawString(self.bottom_end_width, self.bottom_height, self.company_account_number)
+
+    def _first_page(self, workdays, invoice_id, output_wage):
+        customer = workdays[0].customer
+        invoice_date = workdays[0].invoice.created
+        maturity_date = datetime.now() + timedelta(days=60)
+        delivery_date = datetime.now()
+        buyer_lines = [
+            ('Times-Bold', 14, self.customer_width2, self.customer_height2, customer.name),
+            ('Times-Roman', 9, self.customer_width2, self.customer_height2 - 15, str(customer.address)),
+            ('Times-Roman', 9, self.customer_width2, self.customer_height2 - 26, str(customer.zip_code)),
+            ('Times-Roman', 9, self.invoice_width + 80, self.invoice_height - 15, str(customer.id)),
+            ('Times-Roman', 9, self.invoice_width + 80, self.invoice_height - 26, str(invoice_id)),
+            ('Times-Roman', 9, self.invoice_width + 80, self.invoice_height - 37, invoice_date.strftime('%d.%m.%Y')),
+            ('Times-Roman', 9, self.invoice_width + 80, self.invoice_height - 48, maturity_date.strftime('%d.%m.%Y')),
+            ('Times-Roman', 9, self.invoice_width + 80, self.invoice_height - 59, delivery_date.strftime('%d.%m.%Y')),
+        ]
+
+        def first_page(canvas, doc):
+            canvas.saveState()
+            if self.logo:
+                canvas.drawImage(self.logo, self.PAGE_WIDTH - 110, self.customer_height - 75, width=81, height=81,
+                                 mask=[0, 0, 0, 0, 0, 0], preserveAspectRatio=True)
+            self._draw_lines(canvas, self.seller_lines)
+            self._draw_lines(canvas, buyer_lines)
+            self._draw_footer(canvas, output_wage)
+            canvas.restoreState()
+        return first_page
+
+    def _later_pages(self, output_wage):
+        def later_pages(canvas, doc):
+            canvas.saveState()
+            self._draw_footer(canvas, output_wage)
+            canvas.restoreState()
+        return later_pages
+
+    def _money(self, amount):
+        return '%s %s' % (str(round(amount, 2)), self.currency)
+
+    def render(self, workdays, save_dir, invoice_id=None, tags_by_workday=None):
+        """Write the invoice of workdays to save_dir and return the file path.
+
+        The tags of all the workdays are read in one query unless
+        tags_by_workday from Database.get_tags_by_workday is given.
+        """
+        if invoice_id:
+            file_name = str(invoice_id) + '-invoice.pdf'
+        else:
+            file_name = 'report.pdf'
+
+        if not os.path.exists(save_dir):
+            os.makedirs(save_dir)
+
+        file_dir = os.path.join(save_dir, file_name)
+
+        # Dynamic relationships query again on every iteration
+        workdays = list(workdays)
+        if tags_by_workday is None:
+            tags_by_workday = get_tags_by_workday(object_session(workdays[0]) if workdays else None,
+                                                  [workday.id for workday in workdays])
+        output_hours = 0
+        workday_rows = []
+        tag_tables = []
+        for workday in workdays:
+            hours = calculate_workhours(workday.start, workday.end)
+            output_hours += hours
+            workday_rows.append([workday.start.date().isoformat(),
+                                 Paragraph(workday.project.name, self.workday_style),
+                                 workday.start.time().strftime('%H:%M'),
+                                 workday.end.time().strftime('%H:%M'),
+                                 str(round(hours, 2)),
+                                 self._money(calculate_wage(hours, self.wage_per_hour))])
+            tag_rows = []
+            for tag in tags_by_workday[workday.id]:
+                tag_rows.append([workday.start.date().isoformat() + ' ' + tag.recorded.strftime('%H:%M')])
+                tag_rows.append([Paragraph(tag.tag, self.tag_style)])
+            if tag_rows:
+                tag_tables.append(Table(tag_rows, colWidths=500,
+                                        style=self._tag_table_style(len(tag_rows) // 2)))
+        output_wage = calculate_wage(output_hours, self.wage_per_hour)
+        workday_rows.append(['', '', '', '', str(round(output_hours, 2)), self._money(output_wage)])
+
+        doc = SimpleDocTemplate(file_dir)
+        Story = [Spacer(1, 2*inch),
+                 Table(self.header_row, colWidths=100, style=self.header_table_style),
+                 Table(workday_rows, colWidths=100, style=self.workday_table_style),
+                 PageBreak()]
+        Story.extend(tag_tables)
+
+        doc.build(Story, onFirstPage=self._first_page(workdays, invoice_id, output_wage),
+                  onLaterPages=self._later_pages(output_wage))
+
+        return file_dir
+
+
+def create_pdf(workdays, save_dir, config, invoice_id=None, tags_by_workday=None):
+    return InvoiceRenderer(config).render(workdays, save_dir, invoice_id, tags_by_workday)
+
+
+def invoice_save_dir(db, customer, year, month):
+    return os.path.join(INVOICE_DIR,
+                        # DB name
+                        db.engine.url.database.split('/')[-1].split('.')[0],
+                        customer,
+                        str(year),
+                        month)
+
+
+def invoice_content(db, invoice):
+    """Workdays of the invoice and their tags, read once for fingerprint and pdf."""
+    workdays = list(invoice.workdays)
+    return workdays, db.get_tags_by_workday([workday.id for workday in workdays])
+
+
+def invoice_fingerprint(db, invoice, renderer):
+    return renderer.fingerprint(invoice, *invoice_content(db, invoice))
+
+
+def pdf_is_current(invoice, fingerprint):
+    return bool(invoice.pdf and invoice.fingerprint == fingerprint
+                and os.path.isfile(invoice.pdf))
+
+
+def export_pdf(db, year, month, customer, invoice, config, force=False):
+    renderer = InvoiceRenderer(config)
+    workdays, tags_by_workday = invoice_content(db, invoice)
+    fingerprint = renderer.fingerprint(invoice, workdays, tags_by_workday)
+    if not force and pdf_is_current(invoice, fingerprint):
+        print(_('Pdf is unchanged, reusing: %s') % invoice.pdf)
+        return invoice.pdf
     try:
-        save_dir = os.path.join(INVOICE_DIR,
-                                # DB name
-                                db.session.connection().engine.url.database.split('/')[-1].split('.')[0],
-                                customer,
-                                str(year),
-                                month)
-        pdf_file = create_pdf(invoice.workdays, save_dir, config, invoice.id)
+        save_dir = invoice_save_dir(db, customer, year, month)
+        pdf_file = renderer.render(workdays, save_dir, invoice.id, tags_by_workday)
         invoice.pdf = pdf_file
+        invoice.fingerprint = fingerprint
         invoice.month = month
         invoice.year = year
         print(_('Saved pdf here: %s') % pdf_file)
@@ -242,22 +346,28 @@ def export_pdf(db, year, month, customer, invoice, config):
     return pdf_file
 
 
-def export_invoice(db, year, month, customer, project, config, save_pdf=False, ask=True):
-    export_filter = GetExportFilter(db, year, month, customer, project)
-    workdays = db.get('Workday').filter(Workday.start >= export_filter.start,
+def month_workdays(db, export_filter):
+    workdays = db.query(Workday).filter(Workday.start >= export_filter.start,
                                         Workday.end < export_filter.end,
                                         Workday.customer_id == export_filter.customer.id)
-    if project:
-        workdays.filter(Workday.project_id == export_filter.project.id)
-    workdays.order_by(Workday.start)
+    if export_filter.project:
+        workdays = workdays.filter(Workday.project_id == export_filter.project.id)
+    return workdays.order_by(Workday.start)
+
+
+def export_invoice(db, year, month, customer, project, config, save_pdf=False, ask=True, force=False):
+    export_filter = GetExportFilter(db, year, month, customer, project)
+    workdays = month_workdays(db, export_filter)
 
     try:
-        related_invoice = db.get_related_invoice(year, export_filter.month)
-        workday_ids = [i.id for i in workdays]
-        related_invoice_ids = [i.id for i in related_invoice.workdays]
-        if workday_ids == related_invoice_ids:
+        related_invoice = db.get_related_invoice(year, export_filter.month,
+                                                 export_filter.customer.id)
+        drift = InvoiceDrift(db.get_invoice_drift(related_invoice, workdays))
+        if not drift:
             if save_pdf and related_invoice.pdf:
-                if ask:
+                # An unchanged pdf is reused by export_pdf without asking
+                if ask and (force or not pdf_is_current(
+                        related_invoice, invoice_fingerprint(db, related_invoice, InvoiceRenderer(config)))):
                     yes_or_no(_('This invoice already has an exported pdf, do you wish to create a new one?'),
                               no_message=_('Canceling...'),
                               no_function=sys.exit,
@@ -269,12 +379,8 @@ def export_invoice(db, year, month, customer, project, config, save_pdf=False, a
             else:
                 print(_('Invoice already exists. Append --pdf if you want to export pdf!'))
         else:
-            print_(_('Old workdays:'))
-            status_object = Status(related_invoice.workdays, config)
-            print(status_object)
-            print(_('Current workdays:'))
-            status_object = Status(workdays, config)
-            print(status_object)
+            print(_('Workdays changed since invoice %d was created:') % related_invoice.id)
+            print(drift)
             if ask:
                 invoice = yes_or_no(_('Invoice already exists for this month but does not contain the same work days/hours. Do you wish to create a new invoice for this month? This cannot be undone!'),
                                     no_message=_('Canceling...'),
@@ -304,4 +410,103 @@ def export_invoice(db, year, month, customer, project, config, save_pdf=False, a
         print(_('Canceling...'))
         sys.exit(0)
     if save_pdf:
-        return export_pdf(db, year, export_filter.month, customer, invoice, config)
+        return export_pdf(db, year, export_filter.month, customer, invoice, config, force)
+
+
+def refresh_invoice(db, year, month, customer):
+    """Invoice holding exactly the customer's workdays of the month, never asks.
+
+    The newest invoice of the month is reused when it has the same workdays,
+    otherwise a new one is created.
+    """
+    export_filter = GetExportFilter(db, year, month, customer, None)
+    workdays = month_workdays(db, export_filter)
+    try:
+        related_invoice = db.get_related_invoice(year, export_filter.month,
+                                                 export_filter.customer.id)
+        if not db.get_invoice_drift(related_invoice, workdays):
+            return related_invoice
+    except NoMatchingDatabaseEntryError:
+        pass
+    return create_invoice(db, workdays, customer, year, export_filter.month)
+
+
+_renderer = None
+_profile = None
+
+
+def init_renderer(config):
+    """Prepare the renderer and database settings shared by the invoices of this process."""
+    global _renderer, _profile
+    _renderer = InvoiceRenderer(config)
+    _profile = engine_profile(config)
+
+
+def render_invoice_pdf(db_file, invoice_id, save_dir):
+    """Worker process entry point, renders from its own database connection."""
+    db = Database(db_file, ask=False, profile=_profile)
+    try:
+        invoice = db.get('Invoice', invoice_id)
+        workdays, tags_by_workday = invoice_content(db, invoice)
+        return invoice_id, _renderer.render(workdays, save_dir, invoice_id, tags_by_workday)
+    finally:
+        db.session.close()
+
+
+def export_all_invoices(db, year, month, config, save_pdf=False, jobs=None, force=False):
+    """Create or refresh the invoice of every customer with workdays in the month.
+
+    The invoices are committed in one transaction before any rendering so the
+    PDFs can be rendered by a pool of worker processes that read the database
+    themselves. The PDF paths are written back from this process. Invoices
+    whose fingerprint matches their existing pdf are not rendered again
+    unless forced.
+    """
+    export_filter = GetExportFilter(db, year, month, None, None)
+    customers = db.session.query(Customer).join(Workday, Workday.customer_id == Customer.id).filter(
+        Workday.start >= export_filter.start,
+        Workday.end < export_filter.end).distinct().order_by(Customer.name).all()
+    if not customers:
+        raise NoMatchingDatabaseEntryError(_('No workdays found for %s %s!') % (export_filter.month, year))
+    invoices = [refresh_invoice(db, year, month, customer.name) for customer in customers]
+    db.commit()
+    for invoice in invoices:
+        print(_('Invoice %d: %s') % (invoice.id, invoice.customer.name))
+    if not save_pdf:
+        return []
+
+    renderer = InvoiceRenderer(config)
+    fingerprints = {}
+    pdf_files = []
+    for invoice in invoices:
+        fingerprint = invoice_fingerprint(db, invoice, renderer)
+        if not force and pdf_is_current(invoice, fingerprint):
+            print(_('Pdf is unchanged, reusing: %s') % invoice.pdf)
+            pdf_files.append(invoice.pdf)
+        else:
+            fingerprints[invoice.id] = fingerprint
+    print(_('Pdf cache: %d reused, %d to render') % (len(pdf_files), len(fingerprints)))
+    if not fingerprints:
+        return pdf_files
+
+    jobs = jobs or os.cpu_count() or 1
+    db_file = db.engine.url.database
+    tasks = [(db_file, invoice.id, invoice_save_dir(db, invoice.customer.name, year, export_filter.month))
+             for invoice in invoices if invoice.id in fingerprints]
+    if jobs == 1 or len(tasks) == 1:
+        init_renderer(config)
+        results = [render_invoice_pdf(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)), initializer=init_renderer,
+                                 initargs=(config,)) as executor:
+            futures = [executor.submit(render_invoice_pdf, *task) for task in tasks]
+            results = [future.result() for future in futures]
+
+    for invoice_id, pdf_file in results:
+        invoice = db.get('Invoice', invoice_id)
+        invoice.pdf = pdf_file
+        invoice.fingerprint = fingerprints[invoice_id]
+        db.session.add(invoice)
+        print(_('Saved pdf here: %s') % pdf_file)
+        pdf_files.append(pdf_file)
+    return pdf_files
@@ -1,6 +1,10 @@
+import os
 import sys
 import tty
+import shlex
 import termios
+import subprocess
+from contextlib import contextmanager
 from .helpers import get_terminal_width
 from .exceptions import CanceledByUser
 
@@ -9,7 +13,8 @@ __all__ = ['yes_or_no',
            'value_for',
            'divider',
            'format_column',
-           'boolean_yes_or_no']
+           'boolean_yes_or_no',
+           'output_stream']
 
 def yes_or_no(question,
               yes_message=None,
@@ -110,3 +115,21 @@ def boolean_yes_or_no(boolean):
         return 'Yes'
     else:
         return 'No'
+
+
+@contextmanager
+def output_stream(use_pager=False):
+    """Stream to write long output to, piped through $PAGER when asked for."""
+    if not use_pager or not sys.stdout.isatty():
+        yield sys.stdout
+        return
+    pager = subprocess.Popen(shlex.split(os.environ.get('PAGER', 'less -S')),
+                             stdin=subprocess.PIPE, universal_newlines=True)
+    try:
+        yield pager.stdin
+    finally:
+        try:
+            pager.stdin.close()
+        except BrokenPipeError:
+            pass
+        pager.wait()
@@ -0,0 +1,116 @@
+"""Columnar workday data for analytics over long histories.
+
+Workdays are held as contiguous numpy arrays instead of ORM objects so
+hours, wages and totals per week, month, customer or project are computed
+with vectorised operations. Requires numpy, see the 'analytics' extra in
+setup.py.
+
+Times are naive like everywhere else in stamp and are stored as int64
+seconds since 1970-01-01 without any timezone conversion.
+"""
+
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError('WorkdayFrame requires numpy, install it with: pip install stamp[analytics]')
+
+__all__ = ['WorkdayFrame',
+           'GROUP_BY']
+
+GROUP_BY = ('week', 'month', 'customer', 'project')
+
+# 1970-01-01 was a Thursday, shifting by three days makes weeks start on Monday
+WEEK_OFFSET_DAYS = 3
+NO_INVOICE = 0
+
+
+class WorkdayFrame(object):
+    """Completed workdays as parallel arrays, one element per workday.
+
+    `customer` and `project` hold the database ids, `invoice` holds
+    NO_INVOICE for workdays that are not invoiced yet. Names for the ids are
+    kept in `customer_names` and `project_names`.
+    """
+    columns = ('id', 'start', 'end', 'customer', 'project', 'invoice')
+
+    def __init__(self, id, start, end, customer, project, invoice,
+                 customer_names=None, project_names=None):
+        self.id = np.ascontiguousarray(id, dtype=np.int64)
+        self.start = np.ascontiguousarray(start, dtype=np.int64)
+        self.end = np.ascontiguousarray(end, dtype=np.int64)
+        self.customer = np.ascontiguousarray(customer, dtype=np.int64)
+        self.project = np.ascontiguousarray(project, dtype=np.int64)
+        self.invoice = np.ascontiguousarray(invoice, dtype=np.int64)
+        self.customer_names = customer_names or {}
+        self.project_names = project_names or {}
+
+    @classmethod
+    def from_rows(cls, rows, customer_names=None, project_names=None):
+        """Build from (id, start, end, customer_id, project_id, invoice_id) integer rows.
+
+        Streams the rows straight into one array, a database cursor can be
+        passed without fetching it into a list first.
+        """
+        data = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, len(cls.columns))
+        return cls(*data.T, customer_names=customer_names, project_names=project_names)
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, mask):
+        """Subset of the frame selected by a boolean mask or index array."""
+        return WorkdayFrame(*(getattr(self, column)[mask] for column in self.columns),
+                            customer_names=self.customer_names,
+                            project_names=self.project_names)
+
+    def seconds(self):
+        return self.end - self.start
+
+    def hours(self):
+        return self.seconds() / 3600
+
+    def wage(self, hourly_wage):
+        return self.hours() * hourly_wage
+
+    def total_hours(self):
+        return self.seconds().sum() / 3600
+
+    def weeks(self):
+        """Monday of each workday's week as datetime64[D]."""
+        days = self.start // 86400
+        return (days - (days + WEEK_OFFSET_DAYS) % 7).astype('datetime64[D]')
+
+    def months(self):
+        return self.start.astype('datetime64[s]').astype('datetime64[M]')
+
+    def _keys(self, group_by):
+        if group_by == 'week':
+            return self.weeks()
+        elif group_by == 'month':
+            return self.months()
+        elif group_by == 'customer':
+            return self.customer
+        elif group_by == 'project':
+            return self.project
+        raise ValueError(_('group_by must be one of: %s') % ', '.join(GROUP_BY))
+
+    def _label(self, group_by, key):
+        if group_by == 'customer':
+            return self.customer_names.get(int(key), str(key))
+        elif group_by == 'project':
+            return self.project_names.get(int(key), str(key))
+        return str(key)
+
+    def group_by(self, group_by):
+        """(label, seconds, workdays) per group ordered by key.
+
+        Same row layout as rollup.get_summary so the rows can be shown with
+        status.Summary.
+        """
+        keys, codes = np.unique(self._keys(group_by), return_inverse=True)
+        seconds = np.bincount(codes, weights=self.seconds(), minlength=len(keys))
+        workdays = np.bincount(codes, minlength=len(keys))
+        return [(self._label(group_by, key), int(total), int(count))
+                for key, total, count in zip(keys, seconds, workdays)]
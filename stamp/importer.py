@@ -0,0 +1,143 @@
+import os
+import csv
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import select
+
+from .mappings import Workday, Customer, Project, Tag
+from .exceptions import InvalidImportRowError
+
+__all__ = ['import_workdays']
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+BATCH_SIZE = 5000
+
+
+def guess_format(file_name):
+    extension = os.path.splitext(file_name)[1].lstrip('.').lower()
+    if extension in IMPORT_FORMATS:
+        return extension
+    raise InvalidImportRowError('Unable to tell the format of %s, use --format with one of: %s.'
+                                % (file_name, ', '.join(IMPORT_FORMATS)))
+
+
+def parse_datetime(value, line_number):
+    try:
+        return datetime.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        raise InvalidImportRowError('Line %d: %r is not a date and time in the YYYY-mm-dd HH:MM format!'
+                                    % (line_number, value))
+
+
+def read_csv(input_file):
+    """Rows with customer, project, start and end columns.
+
+    The optional tags column holds one tag per line, recorded at the start
+    of the workday.
+    """
+    for line_number, row in enumerate(csv.DictReader(input_file), 2):
+        tags = [{'tag': tag} for tag in (row.get('tags') or '').splitlines() if tag.strip()]
+        yield line_number, dict(row, tags=tags)
+
+
+def read_jsonl(input_file):
+    """One object per line, tags is a list of strings or of {recorded, tag} objects."""
+    for line_number, line in enumerate(input_file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as err:
+            raise InvalidImportRowError('Line %d: %s' % (line_number, err))
+        row['tags'] = [tag if isinstance(tag, dict) else {'tag': tag}
+                       for tag in row.get('tags') or []]
+        yield line_number, row
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+class NameMap(object):
+    """Customer and project ids by name, creating missing ones as they show up."""
+    def __init__(self, connection):
+        self.connection = connection
+        self.customers = dict(connection.execute(select([Customer.name, Customer.id])).fetchall())
+        self.projects = {(customer_id, name): project_id for name, customer_id, project_id in
+                         connection.execute(select([Project.name, Project.customer_id, Project.id]))}
+
+    def customer_id(self, name):
+        if name not in self.customers:
+            result = self.connection.execute(Customer.__table__.insert(), {Customer.name.name: name})
+            self.customers[name] = result.inserted_primary_key[0]
+        return self.customers[name]
+
+    def project_id(self, customer_id, name):
+        if (customer_id, name) not in self.projects:
+            result = self.connection.execute(Project.__table__.insert(),
+                                             {Project.name.name: name, 'customer_id': customer_id})
+            self.projects[(customer_id, name)] = result.inserted_primary_key[0]
+        return self.projects[(customer_id, name)]
+
+
+def prepare_row(line_number, row, names):
+    for key in ('customer', 'project', 'start', 'end'):
+        if not row.get(key):
+            raise InvalidImportRowError('Line %d: %s is missing!' % (line_number, key))
+    start = parse_datetime(row['start'], line_number)
+    end = parse_datetime(row['end'], line_number)
+    if end < start:
+        raise InvalidImportRowError('Line %d: workday ends before it starts!' % line_number)
+    customer_id = names.customer_id(row['customer'])
+    workday = {'start': start,
+               'end': end,
+               'customer_id': customer_id,
+               'project_id': names.project_id(customer_id, row['project'])}
+    tags = []
+    for tag in row['tags']:
+        recorded = parse_datetime(tag['recorded'], line_number) if tag.get('recorded') else start
+        if recorded < start or recorded > end:
+            raise InvalidImportRowError('Line %d: tag is recorded outside of the workday!' % line_number)
+        tags.append({'recorded': recorded, 'tag': tag['tag']})
+    return workday, tags
+
+
+def insert_batch(connection, batch):
+    connection.execute(Workday.__table__.insert(), [workday for workday, _tags in batch])
+    # The write lock is held for the whole transaction, so the batch got the
+    # rowids right after the previous highest one
+    last_id = connection.execute(select([Workday.id]).order_by(Workday.id.desc()).limit(1)).scalar()
+    first_id = last_id - len(batch) + 1
+    tags = [dict(tag, workday_id=workday_id)
+            for workday_id, (_workday, workday_tags) in enumerate(batch, first_id)
+            for tag in workday_tags]
+    if tags:
+        connection.execute(Tag.__table__.insert(), tags)
+    return len(tags)
+
+
+def import_workdays(db, input_file, file_format, batch_size=BATCH_SIZE):
+    """Insert every row of input_file as a completed workday.
+
+    Runs on the session's connection, so everything is one transaction that
+    is committed together with the rest of the command.
+    """
+    started = time.perf_counter()
+    connection = db.session.connection()
+    names = NameMap(connection)
+    rows = (prepare_row(line_number, row, names)
+            for line_number, row in READERS[file_format](input_file))
+    workday_count = 0
+    tag_count = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        tag_count += insert_batch(connection, batch)
+        workday_count += len(batch)
+    elapsed = time.perf_counter() - started
+    print('Imported %d workdays and %d tags in %.2f seconds (%d rows/sec).'
+          % (workday_count, tag_count, elapsed, workday_count / elapsed if elapsed else workday_count))
+    return workday_count, tag_count
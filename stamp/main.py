@@ -1,27 +1,31 @@
 import sys
-from .add import new_stamp
-from .end import end_stamp
-from .edit import edit_workday, edit_customer, edit_project, edit_invoice
-from .status import Status
-from .delete import delete_workday_or_tag
-from .tag import tag_stamp
-from .export import export_invoice
 from .exceptions import (NoMatchingDatabaseEntryError, CurrentStampNotFoundError,
                          NoMatchesError, TooManyMatchesError, CanceledByUser,
-                         NonExistingId, DeleteNotAllowedError, TooManyMatchingDatabaseEntriesError)
+                         NonExistingId, DeleteNotAllowedError, TooManyMatchingDatabaseEntriesError,
+                         InvalidImportRowError, ArgumentError, InvalidSearchQueryError,
+                         SearchNotAvailableError)
 from .helpers import error_handler
+from .formatting import output_stream
 from .decorators import db_commit_decorator, no_db_no_action_decorator
 
+# Handler modules are imported inside each command so that a command only
+# pays for what it uses, `stamp in` should never load reportlab for example.
+
 __all__ = ['stamp_in',
            'stamp_out',
            'tag',
            'status',
+           'report',
            'export',
            'delete',
-           'edit']
+           'edit',
+           'import_hours',
+           'dump',
+           'search']
 
 @db_commit_decorator
 def stamp_in(args):
+    from .add import new_stamp
     try:
         new_stamp(args.db, args.customer, args.project, args.date,
                   args.time)
@@ -32,6 +36,7 @@ def stamp_in(args):
 @no_db_no_action_decorator
 @db_commit_decorator
 def stamp_out(args):
+    from .end import end_stamp
     try:
         end_stamp(args.db, args.date, args.time)
     except (CurrentStampNotFoundError, CanceledByUser) as err_msg:
@@ -41,13 +46,14 @@ def stamp_out(args):
 @no_db_no_action_decorator
 @db_commit_decorator
 def tag(args):
+    from .tag import tag_stamp
     try:
         try:
             if args.id:
-                stamp = args.db.get('Workday', id)
+                stamp = args.db.get('Workday', args.id)
             else:
                 stamp = args.db.current_stamp()
-        except CurrentStampNotFoundError as err_msg:
+        except (CurrentStampNotFoundError, NonExistingId) as err_msg:
             error_handler(err_msg, db=args.db)
         tag_stamp(args.db, args.date, args.time, stamp, args.tag)
     except CanceledByUser as err_msg:
@@ -56,19 +62,43 @@ def tag(args):
 
 @no_db_no_action_decorator
 def status(args):
+    from .status import Status
     called_from = args.parser_object.split(' ')[-1]
     args.interface = 'cli'
     try:
-        if called_from != 'status':
-            db_query = args.db.get(called_from[:-1].capitalize(), args.id)
-            status_object = Status(db_query, args.config.values)
+        if called_from == 'summary':
+            from .status import Summary
+            from .rollup import get_summary, rebuild_rollup
+            if args.rebuild:
+                rebuild_rollup(args.db.session.connection())
+                args.db.commit()
+            print(Summary(get_summary(args.db, args.year, args.by), args.config, args.by))
+        elif called_from != 'status':
+            db_query = args.db.get(called_from[:-1].capitalize(), args.id, eager=True)
+            if called_from == 'workdays' and not args.id:
+                after = args.db.workday_key(args.after) if args.after else None
+                db_query = args.db.filter_workdays(db_query, args.since, args.until,
+                                                   args.limit, args.offset, after)
+            status_object = Status(db_query, args.config)
             if args.interface == 'cli':
-                print(status_object)
+                with output_stream(args.pager) as stream:
+                    status_object.write(stream)
             elif args.interface == 'ui':
                 status_object.ui()
+        elif args.watch:
+            from .watch import watch_current_stamp
+            try:
+                watch_current_stamp(args.db, args.config, args.format, args.interval, args.sidecar)
+            except KeyboardInterrupt:
+                pass
+        elif args.format == 'json':
+            from .watch import current_stamp_state, format_state
+            print(format_state(current_stamp_state(args.db), args.config, 'json'))
         else:
             try:
-                status_object.print_current_stamp(args.db.current_stamp())
+                current_stamp = args.db.current_stamp()
+                status_object = Status(current_stamp, args.config)
+                status_object.print_current_stamp(current_stamp)
             except CurrentStampNotFoundError as err_msg:
                 error_handler(err_msg)
     except NoMatchingDatabaseEntryError as err_msg:
@@ -77,20 +107,98 @@ def status(args):
         error_handler(err_msg, db=args.db)
 
 
+@no_db_no_action_decorator
+def report(args):
+    from .report import get_report
+    from .status import Report
+    try:
+        rows = get_report(args.db, args.per, args.by, args.date_from, args.date_to,
+                          args.time_from, args.time_to, args.customer, args.project)
+        with output_stream(args.pager) as stream:
+            stream.write(str(Report(rows, args.config, args.per, args.by)) + '\n')
+    except NoMatchingDatabaseEntryError as err_msg:
+        error_handler(err_msg, exit_on_error=False)
+
+
+@no_db_no_action_decorator
+def search(args):
+    from .search import search_tags, rebuild_search_index
+    from .status import SearchResults
+    try:
+        if args.rebuild:
+            rebuild_search_index(args.db.session.connection())
+            args.db.commit()
+        if not args.query:
+            if args.rebuild:
+                return
+            raise ArgumentError('Nothing to search for!')
+        rows = search_tags(args.db, ' '.join(args.query), args.date_from, args.date_to,
+                           args.time_from, args.time_to, args.customer, args.project,
+                           args.sort, args.limit, args.raw)
+        if not rows:
+            raise NoMatchesError('No tags match the search!')
+        with output_stream(args.pager) as stream:
+            stream.write(str(SearchResults(rows)) + '\n')
+    except NoMatchesError as err_msg:
+        error_handler(err_msg, exit_on_error=False)
+    except (InvalidSearchQueryError, SearchNotAvailableError, ArgumentError) as err_msg:
+        error_handler(err_msg, db=args.db)
+
+
 @no_db_no_action_decorator
 @db_commit_decorator
 def export(args):
+    from .export import export_invoice, export_all_invoices
     try:
-        export_invoice(args.db, args.year, args.month, args.customer,
-                       args.project, args.config.values, args.pdf)
+        if args.all_customers:
+            export_all_invoices(args.db, args.year, args.month, args.config,
+                                args.pdf, args.jobs, args.force)
+        elif args.customer:
+            export_invoice(args.db, args.year, args.month, args.customer,
+                           args.project, args.config, args.pdf, force=args.force)
+        else:
+            raise ArgumentError('Specify a customer or use --all-customers!')
     except (NoMatchingDatabaseEntryError, TooManyMatchesError, NoMatchesError,
-            CanceledByUser) as err_msg:
+            CanceledByUser, ArgumentError) as err_msg:
         error_handler(err_msg, db=args.db)
 
 
+@db_commit_decorator
+def import_hours(args):
+    from .importer import import_workdays, guess_format
+    try:
+        file_format = args.format or guess_format(args.file)
+        if args.file == '-':
+            import_workdays(args.db, sys.stdin, file_format, args.batch_size)
+        else:
+            with open(args.file, newline='') as input_file:
+                import_workdays(args.db, input_file, file_format, args.batch_size)
+    except (InvalidImportRowError, OSError) as err_msg:
+        error_handler(err_msg, db=args.db)
+
+
+@no_db_no_action_decorator
+def dump(args):
+    from .dump import dump_workdays
+    try:
+        if args.output:
+            with open(args.output, 'w', newline='') as output:
+                dump_workdays(args.db, args.config, output, args.format, args.since,
+                              args.until, args.customer, args.invoice)
+        else:
+            dump_workdays(args.db, args.config, sys.stdout, args.format, args.since,
+                          args.until, args.customer, args.invoice)
+    except BrokenPipeError:
+        # Reader went away, for example `stamp dump | head`
+        sys.stderr.close()
+    except OSError as err_msg:
+        error_handler(err_msg)
+
+
 @no_db_no_action_decorator
 @db_commit_decorator
 def delete(args):
+    from .delete import delete_workday_or_tag
     try:
         if not args.id:
                 args.id = args.db.current_stamp().id
@@ -104,6 +212,7 @@ def delete(args):
 @no_db_no_action_decorator
 @db_commit_decorator
 def edit(args):
+    from .edit import edit_workday, edit_customer, edit_project, edit_invoice
     edit_selection = args.parser_object.split(' ')[-1]
     try:
         if edit_selection == 'workday':
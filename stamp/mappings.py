@@ -1,7 +1,7 @@
 from datetime import datetime
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship, validates
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index
+from sqlalchemy.orm import relationship, validates, configure_mappers
 
 from .helpers import get_month_names
 
@@ -9,7 +9,8 @@ __all__ = ['Customer',
            'Project',
            'Invoice',
            'Workday',
-           'Tag']
+           'Tag',
+           'WorkdayRollup']
 
 Base = declarative_base()
 
@@ -58,12 +59,19 @@ class Invoice(Base):
     year = Column(String, default=None)
     paid = Column(Boolean, default=False)
     sent = Column(Boolean, default=False)
+    # Hash of everything rendered into the pdf, see InvoiceRenderer.fingerprint
+    fingerprint = Column(String, default=None)
 
     customer_id = Column(ForeignKey('customer.id'))
 
     workdays = relationship('Workday', order_by='Workday.start',
                             backref='invoice')
 
+    __table_args__ = (
+        # Invoices are paged on (created, id) in the browser
+        Index('ix_invoice_created', 'created'),
+    )
+
     @validates('month')
     def validate_month(self, key, value): # NOQA
         assert value in get_month_names()
@@ -80,11 +88,23 @@ class Workday(Base):
     customer_id = Column(ForeignKey('customer.id'))
     project_id = Column(ForeignKey('project.id'))
     invoice_id = Column(ForeignKey('invoice.id'), default=None)
+    # Times when the workday was added to its invoice, edits after that are drift
+    invoiced_start = Column(DateTime, default=None)
+    invoiced_end = Column(DateTime, default=None)
 
     tags = relationship('Tag', order_by='Tag.recorded',
                         cascade='all, delete, delete-orphan', lazy='dynamic',
                         backref='workday')
 
+    __table_args__ = (
+        # Only the current stamp has no end, keeps `current_stamp()` a single lookup
+        Index('ix_workday_open', 'start', sqlite_where=end.is_(None)),
+        Index('ix_workday_start', 'start'),
+        Index('ix_workday_customer_start', 'customer_id', 'start'),
+        Index('ix_workday_project_start', 'project_id', 'start'),
+        Index('ix_workday_invoice', 'invoice_id'),
+    )
+
 
 class Tag(Base):
     __tablename__ = 'tag'
@@ -94,3 +114,30 @@ class Tag(Base):
     tag = Column(String)
 
     workday_id = Column(ForeignKey('workday.id'))
+
+    __table_args__ = (
+        Index('ix_tag_workday', 'workday_id'),
+    )
+
+
+class WorkdayRollup(Base):
+    """Worked seconds and completed workdays per customer, project and month.
+
+    Kept up to date by triggers on the workday table, see stamp/rollup.py.
+    """
+    __tablename__ = 'workday_rollup'
+
+    customer_id = Column(Integer, primary_key=True, autoincrement=False)
+    project_id = Column(Integer, primary_key=True, autoincrement=False)
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    month = Column(Integer, primary_key=True, autoincrement=False)
+    seconds = Column(Integer, default=0)
+    workdays = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index('ix_workday_rollup_year', 'year', 'customer_id'),
+    )
+
+
+# Set up the backrefs right away so they can be used in query options
+configure_mappers()
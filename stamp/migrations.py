@@ -0,0 +1,125 @@
+"""Versioned database schema.
+
+The schema version is stored in the database with `PRAGMA user_version`.
+Opening a database that is up to date costs a single pragma read, older
+databases are brought up to date by running the missing migrations in order.
+
+Migrations must also be safe to run on a database that was just created
+from the current mappings, since new databases are built by running every
+migration from the first one.
+"""
+
+from sqlalchemy import inspect, text
+
+from .mappings import Base
+from .rollup import create_rollup_triggers, rebuild_rollup
+from .search import create_search_index, rebuild_search_index
+
+__all__ = ['SCHEMA_VERSION',
+           'get_schema_version',
+           'migrate']
+
+BATCH_SIZE = 5000
+
+
+def get_schema_version(connection):
+    return connection.execute('PRAGMA user_version').scalar()
+
+
+def set_schema_version(connection, version):
+    # Pragmas do not take bound parameters
+    connection.execute('PRAGMA user_version = %d' % int(version))
+
+
+def has_column(connection, table_name, column_name):
+    return column_name in [row[1] for row in
+                           connection.execute('PRAGMA table_info("%s")' % table_name)]
+
+
+def add_column(connection, table_name, column_definition):
+    column_name = column_definition.split()[0].strip('"')
+    if not has_column(connection, table_name, column_name):
+        connection.execute('ALTER TABLE "%s" ADD COLUMN %s' % (table_name, column_definition))
+
+
+def run_in_batches(engine, statement, batch_size=BATCH_SIZE):
+    """Run an UPDATE/INSERT that handles at most `:batch_size` rows at a time.
+
+    Every batch is committed separately so a backfill on a large file never
+    holds one huge transaction. The statement has to skip rows that are
+    already done, which also makes an interrupted backfill safe to rerun.
+    """
+    while True:
+        with engine.begin() as connection:
+            result = connection.execute(text(statement), batch_size=batch_size)
+            if result.rowcount < batch_size:
+                return
+
+
+def initial_schema(engine):
+    # create_all skips indexes on tables that already exist
+    Base.metadata.create_all(engine)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+
+
+def workday_rollup(engine):
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        create_rollup_triggers(connection)
+        rebuild_rollup(connection)
+
+
+def invoice_fingerprint(engine):
+    with engine.begin() as connection:
+        add_column(connection, 'invoice', 'fingerprint VARCHAR')
+
+
+def invoiced_times(engine):
+    with engine.begin() as connection:
+        add_column(connection, 'workday', 'invoiced_start DATETIME')
+        add_column(connection, 'workday', 'invoiced_end DATETIME')
+    # Edits made before this migration can not be told apart anymore
+    run_in_batches(engine, '''UPDATE workday SET invoiced_start = start, invoiced_end = "end"
+                              WHERE id IN (SELECT id FROM workday
+                                           WHERE invoice_id IS NOT NULL AND invoiced_start IS NULL
+                                           LIMIT :batch_size)''')
+
+
+def tag_search(engine):
+    with engine.begin() as connection:
+        # Without FTS5 in SQLite everything but `stamp search` still works
+        if create_search_index(connection):
+            rebuild_search_index(connection)
+
+
+def invoice_created_index(engine):
+    with engine.begin() as connection:
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_invoice_created ON invoice (created)')
+
+
+# Never reorder or remove entries, the position is the schema version
+MIGRATIONS = [initial_schema,
+              workday_rollup,
+              invoice_fingerprint,
+              invoiced_times,
+              tag_search,
+              invoice_created_index]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(engine):
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+    if version == SCHEMA_VERSION:
+        return False
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        migration(engine)
+        with engine.connect() as connection:
+            set_schema_version(connection, number)
+    return True
@@ -0,0 +1,155 @@
+"""Where the time of a single command goes, shown by `stamp --profile`.
+
+Phases of the run are timed with perf_counter, every SQL statement is
+timed with engine events, objects loaded by the ORM are counted with load
+events and the command itself runs under cProfile. The result is a
+summary on stderr or a JSON file that can be compared between releases.
+"""
+
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+from collections import OrderedDict, Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .constants import VERSION
+from .mappings import Base
+
+__all__ = ['Profiler']
+
+SLOWEST_STATEMENTS = 5
+PROFILED_FUNCTIONS = 15
+STATEMENT_WIDTH = 100
+
+
+class Profiler(object):
+    """Collects timings for one command, started at `started` (perf_counter)."""
+    def __init__(self, args, started):
+        self.args = list(args)
+        self.started = started
+        self.last = started
+        self.phases = OrderedDict()
+        # statement -> [executions, seconds, rows changed]
+        self.statements = OrderedDict()
+        self.objects_loaded = Counter()
+        self.commit_started = None
+        self.cpu = cProfile.Profile()
+        event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+        event.listen(Base, 'load', self.load, propagate=True)
+
+    def stop(self):
+        event.remove(Engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', self.after_cursor_execute)
+        event.remove(Base, 'load', self.load)
+
+    def phase(self, name, ended=None):
+        """End the phase called name, it started where the last one ended."""
+        ended = ended or time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0) + ended - self.last
+        self.last = ended
+
+    @contextmanager
+    def command(self, db):
+        """Profile the command body, time spent committing is its own phase."""
+        event.listen(db.session, 'before_commit', self.before_commit)
+        event.listen(db.session, 'after_commit', self.after_commit)
+        self.phases['command'] = self.phases['commit'] = 0
+        self.cpu.enable()
+        try:
+            yield
+        finally:
+            self.cpu.disable()
+            event.remove(db.session, 'before_commit', self.before_commit)
+            event.remove(db.session, 'after_commit', self.after_commit)
+            self.phase('command')
+            self.phases['command'] -= self.phases['commit']
+
+    def before_commit(self, session):
+        self.commit_started = time.perf_counter()
+
+    def after_commit(self, session):
+        self.phases['commit'] += time.perf_counter() - self.commit_started
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info['profile_started'].pop()
+        totals = self.statements.setdefault(statement, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += seconds
+        # SQLite only knows the row count of inserts, updates and deletes
+        totals[2] += max(cursor.rowcount, 0)
+
+    def load(self, target, context):
+        self.objects_loaded[type(target).__name__] += 1
+
+    def functions(self):
+        stats = pstats.Stats(self.cpu, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [{'function': '%s:%d(%s)' % function,
+                 'calls': calls,
+                 'own_ms': round(own * 1000, 3),
+                 'cumulative_ms': round(cumulative * 1000, 3)}
+                for function, (primitive_calls, calls, own, cumulative, callers)
+                in rows[:PROFILED_FUNCTIONS]]
+
+    def result(self):
+        slowest = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return {'version': VERSION,
+                'command': self.args,
+                'total_ms': round((self.last - self.started) * 1000, 3),
+                'phases_ms': OrderedDict((name, round(seconds * 1000, 3))
+                                         for name, seconds in self.phases.items()),
+                'sql': {'statements': sum(totals[0] for totals in self.statements.values()),
+                        'distinct_statements': len(self.statements),
+                        'total_ms': round(sum(totals[1] for totals in self.statements.values()) * 1000, 3),
+                        'rows_changed': sum(totals[2] for totals in self.statements.values()),
+                        'objects_loaded': dict(self.objects_loaded),
+                        'slowest': [{'statement': statement,
+                                     'executions': executions,
+                                     'total_ms': round(seconds * 1000, 3)}
+                                    for statement, (executions, seconds, rows) in slowest[:SLOWEST_STATEMENTS]]},
+                'functions': self.functions()}
+
+    def summary(self):
+        result = self.result()
+        sql = result['sql']
+        lines = [_('Profile of: stamp %s') % ' '.join(self.args)]
+        for name, milliseconds in list(result['phases_ms'].items()) + [(_('total'), result['total_ms'])]:
+            lines.append('  {0:<10} {1:>10.2f} ms'.format(name, milliseconds))
+        lines.append(_('SQL: %d statements (%d distinct) in %.2f ms, %d rows changed') % (
+            sql['statements'], sql['distinct_statements'], sql['total_ms'], sql['rows_changed']))
+        if sql['objects_loaded']:
+            lines.append(_('Objects loaded: %s') % ', '.join(
+                '%s %d' % item for item in sorted(sql['objects_loaded'].items())))
+        if sql['slowest']:
+            lines.append(_('Slowest statements:'))
+        for statement in sql['slowest']:
+            text = ' '.join(statement['statement'].split())
+            if len(text) > STATEMENT_WIDTH:
+                text = text[:STATEMENT_WIDTH - 3] + '...'
+            lines.append('  {0:>8.2f} ms {1:>4}x  {2}'.format(statement['total_ms'],
+                                                              statement['executions'], text))
+        lines.append(_('Functions by cumulative time:'))
+        for function in result['functions']:
+            lines.append('  {0:>8.2f} ms {1:>6}  {2}'.format(function['cumulative_ms'],
+                                                           function['calls'], function['function']))
+        return '\n'.join(lines)
+
+    def report(self, output=None):
+        """Summary on stderr, or the full result as JSON into output."""
+        self.stop()
+        if output:
+            with open(output, 'w') as output_file:
+                json.dump(self.result(), output_file, indent=2)
+                output_file.write('\n')
+        else:
+            print(self.summary(), file=sys.stderr)
@@ -0,0 +1,78 @@
+"""Aggregated hours per period and customer, project, invoice or paid state.
+
+Durations are summed by SQLite, only one row per group is returned and no
+Workday objects are created. Only completed workdays count, and a workday
+belongs to the period it started in.
+"""
+
+from sqlalchemy import func, cast, case, Integer
+
+from .mappings import Workday, Customer, Project, Invoice
+from .exceptions import NoMatchingDatabaseEntryError
+
+__all__ = ['PERIODS',
+           'REPORT_GROUPS',
+           'get_report']
+
+PERIODS = ('day', 'week', 'month', 'year')
+REPORT_GROUPS = ('customer', 'project', 'invoice', 'paid')
+
+
+def _period(period):
+    if period == 'day':
+        return func.strftime('%Y-%m-%d', Workday.start)
+    elif period == 'week':
+        # Monday of the week
+        return func.date(Workday.start, '-6 days', 'weekday 1')
+    elif period == 'month':
+        return func.strftime('%Y-%m', Workday.start)
+    elif period == 'year':
+        return func.strftime('%Y', Workday.start)
+    raise ValueError(_('period must be one of: %s') % ', '.join(PERIODS))
+
+
+def _group(query, group_by):
+    """Add the group label column and its joins to query."""
+    if group_by == 'customer':
+        return query.join(Customer, Workday.customer_id == Customer.id), Customer.name
+    elif group_by == 'project':
+        # Project names are only unique per customer
+        return (query.join(Project, Workday.project_id == Project.id).join(
+            Customer, Project.customer_id == Customer.id), Customer.name + ' / ' + Project.name)
+    elif group_by == 'invoice':
+        return query, case([(Workday.invoice_id.is_(None), _('Not invoiced'))],
+                           else_=func.printf('%d', Workday.invoice_id))
+    elif group_by == 'paid':
+        return (query.outerjoin(Invoice, Workday.invoice_id == Invoice.id),
+                case([(Workday.invoice_id.is_(None), _('Not invoiced')),
+                      (Invoice.paid.is_(True), _('Paid'))], else_=_('Unpaid')))
+    raise ValueError(_('group_by must be one of: %s') % ', '.join(REPORT_GROUPS))
+
+
+def _get_ids(db, table, name):
+    ids = [row.id for row in db.session.query(table.id).filter(table.name == name)]
+    if not ids:
+        raise NoMatchingDatabaseEntryError(_('No %s named %s!') % (table.__tablename__, name))
+    return ids
+
+
+def get_report(db, period='month', group_by='customer', date_from=None, date_to=None,
+               time_from=None, time_to=None, customer=None, project=None):
+    """(period, group, seconds, workdays) rows ordered by period and group.
+
+    date_from and date_to include the whole day. time_from and time_to limit
+    the time of day a workday started and ended.
+    """
+    period_label = _period(period)
+    seconds = func.sum(cast(func.round((func.julianday(Workday.end) -
+                                        func.julianday(Workday.start)) * 86400), Integer))
+    query = db.session.query(Workday).filter(Workday.end.isnot(None))
+    query, group_label = _group(query, group_by)
+    query = query.filter(*db.workday_filters(date_from, date_to, time_from, time_to))
+    if customer:
+        query = query.filter(Workday.customer_id.in_(_get_ids(db, Customer, customer)))
+    if project:
+        query = query.filter(Workday.project_id.in_(_get_ids(db, Project, project)))
+    return query.with_entities(period_label.label('period'), group_label.label('name'),
+                               seconds, func.count(Workday.id)).group_by(
+                                   'period', 'name').order_by('period', 'name').all()
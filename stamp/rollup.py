@@ -0,0 +1,87 @@
+"""Monthly totals of worked time.
+
+The workday_rollup table is maintained by SQLite triggers, so every path
+that writes workdays keeps it correct in the same transaction: stamping
+out, edits, deletes, imports and plain SQL alike. Only completed workdays
+count, and a workday belongs to the month it started in.
+"""
+
+from sqlalchemy import func
+
+from .mappings import WorkdayRollup, Customer, Project
+
+__all__ = ['create_rollup_triggers',
+           'rebuild_rollup',
+           'get_summary']
+
+SUMMARY_GROUPS = ('customer', 'project', 'month')
+
+# {row} is NEW or OLD
+KEY = '''{row}.customer_id, {row}.project_id,
+         CAST(strftime('%Y', {row}.start) AS INTEGER),
+         CAST(strftime('%m', {row}.start) AS INTEGER)'''
+SECONDS = '''CAST(round((julianday({row}."end") - julianday({row}.start)) * 86400) AS INTEGER)'''
+MATCHES = '''customer_id IS {row}.customer_id AND project_id IS {row}.project_id
+             AND year = CAST(strftime('%Y', {row}.start) AS INTEGER)
+             AND month = CAST(strftime('%m', {row}.start) AS INTEGER)'''
+
+ADD = '''INSERT INTO workday_rollup (customer_id, project_id, year, month, seconds, workdays)
+         SELECT {key}, {seconds}, 1 WHERE {row}."end" IS NOT NULL
+         ON CONFLICT (customer_id, project_id, year, month)
+         DO UPDATE SET seconds = seconds + excluded.seconds, workdays = workdays + 1;'''
+SUBTRACT = '''UPDATE workday_rollup SET seconds = seconds - {seconds}, workdays = workdays - 1
+              WHERE {row}."end" IS NOT NULL AND {matches};
+              DELETE FROM workday_rollup WHERE workdays <= 0 AND {matches};'''
+
+
+def _statement(template, row):
+    return template.format(row=row, key=KEY.format(row=row), seconds=SECONDS.format(row=row),
+                           matches=MATCHES.format(row=row))
+
+
+TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS workday_rollup_insert AFTER INSERT ON workday BEGIN %s END'
+    % _statement(ADD, 'NEW'),
+    'CREATE TRIGGER IF NOT EXISTS workday_rollup_delete AFTER DELETE ON workday BEGIN %s END'
+    % _statement(SUBTRACT, 'OLD'),
+    'CREATE TRIGGER IF NOT EXISTS workday_rollup_update AFTER UPDATE OF start, "end", customer_id, project_id '
+    'ON workday BEGIN %s %s END' % (_statement(SUBTRACT, 'OLD'), _statement(ADD, 'NEW')),
+]
+
+REBUILD = '''INSERT INTO workday_rollup (customer_id, project_id, year, month, seconds, workdays)
+             SELECT {key}, SUM({seconds}), COUNT(*) FROM workday AS NEW
+             WHERE NEW."end" IS NOT NULL
+             GROUP BY 1, 2, 3, 4'''.format(key=KEY.format(row='NEW'), seconds=SECONDS.format(row='NEW'))
+
+
+def create_rollup_triggers(connection):
+    for trigger in TRIGGERS:
+        connection.execute(trigger)
+
+
+def rebuild_rollup(connection):
+    """Recompute every total from the workday table."""
+    connection.execute('DELETE FROM workday_rollup')
+    connection.execute(REBUILD)
+
+
+def get_summary(db, year, group_by='customer'):
+    """Seconds and workdays per group for a year, read from the rollup table only."""
+    seconds = func.sum(WorkdayRollup.seconds)
+    workdays = func.sum(WorkdayRollup.workdays)
+    if group_by == 'customer':
+        query = db.session.query(Customer.name, seconds, workdays).join(
+            WorkdayRollup, WorkdayRollup.customer_id == Customer.id).group_by(
+                Customer.id).order_by(Customer.name)
+    elif group_by == 'project':
+        # Project names are only unique per customer
+        name = Customer.name + ' / ' + Project.name
+        query = db.session.query(name, seconds, workdays).join(
+            WorkdayRollup, WorkdayRollup.project_id == Project.id).join(
+                Customer, Project.customer_id == Customer.id).group_by(
+                    Project.id).order_by(name)
+    else:
+        month = func.printf('%d-%02d', WorkdayRollup.year, WorkdayRollup.month)
+        query = db.session.query(month, seconds, workdays).group_by(
+            WorkdayRollup.month).order_by(WorkdayRollup.month)
+    return query.filter(WorkdayRollup.year == year).all()
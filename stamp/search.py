@@ -0,0 +1,131 @@
+"""Full-text search over tags.
+
+tag_fts is an SQLite FTS5 index of tag.tag that reads its text from the
+tag table. Triggers keep it up to date the same way the rollup is kept, so
+every path that writes tags updates it in the same transaction.
+"""
+
+from sqlalchemy import text, DateTime
+from sqlalchemy.exc import OperationalError
+
+from .exceptions import InvalidSearchQueryError, SearchNotAvailableError
+
+__all__ = ['create_search_index',
+           'rebuild_search_index',
+           'search_tags',
+           'SEARCH_ORDERS']
+
+# Ties keep the order tags were added in
+ORDERS = {'rank': 'score, tag.id',
+          'date': 'workday.start DESC, tag.id DESC'}
+SEARCH_ORDERS = ('rank', 'date')
+
+CREATE_INDEX = '''CREATE VIRTUAL TABLE IF NOT EXISTS tag_fts USING fts5(
+                      tag, content='tag', content_rowid='id',
+                      tokenize='unicode61 remove_diacritics 2')'''
+
+TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS tag_fts_insert AFTER INSERT ON tag BEGIN
+           INSERT INTO tag_fts (rowid, tag) VALUES (NEW.id, NEW.tag);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS tag_fts_delete AFTER DELETE ON tag BEGIN
+           INSERT INTO tag_fts (tag_fts, rowid, tag) VALUES ('delete', OLD.id, OLD.tag);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS tag_fts_update AFTER UPDATE OF tag ON tag BEGIN
+           INSERT INTO tag_fts (tag_fts, rowid, tag) VALUES ('delete', OLD.id, OLD.tag);
+           INSERT INTO tag_fts (rowid, tag) VALUES (NEW.id, NEW.tag);
+       END''',
+]
+
+# Matches are ranked and limited before the remaining joins, so only the
+# shown tags are joined with their customer and project
+MATCHES = '''SELECT tag_fts.rowid AS tag_id, {score} AS score
+             FROM tag_fts {joins}
+             WHERE tag_fts MATCH :query {filters}
+             ORDER BY {order}
+             LIMIT :limit'''
+MATCH_JOINS = '''JOIN tag ON tag.id = tag_fts.rowid
+                 JOIN workday ON workday.id = tag.workday_id'''
+SEARCH = '''SELECT tag.id, tag.recorded, tag.tag, workday.id AS workday_id, workday.start,
+                   customer."Customer name" AS customer, project."Project name" AS project,
+                   workday.invoice_id
+            FROM ({matches}) AS matches
+            JOIN tag ON tag.id = matches.tag_id
+            JOIN workday ON workday.id = tag.workday_id
+            JOIN customer ON customer.id = workday.customer_id
+            JOIN project ON project.id = workday.project_id
+            ORDER BY {order}'''
+
+
+def create_search_index(connection):
+    """Create tag_fts and its triggers, False when SQLite was built without FTS5."""
+    try:
+        connection.execute(CREATE_INDEX)
+    except OperationalError:
+        return False
+    for trigger in TRIGGERS:
+        connection.execute(trigger)
+    return True
+
+
+def rebuild_search_index(connection):
+    """Index every tag again, also creates the index if it is missing."""
+    if not create_search_index(connection):
+        raise SearchNotAvailableError(_('Full-text search needs SQLite with FTS5!'))
+    connection.execute("INSERT INTO tag_fts (tag_fts) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """FTS5 query for plain words, all words must match and word* matches a prefix.
+
+    Every word is quoted so punctuation is searched for instead of read
+    as FTS5 syntax.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append('"%s"%s' % (word, '*' if prefix else ''))
+    if not terms:
+        raise InvalidSearchQueryError(_('Nothing to search for!'))
+    return ' '.join(terms)
+
+
+def search_tags(db, query, date_from=None, date_to=None, time_from=None, time_to=None,
+                customer=None, project=None, order='rank', limit=20, raw=False):
+    """Tags matching query with their workday, customer, project and invoice.
+
+    Best matches first by bm25, or newest workday first with order='date'.
+    date_from and date_to include the whole day and apply to the start of
+    the workday, time_from and time_to limit the time of day it started
+    and ended like in reports. raw passes query to FTS5 as it is, for OR,
+    NOT, NEAR and phrase searches.
+    """
+    if order not in SEARCH_ORDERS:
+        raise ValueError(_('order must be one of: %s') % ', '.join(SEARCH_ORDERS))
+    filters = ['AND ' + condition for condition in
+               db.workday_filters_sql(date_from, date_to, time_from, time_to)]
+    params = {'query': query if raw else match_expression(query), 'limit': limit}
+    # Project names are only unique per customer
+    if customer:
+        filters.append('AND workday.customer_id IN (SELECT id FROM customer WHERE "Customer name" = :customer)')
+        params['customer'] = customer
+    if project:
+        filters.append('AND workday.project_id IN (SELECT id FROM project WHERE "Project name" = :project)')
+        params['project'] = project
+    # Ranking alone does not need the tag and workday rows of every match
+    matches = MATCHES.format(score='bm25(tag_fts)' if order == 'rank' else 'NULL',
+                             joins=MATCH_JOINS if filters or order == 'date' else '',
+                             filters=' '.join(filters),
+                             order=ORDERS[order].replace('tag.id', 'tag_fts.rowid'))
+    statement = text(SEARCH.format(matches=matches, order=ORDERS[order]))
+    statement = statement.columns(recorded=DateTime, start=DateTime)
+    try:
+        return db.session.execute(statement, params).fetchall()
+    except OperationalError as err:
+        if 'no such table: tag_fts' in str(err.orig):
+            raise SearchNotAvailableError(_('There is no search index, create it with: stamp search --rebuild'))
+        if 'fts5' in str(err.orig):
+            raise InvalidSearchQueryError(_('Invalid search: %s') % err.orig)
+        raise
@@ -1,22 +1,53 @@
 #!/usr/bin/env python3
 
 import sys
-import curses
-from .args import parse
-from .ui.main import main as curses_interface
-from .db import Database
-from .config import Config
+import time
+from .daemon import forward
+
+
+def browse(parser):
+    """The curses interface, run when no subcommand is given."""
+    import curses
+    from .ui.main import main as curses_interface
+    curses.wrapper(curses_interface, parser.db)
 
 
 def run(args=sys.argv[1:]):
-    parser = parse(sys.argv[1:])
-    parser.config = Config(parser.config)
-    parser.db = Database(parser.db)
+    started = time.perf_counter()
+    # A running stampd saves loading everything below
+    code = forward(args)
+    if code is not None:
+        sys.exit(code)
+
+    from .args import parse
+    from .db import Database
+    from .config import load_config, engine_profile
+    imported = time.perf_counter()
+    parser = parse(args)
+    profiler = None
+    if parser.profile or parser.profile_output:
+        from .profiling import Profiler
+        profiler = Profiler(args, started)
+        profiler.phase('import', imported)
+        profiler.phase('parse')
+    parser.config = load_config(parser.config)
+    if profiler:
+        profiler.phase('config')
+    parser.db = Database(parser.db, ask=getattr(parser, 'ask', True),
+                         profile=engine_profile(parser.config))
+    if profiler:
+        profiler.phase('database')
 
-    if vars(parser):
-        parser.func(parser)
+    command = getattr(parser, 'func', browse)
+    if profiler:
+        try:
+            with profiler.command(parser.db):
+                command(parser)
+        finally:
+            # Also when the command exits early, after curses gave the terminal back
+            profiler.report(parser.profile_output)
     else:
-        curses.wrapper(curses_interface)
+        command(parser)
 
 
 if __name__ == '__main__':
@@ -1,4 +1,6 @@
+import sys
 from datetime import datetime
+from itertools import chain, islice
 
 from sqlalchemy.orm.query import Query
 
@@ -6,7 +8,12 @@ from .helpers import get_terminal_width, calculate_workhours, calculate_wage
 from .formatting import divider, boolean_yes_or_no
 from .exceptions import RequiredValueError
 
-__all__ = ['Status']
+__all__ = ['Status',
+           'Summary',
+           'Report',
+           'InvoiceDrift']
+
+STREAM_BATCH_SIZE = 500
 
 
 class Column(object):
@@ -14,7 +21,7 @@ class Column(object):
         self.width = max(width, len(headline))
         self.headline = headline
         self.in_total_width = in_total_width
-        if not name and headline is '':
+        if not name and headline == '':
             raise RequiredValueError(_('If no headline is set, name is required to be set!'))
         if not name:
             self.name = headline
@@ -50,20 +57,25 @@ class Status(object):
     def __init__(self, db_query, config):
         self.config = config
         self.time_format = '%H:%M'
+        self.terminal_width = get_terminal_width()
+        self.not_exported_message = _('Not exported')
+        self.session = None
         if hasattr(db_query, '_primary_entity'):
             self.table = str(db_query._primary_entity.selectable)
+        elif isinstance(db_query, list):
+            self.table = str(db_query[0].__table__) if db_query else None
         else:
             self.table = str(db_query.__table__)
         if issubclass(db_query.__class__, Query):
-            self.db_query = db_query.all()
+            self.db_query = db_query
+            self.session = db_query.session
+        elif isinstance(db_query, list):
+            self.db_query = db_query
         else:
             self.db_query = [db_query]
 
     def __str__(self):
-        if self.table == 'workday':
-            return self.workdays()
-        elif self.table == 'invoice':
-            return self.invoices()
+        return '\n'.join(self)
 
     def printable_workday(self):
         return_value = ''
@@ -85,33 +97,65 @@ class Status(object):
         return return_value
 
 
-    def workdays(self):
+    def _rows(self, *values):
+        """Rows to write and the longest of each value among the first of them.
+
+        Queries are streamed, so only the first page is read before the
+        table starts and the widths come from the rows on it. That keeps the
+        first screen as fast on a long history as on a short one.
+        """
+        if self.session:
+            rows = iter(self.db_query.yield_per(STREAM_BATCH_SIZE))
+            first_page = list(islice(rows, STREAM_BATCH_SIZE))
+            rows = chain(first_page, rows)
+        else:
+            rows = first_page = self.db_query
+        return [max([len(str(value(row) or '')) for row in first_page] or [0])
+                for value in values], rows
+
+    def workday_layout(self, lengths):
+        id_length, customer_length, project_length, invoice_id_length = lengths
         workdays = Table()
         workdays.columns.add(Column(name='id',
-                             width=len(max([str(x.id) for x in self.db_query], key=len)) + 3))
+                                    width=id_length + 3))
         workdays.columns.add(Column(headline=_('Date'),
-                                    width=len(self.db_query[0].start.date().isoformat()) + 3))
+                                    width=len(datetime.now().date().isoformat()) + 3))
         workdays.columns.add(Column(headline=_('Customer'),
-                                    width=len(max([x.customer.name for x in self.db_query], key=len)) + 6))
+                                    width=customer_length + 6))
         workdays.columns.add(Column(headline=_('Project'),
-                                    width=len(max([x.project.name for x in self.db_query], key=len)) + 6))
+                                    width=project_length + 6))
         workdays.columns.add(Column(name='from_date',
                                     headline=_('From'),
-                                    width=len(self.db_query[0].start.strftime(self.time_format)) + 3))
+                                    width=len(datetime.now().strftime(self.time_format)) + 3))
         workdays.columns.add(Column(name='to_date',
                                     headline=_('To'),
-                                    width=len(self.db_query[0].end.strftime(self.time_format)) + 3))
+                                    width=max(len(datetime.now().strftime(self.time_format)), len(_('Active'))) + 3))
         workdays.columns.add(Column(headline=_('Invoice ID'),
-                                    width=len(max([str(x.invoice_id) for x in self.db_query], key=len))))
+                                    width=invoice_id_length))
         workdays.columns.add(Column(headline=_('Total'),
                                     width=0,
                                     in_total_width=False))
-                                    
+        row_format = '{0:<{id_width}}{1:^{date_width}}{2:^{customer_width}}{3:^{project_width}}{4:^{from_width}}{5:^{to_width}}{6:^{invoice_id_width}}{7:>{total_width}}'
+        widths = dict(id_width=workdays.columns.id.width,
+                      date_width=workdays.columns.date.width,
+                      customer_width=workdays.columns.customer.width,
+                      project_width=workdays.columns.project.width,
+                      from_width=workdays.columns.from_date.width,
+                      to_width=workdays.columns.to_date.width,
+                      invoice_id_width=workdays.columns.invoice_id.width,
+                      total_width=max(self.terminal_width - workdays.total_column_width(), 0))
+        return workdays, row_format, widths
+
+    def iter_workdays(self):
+        lengths, rows = self._rows(lambda x: x.id,
+                                   lambda x: x.customer.name,
+                                   lambda x: x.project.name,
+                                   lambda x: x.invoice_id)
+        workdays, row_format, widths = self.workday_layout(lengths)
+        row_divider = divider()
 
-        return_str = divider()
-        return_str += '\n'
-        # TODO:
-        return_str += '{0:<{id_width}}{1:^{date_width}}{2:^{customer_width}}{3:^{project_width}}{4:^{from_width}}{5:^{to_width}}{6:^{invoice_id_width}}{7:>{total_width}}'.format(
+        yield row_divider
+        yield row_format.format(
             # Headlines
             workdays.columns.id.headline,
             workdays.columns.date.headline,
@@ -121,21 +165,11 @@ class Status(object):
             workdays.columns.to_date.headline,
             workdays.columns.invoice_id.headline,
             workdays.columns.total.headline,
-
-            # Widths
-            id_width=workdays.columns.id.width,
-            date_width=workdays.columns.date.width,
-            customer_width=workdays.columns.customer.width,
-            project_width=workdays.columns.project.width,
-            from_width=workdays.columns.from_date.width,
-            to_width=workdays.columns.to_date.width,
-            invoice_id_width=workdays.columns.invoice_id.width,
-            total_width=get_terminal_width() - (workdays.total_column_width())
-        )
-        return_str += '\n' + divider()
+            **widths)
+        yield row_divider
 
         # Output for each workday
-        for workday in self.db_query:
+        for workday in rows:
             if workday.end:
                 total_time = calculate_workhours(workday.start, workday.end)
                 end_output = workday.end.strftime(self.time_format)
@@ -144,8 +178,7 @@ class Status(object):
                 end_output = _('Active')
             total_owed = calculate_wage(total_time, self.config.values.wage_per_hour.value)
             total_output = str(round(total_time, 2)) + _(' for ') + str(round(total_owed, 2))
-            total_width = get_terminal_width() - (workdays.total_column_width())
-            return_str += '{0:<{id_width}}{1:^{date_width}}{2:^{customer_width}}{3:^{project_width}}{4:^{from_width}}{5:^{to_width}}{6:^{invoice_id_width}}{7:>{total_width}}'.format(
+            yield row_format.format(
                 workday.id,
                 workday.start.date().isoformat(),
                 workday.customer.name,
@@ -154,85 +187,96 @@ class Status(object):
                 end_output,
                 workday.invoice_id or '',
                 total_output,
-                # Widths
-                id_width=workdays.columns.id.width,
-                date_width=workdays.columns.date.width,
-                customer_width=workdays.columns.customer.width,
-                project_width=workdays.columns.project.width,
-                from_width=workdays.columns.from_date.width,
-                to_width=workdays.columns.to_date.width,
-                invoice_id_width=workdays.columns.invoice_id.width,
-                total_width=total_width
-            )
-            return_str += '\n' + divider()
-
-        return return_str
+                **widths)
+            yield row_divider
 
+    def workdays(self):
+        return '\n'.join(self.iter_workdays())
 
-    def invoices(self):
-        not_exported_message = _('Not exported')
+    def invoice_layout(self, lengths):
+        id_length, customer_length, year_length, month_length, pdf_length = lengths
         invoices = Table()
         invoices.columns.add(Column(name='id',
-                                    width=len(max([str(x.id) for x in self.db_query], key=len)) + 3))
+                                    width=id_length + 3))
         invoices.columns.add(Column(headline=_('Created on'),
-                                    width=len(self.db_query[0].created.date().isoformat()) + 6))
+                                    width=len(datetime.now().date().isoformat()) + 6))
         invoices.columns.add(Column(headline=_('Customer'),
-                                    width=len(max([x.customer.name for x in self.db_query], key=len)) + 6))
+                                    width=customer_length + 6))
         invoices.columns.add(Column(headline=_('Year'),
-                                    width=len(max([x.year if x.year else '' for x in self.db_query], key=len)) + 6))
+                                    width=year_length + 6))
         invoices.columns.add(Column(headline=_('Month'),
-                                    width=len(max([x.month if x.month else '' for x in self.db_query], key=len)) + 6))
+                                    width=month_length + 6))
         invoices.columns.add(Column(headline=_('PDF'),
-                                    width=max(len(max([x.pdf if x.pdf else '' for x in self.db_query], key=len)), len(not_exported_message)) + 6))
+                                    width=max(pdf_length, len(self.not_exported_message)) + 6))
         invoices.columns.add(Column(headline=_('Sent'),
                                     width=max(len('Yes'), len('Sent')) + 6))
         invoices.columns.add(Column(headline=_('Paid'),
                                     width=max(len('Yes'), len('Paid')) + 6))
-        return_str = divider()
-        return_str += '\n'
-        return_str += '{0:<{id_width}} {1:<{created_width}} {2:<{customer_width}} {3:<{year_width}} {4:<{month_width}} {5:<{pdf_width}} {6:<{sent_width}} {7:<{paid_width}}'.format(
-                         invoices.columns.id.headline,
-                         invoices.columns.created_on.headline,
-                         invoices.columns.customer.headline,
-                         invoices.columns.year.headline,
-                         invoices.columns.month.headline,
-                         invoices.columns.pdf.headline,
-                         invoices.columns.sent.headline,
-                         invoices.columns.paid.headline,
-                         id_width=invoices.columns.id.width,
-                         created_width=invoices.columns.created_on.width,
-                         customer_width=invoices.columns.customer.width,
-                         year_width=invoices.columns.year.width,
-                         month_width=invoices.columns.month.width,
-                         pdf_width=invoices.columns.pdf.width,
-                         sent_width=invoices.columns.sent.width,
-                         paid_width=invoices.columns.paid.width
-                         )
-        return_str += '\n' + divider()
+        row_format = '{0:<{id_width}} {1:<{created_width}} {2:<{customer_width}} {3:<{year_width}} {4:<{month_width}} {5:<{pdf_width}} {6:<{sent_width}} {7:<{paid_width}}'
+        widths = dict(id_width=invoices.columns.id.width,
+                      created_width=invoices.columns.created_on.width,
+                      customer_width=invoices.columns.customer.width,
+                      year_width=invoices.columns.year.width,
+                      month_width=invoices.columns.month.width,
+                      pdf_width=invoices.columns.pdf.width,
+                      sent_width=invoices.columns.sent.width,
+                      paid_width=invoices.columns.paid.width)
+        return invoices, row_format, widths
+
+    def iter_invoices(self):
+        lengths, rows = self._rows(lambda x: x.id,
+                                   lambda x: x.customer.name,
+                                   lambda x: x.year,
+                                   lambda x: x.month,
+                                   lambda x: x.pdf)
+        invoices, row_format, widths = self.invoice_layout(lengths)
+        row_divider = divider()
+
+        yield row_divider
+        yield row_format.format(
+            invoices.columns.id.headline,
+            invoices.columns.created_on.headline,
+            invoices.columns.customer.headline,
+            invoices.columns.year.headline,
+            invoices.columns.month.headline,
+            invoices.columns.pdf.headline,
+            invoices.columns.sent.headline,
+            invoices.columns.paid.headline,
+            **widths)
+        yield row_divider
 
         # Output for each invoice
-        for invoice in self.db_query:
-            return_str += '{0:<{id_width}} {1:<{created_width}} {2:<{customer_width}} {3:<{year_width}} {4:<{month_width}} {5:<{pdf_width}} {6:<{sent_width}} {7:<{paid_width}}'.format(
-                            invoice.id,
-                            invoice.created.date().isoformat(),
-                            invoice.customer.name,
-                            invoice.year,
-                            invoice.month,
-                            invoice.pdf or not_exported_message,
-                            boolean_yes_or_no(invoice.sent),
-                            boolean_yes_or_no(invoice.paid),
-                            id_width=invoices.columns.id.width,
-                            created_width=invoices.columns.created_on.width,
-                            customer_width=invoices.columns.customer.width,
-                            year_width=invoices.columns.year.width,
-                            month_width=invoices.columns.month.width,
-                            pdf_width=invoices.columns.pdf.width,
-                            sent_width=invoices.columns.sent.width,
-                            paid_width=invoices.columns.paid.width
-                        )
-            return_str += '\n' + divider()
-
-        return return_str
+        for invoice in rows:
+            yield row_format.format(
+                invoice.id,
+                invoice.created.date().isoformat(),
+                invoice.customer.name,
+                invoice.year,
+                invoice.month,
+                invoice.pdf or self.not_exported_message,
+                boolean_yes_or_no(invoice.sent),
+                boolean_yes_or_no(invoice.paid),
+                **widths)
+            yield row_divider
+
+    def invoices(self):
+        return '\n'.join(self.iter_invoices())
+
+    def __iter__(self):
+        if self.table == 'workday':
+            return self.iter_workdays()
+        elif self.table == 'invoice':
+            return self.iter_invoices()
+        return iter(())
+
+    def write(self, stream=sys.stdout):
+        """Write the table line by line, stops early if the reader goes away."""
+        try:
+            for line in self:
+                stream.write(line + '\n')
+            stream.flush()
+        except BrokenPipeError:
+            pass
 
 
     def print_current_stamp(self, current_stamp):
@@ -246,9 +290,146 @@ class Status(object):
         result = result + _('Wage: %s\n') % round(calculate_wage(current_hours, self.config.values.wage_per_hour.value), 2)
         result = result + _('Customer: %s\n') % current_stamp.customer.name
         result = result + _('Project: %s\n') % current_stamp.project.name
-        result = result + _('%d tag(s)') % len(current_stamp.tags.all())
-        for tag in current_stamp.tags:
+        # Workday.tags is dynamic, iterating it again would query again
+        tags = current_stamp.tags.all()
+        result = result + _('%d tag(s)') % len(tags)
+        for tag in tags:
             result = result + _('\n\t[id: {id}] [Tagged: {date} | {time}]\n\t{tag}').format(id=tag.id, date=tag.recorded.date().isoformat(), time=tag.recorded.time().isoformat(), tag=tag.tag)
         result = result + '\n'
 
         print(result)
+
+
+class Summary(object):
+    """Totals per customer, project or month as returned by rollup.get_summary."""
+    def __init__(self, rows, config, group_by='customer'):
+        self.rows = rows
+        self.config = config
+        self.headline = {'customer': _('Customer'), 'project': _('Project'),
+                         'month': _('Month')}[group_by]
+
+    def __iter__(self):
+        wage_per_hour = self.config.values.wage_per_hour.value
+        name_width = max([len(row[0]) for row in self.rows] + [len(self.headline), len(_('Total'))]) + 3
+        row_format = '{0:<{name_width}} {1:>12} {2:>12} {3:>16}'
+        row_divider = divider()
+        yield row_divider
+        yield row_format.format(self.headline, _('Workdays'), _('Hours'), _('Wage'),
+                                name_width=name_width)
+        yield row_divider
+        total_hours = 0
+        total_workdays = 0
+        for name, seconds, workdays in self.rows:
+            hours = seconds / 60 / 60
+            total_hours += hours
+            total_workdays += workdays
+            yield row_format.format(name, workdays, round(hours, 2),
+                                    round(calculate_wage(hours, wage_per_hour), 2),
+                                    name_width=name_width)
+        yield row_divider
+        yield row_format.format(_('Total'), total_workdays, round(total_hours, 2),
+                                round(calculate_wage(total_hours, wage_per_hour), 2),
+                                name_width=name_width)
+
+    def __str__(self):
+        return '\n'.join(self)
+
+
+class Report(object):
+    """Table of the rows returned by report.get_report."""
+    def __init__(self, rows, config, period='month', group_by='customer'):
+        self.rows = rows
+        self.config = config
+        self.period_headline = {'day': _('Day'), 'week': _('Week'), 'month': _('Month'),
+                                'year': _('Year')}[period]
+        self.headline = {'customer': _('Customer'), 'project': _('Project'),
+                         'invoice': _('Invoice'), 'paid': _('Paid')}[group_by]
+
+    def __iter__(self):
+        wage_per_hour = self.config.values.wage_per_hour.value
+        period_width = max([len(row[0]) for row in self.rows] + [len(self.period_headline), len(_('Total'))]) + 3
+        name_width = max([len(row[1]) for row in self.rows] + [len(self.headline)]) + 3
+        row_format = '{0:<{period_width}} {1:<{name_width}} {2:>12} {3:>12} {4:>16}'
+        row_divider = divider()
+        yield row_divider
+        yield row_format.format(self.period_headline, self.headline, _('Workdays'), _('Hours'), _('Wage'),
+                                period_width=period_width, name_width=name_width)
+        yield row_divider
+        total_hours = 0
+        total_workdays = 0
+        for period, name, seconds, workdays in self.rows:
+            hours = seconds / 60 / 60
+            total_hours += hours
+            total_workdays += workdays
+            yield row_format.format(period, name, workdays, round(hours, 2),
+                                    round(calculate_wage(hours, wage_per_hour), 2),
+                                    period_width=period_width, name_width=name_width)
+        yield row_divider
+        yield row_format.format(_('Total'), '', total_workdays, round(total_hours, 2),
+                                round(calculate_wage(total_hours, wage_per_hour), 2),
+                                period_width=period_width, name_width=name_width)
+
+    def __str__(self):
+        return '\n'.join(self)
+
+
+class SearchResults(object):
+    """Table of the tags returned by search.search_tags."""
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        headlines = (_('Recorded'), _('Workday'), _('Customer'), _('Project'), _('Invoice'), _('Tag'))
+        cells = [(row.recorded.strftime('%Y-%m-%d %H:%M'), str(row.workday_id), row.customer,
+                  row.project, str(row.invoice_id) if row.invoice_id else _('Not invoiced'), row.tag)
+                 for row in self.rows]
+        widths = [max([len(row[column]) for row in cells] + [len(headline)])
+                  for column, headline in enumerate(headlines[:-1])]
+        row_format = '  '.join('{%d:<%d}' % (column, width) for column, width in enumerate(widths))
+        row_format += '  {%d}' % len(widths)
+        row_divider = divider()
+        yield row_divider
+        yield row_format.format(*headlines)
+        yield row_divider
+        for row in cells:
+            yield row_format.format(*row)
+        yield row_divider
+
+    def __str__(self):
+        return '\n'.join(self)
+
+
+class InvoiceDrift(object):
+    """Compact diff of an invoice as returned by Database.get_invoice_drift."""
+    markers = {'added': '+', 'removed': '-', 'changed': '~'}
+
+    def __init__(self, drift):
+        self.drift = drift
+
+    def __bool__(self):
+        return bool(self.drift)
+
+    def __len__(self):
+        return len(self.drift)
+
+    @staticmethod
+    def _times(start, end):
+        if not start:
+            return '-'
+        return '%s %s-%s' % (start.date().isoformat(), start.strftime('%H:%M'),
+                             end.strftime('%H:%M') if end else '')
+
+    def __iter__(self):
+        for change, row in self.drift:
+            if change == 'changed':
+                times = '%s -> %s' % (self._times(row.invoiced_start, row.invoiced_end),
+                                      self._times(row.start, row.end))
+            else:
+                times = self._times(row.start, row.end)
+            yield '%s %6d  %s' % (self.markers[change], row.id, times)
+        counts = [sum(1 for change, row in self.drift if change == name)
+                  for name in ('added', 'removed', 'changed')]
+        yield _('%d added, %d removed, %d changed') % tuple(counts)
+
+    def __str__(self):
+        return '\n'.join(self)
@@ -2,11 +2,14 @@ from .ui import UI
 from .status import main as status_ui
 
 
-def main(stdscr):
-    stamp_ui = UI(stdscr, ('status'))
-    stamp_ui.add_help()
-    stamp_ui.add_options()
-    stamp_ui.refresh()
-    next_step = stamp_ui.interact()
-    if next_step == 'status':
-        status_ui(stdscr)
+def main(stdscr, db):
+    while True:
+        stdscr.clear()
+        stamp_ui = UI(stdscr, ('workdays', 'invoices'))
+        stamp_ui.add_help()
+        stamp_ui.add_options()
+        stamp_ui.refresh()
+        next_step = stamp_ui.interact()
+        if not next_step:
+            break
+        status_ui(stdscr, db, next_step)
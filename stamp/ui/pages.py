@@ -0,0 +1,218 @@
+"""Rows of a table read a page at a time around a cursor.
+
+Pages are read with keyset pagination on (start, id) for workdays and
+(created, id) for invoices, so a page costs one index seek no matter how
+far into the history it is. Only a window of pages around the cursor is
+kept in memory and the pages next to it are read ahead in a background
+thread.
+"""
+
+import queue
+import threading
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import sessionmaker
+
+from ..mappings import Workday, Customer, Project, Invoice
+
+__all__ = ['Pages',
+           'workday_rows',
+           'invoice_rows',
+           'WORKDAY_KEY',
+           'INVOICE_KEY']
+
+PAGE_SIZE = 200
+# Pages kept on each side of the cursor before the far end is dropped
+KEPT_PAGES = 3
+
+FIRST = 'first'
+LAST = 'last'
+AFTER = 'after'
+BEFORE = 'before'
+
+# Unique sort keys the pages are read by
+WORKDAY_KEY = (Workday.start, Workday.id)
+INVOICE_KEY = (Invoice.created, Invoice.id)
+
+
+def workday_rows(session):
+    return session.query(Workday.id, Workday.start, Workday.end,
+                         Customer.name.label('customer'), Project.name.label('project'),
+                         Workday.invoice_id).join(
+                             Customer, Workday.customer_id == Customer.id).join(
+                                 Project, Workday.project_id == Project.id)
+
+
+def invoice_rows(session):
+    return session.query(Invoice.id, Invoice.created, Customer.name.label('customer'),
+                         Invoice.year, Invoice.month, Invoice.pdf, Invoice.sent,
+                         Invoice.paid).join(Customer, Invoice.customer_id == Customer.id)
+
+
+class Pages(object):
+    """A window of rows addressed by position.
+
+    Positions are relative to where the window was first loaded and stay
+    the same while pages are added or dropped at either end, rows[0] is at
+    position `offset`. Every query runs in the worker thread on its own
+    session since SQLite connections can not be shared between threads.
+    query is called with that session and gives the columns of the rows,
+    key is the unique sort key the pages are read by.
+    """
+    def __init__(self, db, query, key, page_size=PAGE_SIZE, kept_pages=KEPT_PAGES):
+        self.query = query
+        self.key = key
+        self.page_size = page_size
+        self.kept_pages = kept_pages
+        self.changed = threading.Condition()
+        self.requests = queue.Queue()
+        self.error = None
+        self._reset()
+        self.worker = threading.Thread(target=self._work, args=(db.engine,), daemon=True)
+        self.worker.start()
+
+    def _reset(self):
+        self.rows = []
+        self.offset = 0
+        self.at_start = False
+        self.at_end = False
+        self.pending = set()
+        # Pages requested before a reset are dropped when they arrive
+        self.generation = getattr(self, 'generation', 0) + 1
+
+    def _row_key(self, row):
+        return tuple(getattr(row, column.key) for column in self.key)
+
+    def _page(self, session, direction, key=None):
+        """A page after or before key, or at either end, in ascending order."""
+        query = self.query(session)
+        ascending = direction in (FIRST, AFTER)
+        if direction == AFTER:
+            query = query.filter(tuple_(*self.key) > tuple_(*key))
+        elif direction == BEFORE:
+            query = query.filter(tuple_(*self.key) < tuple_(*key))
+        if ascending:
+            query = query.order_by(*self.key)
+        else:
+            query = query.order_by(*[column.desc() for column in self.key])
+        rows = query.limit(self.page_size).all()
+        return rows if ascending else rows[::-1]
+
+    def _request(self, direction, key=None):
+        if direction not in self.pending:
+            self.pending.add(direction)
+            self.requests.put((self.generation, direction, key))
+
+    def _work(self, engine):
+        session = sessionmaker(bind=engine)()
+        try:
+            while True:
+                request = self.requests.get()
+                if request is None:
+                    return
+                generation, direction, key = request
+                try:
+                    rows = self._page(session, direction, key)
+                    # Ends the read transaction so later pages see new commits
+                    session.rollback()
+                except Exception as err:
+                    with self.changed:
+                        self.error = err
+                        self.changed.notify_all()
+                    return
+                with self.changed:
+                    if generation == self.generation:
+                        self._merge(direction, key, rows)
+                    self.changed.notify_all()
+        finally:
+            session.close()
+
+    def _merge(self, direction, key, rows):
+        self.pending.discard(direction)
+        complete = len(rows) == self.page_size
+        if direction in (FIRST, LAST):
+            self.rows = rows
+            self.at_start = direction == FIRST or not complete
+            self.at_end = direction == LAST or not complete
+            self.offset = -len(rows) if direction == LAST else 0
+        elif direction == AFTER:
+            # The window moved on while the page was read
+            if self.rows and self._row_key(self.rows[-1]) == key:
+                self.rows = self.rows + rows
+                self.at_end = not complete
+        elif direction == BEFORE:
+            if self.rows and self._row_key(self.rows[0]) == key:
+                self.rows = rows + self.rows
+                self.offset -= len(rows)
+                self.at_start = not complete
+
+    def load(self, direction=FIRST):
+        """Drop the window and read the first or last page."""
+        with self.changed:
+            self._reset()
+            self._request(direction)
+            self._wait_for(lambda: direction not in self.pending)
+
+    def _wait_for(self, loaded):
+        while not loaded() and not self.error:
+            self.changed.wait()
+        if self.error:
+            raise self.error
+
+    def _loaded(self, position):
+        return (self.offset <= position < self.offset + len(self.rows)
+                or (position < self.offset and self.at_start)
+                or (position >= self.offset + len(self.rows) and self.at_end))
+
+    def get(self, position):
+        """The row at position, None past either end.
+
+        Waits for the page when the cursor got ahead of the read-ahead.
+        """
+        with self.changed:
+            while self.rows and not self._loaded(position):
+                self._read_ahead(position)
+                needed = AFTER if position >= self.offset else BEFORE
+                self._wait_for(lambda: needed not in self.pending)
+            index = position - self.offset
+            if 0 <= index < len(self.rows):
+                return self.rows[index]
+            return None
+
+    def first_position(self):
+        return self.offset if self.at_start else None
+
+    def last_position(self):
+        return self.offset + len(self.rows) - 1 if self.at_end else None
+
+    def move_to(self, position):
+        """Keep the window around position and read the next pages ahead."""
+        with self.changed:
+            self._read_ahead(position)
+
+    def _read_ahead(self, position):
+        if not self.rows:
+            return
+        kept = self.kept_pages * self.page_size
+        index = position - self.offset
+        if index > kept + self.page_size:
+            # Rows at the edge are kept as keys for the next page
+            drop = min(index - kept, len(self.rows) - 1)
+            self.rows = self.rows[drop:]
+            self.offset += drop
+            self.at_start = False
+            self.pending.discard(BEFORE)
+            index = position - self.offset
+        if len(self.rows) - index > kept + self.page_size:
+            self.rows = self.rows[:max(index + kept, 1)]
+            self.at_end = False
+            self.pending.discard(AFTER)
+        index = position - self.offset
+        if not self.at_end and len(self.rows) - index <= self.page_size:
+            self._request(AFTER, self._row_key(self.rows[-1]))
+        if not self.at_start and index < self.page_size:
+            self._request(BEFORE, self._row_key(self.rows[0]))
+
+    def close(self):
+        self.requests.put(None)
+        self.worker.join()
@@ -1,10 +1,137 @@
-from .ui import UI
+import curses
+from datetime import datetime
 
+from ..helpers import calculate_workhours
+from ..formatting import boolean_yes_or_no
+from .pages import Pages, workday_rows, invoice_rows, WORKDAY_KEY, INVOICE_KEY, FIRST, LAST
 
-def main(stdscr):
-    stamp_ui = UI(stdscr)
-    stamp_ui.add_help()
-    stamp_ui.add_column('Test1', ('sasa', 'tada'), 7)
-    stamp_ui.add_column('Test2', ('xaxa', 'blbl'), 8)
-    stamp_ui.refresh()
-    stamp_ui.interact()
+TIME_FORMAT = '%H:%M'
+
+
+def workday_cells(row):
+    if row.end:
+        hours = calculate_workhours(row.start, row.end)
+        end = row.end.strftime(TIME_FORMAT)
+    else:
+        hours = calculate_workhours(row.start, datetime.now())
+        end = _('Active')
+    return (str(row.id), row.start.date().isoformat(), row.customer, row.project,
+            row.start.strftime(TIME_FORMAT), end, str(row.invoice_id or ''), '%.2f' % hours)
+
+
+def invoice_cells(row):
+    return (str(row.id), row.created.date().isoformat(), row.customer, str(row.year),
+            str(row.month), row.pdf or _('Not exported'), boolean_yes_or_no(row.sent),
+            boolean_yes_or_no(row.paid))
+
+
+TABLES = {'workdays': (workday_rows, WORKDAY_KEY,
+                       (_('ID'), _('Date'), _('Customer'), _('Project'), _('From'),
+                        _('To'), _('Invoice ID'), _('Hours')), workday_cells),
+          'invoices': (invoice_rows, INVOICE_KEY,
+                       (_('ID'), _('Created on'), _('Customer'), _('Year'),
+                        _('Month'), _('PDF'), _('Sent'), _('Paid')), invoice_cells)}
+
+
+class Browser(object):
+    """Scrollable table that only reads and draws the rows on screen."""
+    def __init__(self, stdscr, db, table='workdays'):
+        query, key, self.headlines, self.cells = TABLES[table]
+        self.stdscr = stdscr
+        self.pages = Pages(db, query, key)
+        # Columns only grow so they do not jump around while scrolling
+        self.widths = [len(headline) for headline in self.headlines]
+        self.cursor = 0
+        self.top = 0
+        stdscr.keypad(True)
+        curses.curs_set(0)
+
+    def height(self):
+        # Minus the headline and the help line
+        return max(self.stdscr.getmaxyx()[0] - 2, 1)
+
+    def format(self, cells):
+        for column, cell in enumerate(cells):
+            self.widths[column] = max(self.widths[column], len(cell))
+        return ' '.join('{0:<{1}}'.format(cell, width) for cell, width in zip(cells, self.widths))
+
+    def draw(self):
+        screen_height, screen_width = self.stdscr.getmaxyx()
+        lines = []
+        for position in range(self.top, self.top + self.height()):
+            row = self.pages.get(position)
+            if row is None:
+                break
+            lines.append((position, self.cells(row)))
+        # Widths have to be known before the headline is drawn
+        lines = [(position, self.format(cells)) for position, cells in lines]
+        self.stdscr.erase()
+        self.stdscr.addnstr(0, 0, self.format(self.headlines), screen_width - 1,
+                            curses.A_REVERSE|curses.A_BOLD) # NOQA
+        for y, (position, line) in enumerate(lines, 1):
+            self.stdscr.addnstr(y, 0, line, screen_width - 1,
+                                curses.A_REVERSE if position == self.cursor else curses.A_NORMAL)
+        help_line = _('jk to scroll, g/G for first/last')
+        self.stdscr.addnstr(screen_height - 1, 0, help_line, screen_width - 1, curses.A_REVERSE)
+        quit_help = _('q to quit')
+        if len(help_line) + len(quit_help) + 2 < screen_width:
+            self.stdscr.addstr(screen_height - 1, screen_width - 1 - len(quit_help),
+                               quit_help, curses.A_REVERSE)
+        self.stdscr.refresh()
+
+    def scroll_to_cursor(self):
+        if self.cursor < self.top:
+            self.top = self.cursor
+        elif self.cursor >= self.top + self.height():
+            self.top = self.cursor - self.height() + 1
+        self.pages.move_to(self.cursor)
+
+    def move(self, step):
+        if self.pages.get(self.cursor) is None:
+            return
+        target = self.cursor + step
+        if self.pages.get(target) is None:
+            target = self.pages.last_position() if step > 0 else self.pages.first_position()
+        self.cursor = target
+        self.scroll_to_cursor()
+
+    def jump(self, direction):
+        self.pages.load(direction)
+        if direction == FIRST:
+            self.cursor = self.top = self.pages.first_position()
+        else:
+            # Fill the screen up to the last row
+            self.cursor = self.pages.last_position()
+            self.top = self.cursor - self.height() + 1
+            if self.pages.first_position() is not None:
+                self.top = max(self.top, self.pages.first_position())
+        self.pages.move_to(self.cursor)
+
+    def interact(self):
+        self.jump(FIRST)
+        try:
+            while True:
+                self.draw()
+                input_char = self.stdscr.getch()
+                if input_char == ord('q'):
+                    break
+                elif input_char in (ord('j'), curses.KEY_DOWN):
+                    self.move(1)
+                elif input_char in (ord('k'), curses.KEY_UP):
+                    self.move(-1)
+                elif input_char in (ord(' '), curses.KEY_NPAGE):
+                    self.move(self.height())
+                elif input_char in (ord('b'), curses.KEY_PPAGE):
+                    self.move(-self.height())
+                elif input_char in (ord('g'), curses.KEY_HOME):
+                    self.jump(FIRST)
+                elif input_char in (ord('G'), curses.KEY_END):
+                    self.jump(LAST)
+                elif input_char == curses.KEY_RESIZE:
+                    self.scroll_to_cursor()
+        finally:
+            self.pages.close()
+
+
+def main(stdscr, db, table='workdays'):
+    Browser(stdscr, db, table).interact()
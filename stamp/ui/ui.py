@@ -80,7 +80,7 @@ class UI(object):
                 self.move_cursor_y(1)
             if input_char == ord('k'):
                 self.move_cursor_y(-1)
-            if input_char == ord('o'):
+            if input_char in (ord('o'), ord('\n')):
                 return self.options[self.cursor_y]
             self.refresh()
 
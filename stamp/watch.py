@@ -0,0 +1,108 @@
+"""Feed of the current stamp that only touches the database on changes.
+
+`PRAGMA data_version` on a connection that is kept open changes whenever
+another connection commits to the database file, so checking for changes
+costs a single pragma. The current stamp is only queried again when it
+changed, between changes the elapsed time is ticked from the start time
+already loaded.
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime
+
+from .helpers import calculate_workhours, calculate_wage
+from .exceptions import CurrentStampNotFoundError
+from .mappings import Tag
+
+__all__ = ['current_stamp_state',
+           'format_state',
+           'watch_current_stamp']
+
+WATCH_INTERVAL = 1.0
+
+
+def current_stamp_state(db):
+    """What the feed shows about the current stamp, None when not stamped in."""
+    try:
+        stamp = db.current_stamp()
+    except CurrentStampNotFoundError:
+        return None
+    return {'id': stamp.id,
+            'start': stamp.start,
+            'customer': stamp.customer.name,
+            'project': stamp.project.name,
+            'tags': db.session.query(Tag.id).filter(Tag.workday_id == stamp.id).count()}
+
+
+def format_state(state, config, output_format='text', now=None):
+    """One line for the state at `now`, the elapsed hours and wage are computed here."""
+    if state is None:
+        if output_format == 'json':
+            return json.dumps({'stamped_in': False})
+        return _('Not stamped in!')
+    hours = calculate_workhours(state['start'], now or datetime.now())
+    wage = calculate_wage(hours, config.values.wage_per_hour.value)
+    if output_format == 'json':
+        return json.dumps({'stamped_in': True,
+                           'id': state['id'],
+                           'start': state['start'].isoformat(timespec='seconds'),
+                           'elapsed_hours': round(hours, 2),
+                           'wage': round(wage, 2),
+                           'currency': config.values.currency.value,
+                           'customer': state['customer'],
+                           'project': state['project'],
+                           'tags': state['tags']})
+    return '%s / %s %s %.2fh %.2f %s (%s)' % (state['customer'], state['project'],
+                                            state['start'].strftime('%H:%M'), hours, wage,
+                                            config.values.currency.value,
+                                            _('%d tag(s)') % state['tags'])
+
+
+def write_sidecar(sidecar, line):
+    # Readers never see a half written file
+    temporary_file = '%s.%d' % (sidecar, os.getpid())
+    with open(temporary_file, 'w') as sidecar_file:
+        sidecar_file.write(line + '\n')
+    os.replace(temporary_file, sidecar)
+
+
+def watch_current_stamp(db, config, output_format='text', interval=WATCH_INTERVAL,
+                        sidecar=None, stream=sys.stdout, count=None):
+    """Print the current stamp whenever the line shown for it changes.
+
+    The database is only queried after another connection has committed.
+    In text format the line also changes as the elapsed hours tick, in json
+    format only data changes are printed since the start time is part of
+    the output. The same line is kept in the sidecar file when one is
+    given. Stops after `count` lines when given.
+    """
+    with db.engine.connect() as watcher:
+        version = None
+        state = None
+        shown = False
+        last_shown = None
+        while True:
+            current_version = watcher.execute('PRAGMA data_version').scalar()
+            if current_version != version:
+                version = current_version
+                state = current_stamp_state(db)
+                # End the read transaction so the next query sees new commits
+                db.session.close()
+            line = format_state(state, config, output_format)
+            # What has to change before a new line is printed
+            compared = state if output_format == 'json' else line
+            if not shown or compared != last_shown:
+                shown = True
+                last_shown = compared
+                stream.write(line + '\n')
+                stream.flush()
+                if sidecar:
+                    write_sidecar(sidecar, line)
+                if count:
+                    count -= 1
+                    if not count:
+                        return
+            time.sleep(interval)
@@ -0,0 +1,44 @@
+"""Databases of imported workdays shared by the tests."""
+
+import os
+import json
+from io import StringIO
+from uuid import uuid4
+from contextlib import redirect_stdout
+from datetime import timedelta
+
+from stamp.constants import DATA_DIR
+from stamp.db import Database
+from stamp.importer import import_workdays
+
+
+def workday(customer, project, start, hours, tags=()):
+    """A workday as a line of `stamp import` JSONL."""
+    line = {'customer': customer,
+            'project': project,
+            'start': start.isoformat(' '),
+            'end': (start + timedelta(hours=hours)).isoformat(' ')}
+    if tags:
+        line['tags'] = list(tags)
+    return json.dumps(line)
+
+
+def create_database(lines):
+    """A new database under DATA_DIR holding the workdays of the JSONL lines.
+
+    Returns the database and its name as given to --db.
+    """
+    db_name = 'test_%s' % uuid4().hex
+    db = Database(os.path.join(DATA_DIR, db_name) + '.db', ask=False)
+    with redirect_stdout(StringIO()):
+        import_workdays(db, StringIO('\n'.join(lines)), 'jsonl')
+    db.commit()
+    return db, db_name
+
+
+def remove_database(db_path):
+    # WAL mode leaves the -wal and -shm files next to the database
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.isfile(db_path + suffix):
+            os.remove(db_path + suffix)
+
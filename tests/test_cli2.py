@@ -244,8 +244,9 @@ class TestStampCLI(unittest.TestCase):
 
 
 def tearDownModule():
-    if os.path.isfile(TESTING_DB_PATH):
-        os.remove(TESTING_DB_PATH)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.isfile(TESTING_DB_PATH + suffix):
+            os.remove(TESTING_DB_PATH + suffix)
     invoice_folder = os.path.join(INVOICE_DIR, TESTING_DB)
     if os.path.isdir(invoice_folder):
         rmtree(invoice_folder)
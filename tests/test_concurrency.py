@@ -0,0 +1,136 @@
+import os
+import sys
+import sqlite3
+import unittest
+import threading
+import multiprocessing
+from argparse import Namespace
+from contextlib import redirect_stdout
+from io import StringIO
+from uuid import uuid4
+from shutil import rmtree
+from datetime import datetime, timedelta
+
+sys.path.append('../stamp')
+
+from stamp.constants import DATA_DIR, INVOICE_DIR # NOQA
+from stamp.db import Database
+from stamp.add import new_stamp, create_customer, create_project
+from stamp.end import end_stamp
+from stamp.export import export_invoice
+from stamp.config import Config, engine_profile
+from stamp.decorators import db_commit_decorator
+from stamp.mappings import Workday
+
+TESTING_DB = 'test_%s' % uuid4().hex
+TESTING_DB_PATH = os.path.join(DATA_DIR, TESTING_DB) + '.db'
+STAMPERS = 4
+WORKDAYS_PER_STAMPER = 15
+EXPORTS = 3
+EXPORT_MONTH = datetime(2018, 3, 1, 8)
+
+
+@db_commit_decorator
+def complete_workday(args):
+    new_stamp(args.db, args.customer, args.project, args.start.date(),
+              args.start.time(), ask=False)
+    end = args.start + timedelta(hours=2)
+    end_stamp(args.db, end.date(), end.time())
+
+
+@db_commit_decorator
+def export(args):
+    export_invoice(args.db, EXPORT_MONTH.year, EXPORT_MONTH.strftime('%B'),
+                   'Exported Company', None, args.config, save_pdf=True, ask=False)
+
+
+def stamper(number):
+    args = Namespace(db=Database(TESTING_DB_PATH, ask=False),
+                     customer='Company %d' % number,
+                     project='Project %d' % number)
+    with redirect_stdout(StringIO()):
+        for day in range(WORKDAYS_PER_STAMPER):
+            args.start = datetime(2019, 1, 1, 8) + timedelta(days=day, minutes=number)
+            complete_workday(args)
+
+
+def exporter(number):
+    args = Namespace(db=Database(TESTING_DB_PATH, ask=False), config=Config(None))
+    with redirect_stdout(StringIO()):
+        for _export in range(EXPORTS):
+            export(args)
+
+
+class TestConcurrentAccess(unittest.TestCase):
+
+    def setUp(self):
+        db = Database(TESTING_DB_PATH, ask=False)
+        for number in range(STAMPERS):
+            customer = create_customer(db, 'Company %d' % number, ask=False)
+            create_project(db, customer.id, 'Project %d' % number, ask=False)
+        customer = create_customer(db, 'Exported Company', ask=False)
+        project = create_project(db, customer.id, 'Exported Project', ask=False)
+        for day in range(10):
+            start = EXPORT_MONTH + timedelta(days=day)
+            db.add(Workday(start=start, end=start + timedelta(hours=7),
+                           customer_id=customer.id, project_id=project.id))
+        db.commit()
+        db.session.close()
+
+    def tearDown(self):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.isfile(TESTING_DB_PATH + suffix):
+                os.remove(TESTING_DB_PATH + suffix)
+        invoice_folder = os.path.join(INVOICE_DIR, TESTING_DB)
+        if os.path.isdir(invoice_folder):
+            rmtree(invoice_folder)
+
+    def test_stamping_and_exporting_at_once(self):
+        processes = [multiprocessing.Process(target=stamper, args=(number,))
+                     for number in range(STAMPERS)]
+        processes.append(multiprocessing.Process(target=exporter, args=(0,)))
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(120)
+            self.assertEqual(process.exitcode, 0)
+
+        db = Database(TESTING_DB_PATH, ask=False)
+        self.assertEqual(db.engine.execute('PRAGMA journal_mode').scalar(), 'wal')
+        self.assertEqual(db.session.query(Workday).filter(Workday.customer_id <= STAMPERS).count(),
+                         STAMPERS * WORKDAYS_PER_STAMPER)
+        self.assertEqual(db.session.query(Workday).filter(Workday.end.is_(None)).count(), 0)
+        db.session.close()
+
+    def test_busy_database_does_not_run_the_command_again(self):
+        calls = []
+
+        @db_commit_decorator
+        def stamp_in(args):
+            calls.append(args.start)
+            print('Stamping in')
+            new_stamp(args.db, 'Company 0', 'Project 0', args.start.date(), args.start.time(), ask=False)
+
+        # Longer than the busy timeout, so the first BEGIN IMMEDIATE gives up
+        locker = sqlite3.connect(TESTING_DB_PATH, check_same_thread=False)
+        locker.execute('BEGIN IMMEDIATE')
+        unlock = threading.Timer(0.3, locker.rollback)
+        unlock.start()
+        profile = dict(engine_profile(Config(None)), busy_timeout=100)
+        args = Namespace(db=Database(TESTING_DB_PATH, ask=False, profile=profile),
+                         start=datetime(2019, 1, 1, 8))
+        output = StringIO()
+        try:
+            with redirect_stdout(output):
+                stamp_in(args)
+        finally:
+            unlock.join()
+            locker.close()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(output.getvalue().count('Stamping in'), 1)
+        self.assertEqual(args.db.session.query(Workday).filter(Workday.end.is_(None)).count(), 1)
+        args.db.session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import unittest
+import threading
+from io import StringIO
+from uuid import uuid4
+from tempfile import mkdtemp
+from shutil import rmtree
+from datetime import datetime
+from contextlib import redirect_stdout
+
+sys.path.append('../stamp')
+
+from stamp.constants import DATA_DIR # NOQA
+from stamp.db import Database
+from stamp.add import new_stamp
+from stamp.end import end_stamp
+from stamp.daemon import create_server, forward
+from stamp.mappings import Workday, Invoice
+
+TESTING_DB = 'test_%s' % uuid4().hex
+TESTING_DB_PATH = os.path.join(DATA_DIR, TESTING_DB) + '.db'
+
+
+class TestDaemon(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        db = Database(TESTING_DB_PATH, ask=False)
+        now = datetime.now()
+        with redirect_stdout(StringIO()):
+            new_stamp(db, 'Daemon Company', 'Daemon Project', now.date(), now.time(), ask=False)
+            end_stamp(db, now.date(), now.time())
+        db.commit()
+        db.session.close()
+        cls.socket_directory = mkdtemp()
+        cls.socket_path = os.path.join(cls.socket_directory, 'stampd.sock')
+        cls.server = create_server(cls.socket_path)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        rmtree(cls.socket_directory)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.isfile(TESTING_DB_PATH + suffix):
+                os.remove(TESTING_DB_PATH + suffix)
+
+    def forward(self, *args):
+        output = StringIO()
+        with redirect_stdout(output):
+            code = forward(['--db', TESTING_DB] + list(args), self.socket_path)
+        return code, output.getvalue()
+
+    def workdays(self):
+        db = Database(TESTING_DB_PATH, ask=False)
+        try:
+            return db.session.query(Workday.start, Workday.end).order_by(Workday.id).all()
+        finally:
+            db.session.close()
+
+    def test_stamp_in_and_out(self):
+        before = datetime.now().replace(second=0, microsecond=0)
+        self.assertEqual(self.forward('in', '-c', 'Daemon Company', '-p', 'Daemon Project')[0], 0)
+        start, end = self.workdays()[-1]
+        self.assertIsNone(end)
+        # "now" is when the command was sent, not when the daemon started
+        self.assertGreaterEqual(start, before)
+        code, output = self.forward('status')
+        self.assertEqual(code, 0)
+        self.assertIn('Daemon Company', output)
+        self.assertEqual(self.forward('out')[0], 0)
+        self.assertIsNotNone(self.workdays()[-1].end)
+
+    def test_status_summary(self):
+        code, output = self.forward('status', 'summary')
+        self.assertEqual(code, 0)
+        self.assertIn('Daemon Company', output)
+
+    def test_prompt_falls_back(self):
+        now = datetime.now()
+        # Asks whether to create the invoice, nothing may be left behind
+        self.assertIsNone(self.forward('export', now.strftime('%B'), str(now.year), 'Daemon Company')[0])
+        db = Database(TESTING_DB_PATH, ask=False)
+        try:
+            self.assertEqual(db.session.query(Invoice).count(), 0)
+        finally:
+            db.session.close()
+
+    def test_unserved_commands_fall_back(self):
+        self.assertIsNone(self.forward('config', 'show')[0])
+        self.assertIsNone(self.forward('status', 'workdays', '--pager')[0])
+
+    def test_no_daemon(self):
+        self.assertIsNone(forward(['status'], os.path.join(self.socket_directory, 'missing.sock')))
+
+
+if __name__ == '__main__':
+    unittest.main()
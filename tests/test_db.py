@@ -0,0 +1,381 @@
+import os
+import sys
+import unittest
+from uuid import uuid4
+from datetime import datetime, timedelta
+from contextlib import contextmanager, redirect_stdout
+from io import StringIO
+
+from sqlalchemy import event, tuple_
+from sqlalchemy.engine import Engine
+
+sys.path.append('../stamp')
+
+from stamp.constants import DATA_DIR # NOQA
+from stamp.db import Database
+from stamp.mappings import Workday, Tag, WorkdayRollup, Customer, Project
+from stamp.add import new_stamp, create_invoice, create_customer, create_project
+from stamp.end import end_stamp
+from stamp.status import Status
+from stamp.config import Config
+from stamp.migrations import SCHEMA_VERSION, get_schema_version, run_in_batches
+from stamp.rollup import get_summary, rebuild_rollup
+from stamp.delete import delete_workday_or_tag
+from stamp.edit import edit_customer
+from stamp.ui.pages import invoice_rows, INVOICE_KEY
+from stamp.exceptions import NoMatchingDatabaseEntryError, TooManyMatchingDatabaseEntriesError
+
+TESTING_DB = 'test_%s' % uuid4().hex
+TESTING_DB_PATH = os.path.join(DATA_DIR, TESTING_DB) + '.db'
+
+CONFIG = Config(None)
+
+
+@contextmanager
+def count_statements(db=None):
+    # Without a database every engine is counted, including ones created inside the block
+    target = db.engine if db else Engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(target, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(target, 'before_cursor_execute', before_cursor_execute)
+
+
+def populate(db, customers=3, workdays=30):
+    start = datetime(2019, 1, 1, 8)
+    for number in range(customers):
+        customer = create_customer(db, 'Customer %d' % number, ask=False)
+        create_project(db, customer.id, 'Project %d' % number, ask=False)
+    with redirect_stdout(StringIO()):
+        for number in range(workdays):
+            customer = 'Customer %d' % (number % customers)
+            project = 'Project %d' % (number % customers)
+            new_stamp(db, customer, project, start.date(), start.time(), ask=False)
+            end = start + timedelta(hours=8)
+            end_stamp(db, end.date(), end.time())
+            start += timedelta(days=1)
+    db.commit()
+
+
+def query_plan(db, query):
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = [compiled.params[name] for name in compiled.positiontup]
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + str(compiled), params)
+        return ' '.join(row[-1] for row in cursor.fetchall())
+    finally:
+        connection.close()
+
+
+class TestIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(TESTING_DB_PATH, ask=False)
+
+    def tearDown(self):
+        self.db.session.close()
+        os.remove(TESTING_DB_PATH)
+
+    def test_indexes_created_on_existing_database(self):
+        # Databases from before the schema was versioned
+        self.db.engine.execute('DROP INDEX ix_workday_open')
+        self.db.engine.execute('DROP INDEX ix_tag_workday')
+        self.db.engine.execute('PRAGMA user_version = 0')
+        self.db.session.close()
+
+        db = Database(TESTING_DB_PATH, ask=False)
+        indexes = [row[0] for row in db.engine.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        self.assertIn('ix_workday_open', indexes)
+        self.assertIn('ix_tag_workday', indexes)
+        db.session.close()
+
+    def test_current_stamp_uses_partial_index(self):
+        query = self.db.session.query(Workday).filter_by(end=None)
+        self.assertIn('ix_workday_open', query_plan(self.db, query))
+
+    def test_completed_workdays_use_start_index(self):
+        query = self.db.session.query(Workday).filter(Workday.end.isnot(None)).order_by(Workday.start)
+        plan = query_plan(self.db, query)
+        self.assertIn('ix_workday_start', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_export_filter_uses_customer_index(self):
+        query = self.db.session.query(Workday).filter(Workday.start >= datetime(2019, 1, 1),
+                                                      Workday.end < datetime(2019, 2, 1),
+                                                      Workday.customer_id == 1)
+        self.assertIn('ix_workday_customer_start', query_plan(self.db, query))
+
+    def test_project_and_invoice_lookups_use_index(self):
+        query = self.db.session.query(Workday).filter(Workday.project_id == 1,
+                                                      Workday.start >= datetime(2019, 1, 1))
+        self.assertIn('ix_workday_project_start', query_plan(self.db, query))
+        query = self.db.session.query(Workday).filter(Workday.invoice_id == 1)
+        self.assertIn('ix_workday_invoice', query_plan(self.db, query))
+
+    def test_tags_of_workday_use_index(self):
+        query = self.db.session.query(Tag).filter(Tag.workday_id == 1)
+        self.assertIn('ix_tag_workday', query_plan(self.db, query))
+
+    def test_invoice_pages_use_created_index(self):
+        query = invoice_rows(self.db.session).filter(tuple_(*INVOICE_KEY) > tuple_(datetime(2019, 1, 1), 1))
+        plan = query_plan(self.db, query.order_by(*INVOICE_KEY).limit(200))
+        self.assertIn('ix_invoice_created', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_created_index_added_by_migration(self):
+        self.db.engine.execute('DROP INDEX ix_invoice_created')
+        self.db.engine.execute('PRAGMA user_version = %d' % (SCHEMA_VERSION - 1))
+        self.db.session.close()
+
+        db = Database(TESTING_DB_PATH, ask=False)
+        indexes = [row[0] for row in db.engine.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        self.assertIn('ix_invoice_created', indexes)
+        db.session.close()
+
+
+class TestMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(TESTING_DB_PATH, ask=False)
+
+    def tearDown(self):
+        self.db.session.close()
+        os.remove(TESTING_DB_PATH)
+
+    def test_new_database_has_current_version(self):
+        with self.db.engine.connect() as connection:
+            self.assertEqual(get_schema_version(connection), SCHEMA_VERSION)
+
+    def test_opening_current_database_reads_one_pragma(self):
+        self.db.session.close()
+        with count_statements() as statements:
+            self.db = Database(TESTING_DB_PATH, ask=False)
+        self.assertEqual(statements, ['PRAGMA user_version'])
+
+    def test_run_in_batches(self):
+        populate(self.db, workdays=25)
+        self.db.session.close()
+        with count_statements(self.db) as statements:
+            run_in_batches(self.db.engine,
+                           'UPDATE workday SET invoice_id = 0 WHERE id IN '
+                           '(SELECT id FROM workday WHERE invoice_id IS NULL LIMIT :batch_size)',
+                           batch_size=10)
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(self.db.session.query(Workday).filter(Workday.invoice_id.is_(None)).count(), 0)
+
+
+class TestRollup(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(TESTING_DB_PATH, ask=False)
+        populate(self.db, workdays=40)
+
+    def tearDown(self):
+        self.db.session.close()
+        os.remove(TESTING_DB_PATH)
+
+    def rollup(self):
+        return sorted(tuple(row) for row in self.db.session.query(
+            WorkdayRollup.customer_id, WorkdayRollup.project_id, WorkdayRollup.year,
+            WorkdayRollup.month, WorkdayRollup.seconds, WorkdayRollup.workdays))
+
+    def assert_rollup_matches_rebuild(self):
+        maintained = self.rollup()
+        rebuild_rollup(self.db.session.connection())
+        self.assertEqual(maintained, self.rollup())
+
+    def test_end_stamp_updates_rollup(self):
+        summary = dict((name, (seconds, workdays)) for name, seconds, workdays in get_summary(self.db, 2019))
+        # 40 workdays of 8 hours spread over three customers
+        self.assertEqual(summary['Customer 0'], (14 * 8 * 3600, 14))
+        self.assertEqual(get_summary(self.db, 2019, 'month'), [('2019-01', 31 * 8 * 3600, 31),
+                                                                ('2019-02', 9 * 8 * 3600, 9)])
+        start = datetime(2019, 3, 1, 8)
+        with redirect_stdout(StringIO()):
+            new_stamp(self.db, 'Customer 0', 'Project 0', start.date(), start.time(), ask=False)
+            # Open stamps are not counted
+            self.assertEqual(len(get_summary(self.db, 2019, 'month')), 2)
+            end_stamp(self.db, start.date(), (start + timedelta(hours=2)).time())
+        self.assertEqual(get_summary(self.db, 2019, 'month')[-1], ('2019-03', 2 * 3600, 1))
+        self.assert_rollup_matches_rebuild()
+
+    def test_edits_and_deletes_update_rollup(self):
+        workday = self.db.get('Workday', 1)
+        workday.project = self.db.get('Project', 2)
+        workday.end = workday.end + timedelta(hours=1)
+        self.db.get('Workday', 2).start = datetime(2018, 12, 31, 8)
+        self.db.commit()
+        delete_workday_or_tag(self.db, 3)
+        self.db.commit()
+        self.assert_rollup_matches_rebuild()
+        self.assertEqual(get_summary(self.db, 2018), [('Customer 1', 56 * 3600, 1)])
+
+    def test_summary_uses_rollup_index(self):
+        query = self.db.session.query(WorkdayRollup).filter(WorkdayRollup.year == 2019)
+        self.assertIn('ix_workday_rollup_year', query_plan(self.db, query))
+
+
+class TestStatusQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(TESTING_DB_PATH, ask=False)
+        populate(self.db)
+        for customer in range(3):
+            workdays = self.db.get('Workday').filter(Workday.customer_id == customer + 1)
+            create_invoice(self.db, workdays, 'Customer %d' % customer, 2019, 'January')
+        self.db.commit()
+        # Start from a cold identity map like a fresh invocation would
+        self.db.session.close()
+
+    def tearDown(self):
+        self.db.session.close()
+        os.remove(TESTING_DB_PATH)
+
+    def test_workday_status_statement_count(self):
+        with count_statements(self.db) as statements:
+            str(Status(self.db.get('Workday', eager=True), CONFIG))
+        self.assertEqual(len(statements), 2)
+
+    def test_invoice_status_statement_count(self):
+        with count_statements(self.db) as statements:
+            str(Status(self.db.get('Invoice', eager=True), CONFIG))
+        self.assertEqual(len(statements), 2)
+
+    def test_single_workday_status_statement_count(self):
+        with count_statements(self.db) as statements:
+            str(Status(self.db.get('Workday', 1, eager=True), CONFIG))
+        self.assertEqual(len(statements), 1)
+
+    def test_paginated_workday_listing(self):
+        query = self.db.filter_workdays(self.db.get('Workday', eager=True),
+                                        since=datetime(2019, 1, 10).date(),
+                                        until=datetime(2019, 1, 20).date(),
+                                        limit=5, offset=2)
+        self.assertEqual([workday.id for workday in query], [12, 13, 14, 15, 16])
+        stream = StringIO()
+        Status(query, CONFIG).write(stream)
+        # Divider, headline and divider followed by a line and divider per workday
+        self.assertEqual(len(stream.getvalue().splitlines()), 3 + 2 * 5)
+
+    def test_widths_from_written_rows(self):
+        self.db.session.query(Customer).filter(Customer.name == 'Customer 2').one().name = 'C' * 60
+        self.db.commit()
+        query = self.db.filter_workdays(self.db.get('Workday', eager=True), limit=2)
+        headline = str(Status(query, CONFIG)).splitlines()[1]
+        self.assertLess(headline.index(_('Project')), 60)
+
+
+class TestQueryPrimitives(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(TESTING_DB_PATH, ask=False)
+        populate(self.db)
+        # Same start as workday 4, the id decides the order
+        self.db.get('Workday', 5).start = self.db.get('Workday', 4).start
+        self.db.commit()
+        self.db.session.close()
+
+    def tearDown(self):
+        self.db.session.close()
+        os.remove(TESTING_DB_PATH)
+
+    def test_iter_workdays_in_keyset_batches(self):
+        with count_statements(self.db) as statements:
+            ids = [workday.id for workday in self.db.iter_workdays(batch_size=7)]
+        self.assertEqual(ids, list(range(1, 31)))
+        # 7, 7, 7, 7 and the last 2
+        self.assertEqual(len(statements), 5)
+        ids = [workday.id for workday in self.db.iter_workdays(after=self.db.workday_key(4), limit=4,
+                                                                 batch_size=3)]
+        self.assertEqual(ids, [5, 6, 7, 8])
+
+    def test_keyset_page_uses_start_index(self):
+        query = self.db.filter_workdays(self.db.query(Workday), limit=10,
+                                        after=self.db.workday_key(10))
+        plan = query_plan(self.db, query)
+        self.assertIn('ix_workday_start', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_existence_checks_do_not_count(self):
+        with count_statements(self.db) as statements:
+            self.db.get('Workday')
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('count(', statements[0])
+
+    def test_get_project(self):
+        self.assertEqual(self.db.get_project('Project 1').name, 'Project 1')
+        with self.assertRaises(NoMatchingDatabaseEntryError):
+            self.db.get_project('Project 9')
+        create_project(self.db, 2, 'Project 1', ask=False)
+        with self.assertRaises(TooManyMatchingDatabaseEntriesError):
+            self.db.get_project('Project 1')
+
+    def test_new_stamp_creates_unknown_customer_and_project(self):
+        start = datetime(2019, 3, 1, 8)
+        with redirect_stdout(StringIO()):
+            new_stamp(self.db, 'Customer 9', 'Project 9', start.date(), start.time(), ask=False)
+        stamp = self.db.current_stamp()
+        self.assertEqual((stamp.customer.name, stamp.project.name), ('Customer 9', 'Project 9'))
+
+
+class TestNameCache(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(TESTING_DB_PATH, ask=False)
+        populate(self.db, workdays=6)
+        self.db.session.close()
+        # Like a new invocation
+        self.db = Database(TESTING_DB_PATH, ask=False)
+
+    def tearDown(self):
+        self.db.session.close()
+        os.remove(TESTING_DB_PATH)
+
+    def test_names_read_once(self):
+        with count_statements(self.db) as statements:
+            customer = self.db.get_by_name(Customer, 'Customer 1')
+        # All names and the customer itself
+        self.assertEqual(len(statements), 2)
+        with count_statements(self.db) as statements:
+            # The identity map has the customer
+            self.assertIs(self.db.get_by_name(Customer, 'Customer 1'), customer)
+            self.assertEqual(self.db.get_by_name(Project, 'Project 2').id, 3)
+        self.assertEqual(len(statements), 1)
+
+    def test_projects_of_customer(self):
+        create_project(self.db, 2, 'Project 0', ask=False)
+        self.assertEqual(self.db.get_by_name(Project, 'Project 0').customer_id, 1)
+        self.assertEqual(self.db.get_by_name(Project, 'Project 0', customer_id=2).customer_id, 2)
+        with self.assertRaises(NoMatchingDatabaseEntryError):
+            self.db.get_by_name(Project, 'Project 1', customer_id=1)
+
+    def test_rename_invalidates(self):
+        self.db.get_by_name(Customer, 'Customer 1')
+        edit_customer(self.db, 2, name='Renamed Customer')
+        self.db.commit()
+        with self.assertRaises(NoMatchingDatabaseEntryError):
+            self.db.get_by_name(Customer, 'Customer 1')
+        self.assertEqual(self.db.get_by_name(Customer, 'Renamed Customer').id, 2)
+
+    def test_changes_by_other_process(self):
+        self.db.get_by_name(Customer, 'Customer 1')
+        other = Database(TESTING_DB_PATH, ask=False)
+        edit_customer(other, 2, name='Renamed Customer')
+        create_customer(other, 'Customer 1', ask=False)
+        other.commit()
+        other.session.close()
+        self.db.session.close()
+        self.assertEqual(self.db.get_by_name(Customer, 'Customer 1').id, 4)
+        self.assertEqual(self.db.get_by_name(Customer, 'Renamed Customer').id, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import sys
+import unittest
+from io import StringIO
+from shutil import rmtree
+from tempfile import mkdtemp
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+sys.path.append('../stamp')
+
+from stamp.constants import INVOICE_DIR # NOQA
+from stamp.export import export_all_invoices, GetExportFilter, month_workdays, create_pdf
+from stamp.config import Config
+from stamp.db import Database
+from stamp.mappings import Invoice, Tag, Workday
+from tests.helpers import create_database, remove_database, workday
+
+CUSTOMERS = 3
+
+CONFIG = Config(None)
+
+WORKDAYS = [workday('Export Company %d' % customer, 'Export Project',
+                    datetime(2019, 1, 1, 8) + timedelta(days=day), 7.5, ['Worked on day %d' % day])
+            for customer in range(CUSTOMERS) for day in range(10)]
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db, self.db_name = create_database(WORKDAYS)
+
+    def tearDown(self):
+        self.db.session.close()
+        remove_database(self.db.engine.url.database)
+        invoice_folder = os.path.join(INVOICE_DIR, self.db_name)
+        if os.path.isdir(invoice_folder):
+            rmtree(invoice_folder)
+
+    def export(self, **kwargs):
+        with redirect_stdout(StringIO()):
+            pdf_files = export_all_invoices(self.db, 2019, 'jan', CONFIG, **kwargs)
+        self.db.commit()
+        return pdf_files
+
+
+class TestExportAllCustomers(ExportTestCase):
+
+    def test_invoices_without_pdf(self):
+        self.assertEqual(self.export(), [])
+        invoices = self.db.session.query(Invoice).all()
+        self.assertEqual(len(invoices), CUSTOMERS)
+        self.assertEqual([len(invoice.workdays) for invoice in invoices], [10] * CUSTOMERS)
+
+    def test_parallel_pdf_export(self):
+        pdf_files = self.export(save_pdf=True, jobs=2)
+        self.assertEqual(len(pdf_files), CUSTOMERS)
+        for invoice in self.db.session.query(Invoice):
+            self.assertIn(invoice.pdf, pdf_files)
+            self.assertTrue(os.path.isfile(invoice.pdf))
+        # Unchanged months keep their invoices
+        self.export(save_pdf=True, jobs=1)
+        self.assertEqual(self.db.session.query(Invoice).count(), CUSTOMERS)
+
+    def test_workers_use_configured_database_settings(self):
+        config = Config(None)
+        config.values.busy_timeout.value = 1234
+        with patch('stamp.export.Database', wraps=Database) as database, redirect_stdout(StringIO()):
+            export_all_invoices(self.db, 2019, 'jan', config, save_pdf=True, jobs=1)
+        self.db.commit()
+        self.assertEqual(database.call_count, CUSTOMERS)
+        for call in database.call_args_list:
+            self.assertEqual(call[1]['profile']['busy_timeout'], 1234)
+
+
+class TestPdfFingerprint(ExportTestCase):
+
+    def rendered_times(self):
+        return {invoice.id: os.stat(invoice.pdf).st_mtime_ns
+                for invoice in self.db.session.query(Invoice)}
+
+    def test_unchanged_invoices_are_reused(self):
+        self.export(save_pdf=True, jobs=1)
+        rendered = self.rendered_times()
+        self.assertTrue(all(invoice.fingerprint for invoice in self.db.session.query(Invoice)))
+        self.export(save_pdf=True, jobs=1)
+        self.assertEqual(self.rendered_times(), rendered)
+
+    def test_changed_tag_renders_again(self):
+        self.export(save_pdf=True, jobs=1)
+        rendered = self.rendered_times()
+        tag = self.db.session.query(Tag).first()
+        changed_invoice = tag.workday.invoice.id
+        tag.tag = 'Changed'
+        self.db.commit()
+        self.export(save_pdf=True, jobs=1)
+        after = self.rendered_times()
+        self.assertNotEqual(after.pop(changed_invoice), rendered.pop(changed_invoice))
+        self.assertEqual(after, rendered)
+
+    def test_force(self):
+        self.export(save_pdf=True, jobs=1)
+        rendered = self.rendered_times()
+        self.export(save_pdf=True, jobs=1, force=True)
+        after = self.rendered_times()
+        self.assertTrue(all(after[invoice_id] != rendered[invoice_id] for invoice_id in rendered))
+
+
+class TestTagQueries(ExportTestCase):
+
+    def test_tags_read_once(self):
+        self.export()
+        invoice = self.db.session.query(Invoice).first()
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        save_dir = mkdtemp()
+        event.listen(self.db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            create_pdf(invoice.workdays, save_dir, CONFIG, invoice.id)
+        finally:
+            event.remove(self.db.engine, 'before_cursor_execute', before_cursor_execute)
+            rmtree(save_dir)
+        self.assertEqual(len([statement for statement in statements if 'FROM tag' in statement]), 1)
+
+
+class TestInvoiceDrift(ExportTestCase):
+
+    def drift(self):
+        export_filter = GetExportFilter(self.db, 2019, 'jan', 'Export Company 0', None)
+        workdays = month_workdays(self.db, export_filter)
+        invoice = self.db.get_related_invoice(2019, export_filter.month, export_filter.customer.id)
+        return [(change, row.id) for change, row in self.db.get_invoice_drift(invoice, workdays)]
+
+    def test_drift(self):
+        self.export()
+        self.assertEqual(self.drift(), [])
+        workdays = self.db.session.query(Workday).filter(Workday.customer_id == 1).order_by(Workday.start).all()
+        changed, removed = workdays[0], workdays[1]
+        changed.end += timedelta(hours=1)
+        removed.start += timedelta(days=40)
+        removed.end += timedelta(days=40)
+        added = Workday(customer_id=1, project_id=changed.project_id,
+                        start=datetime(2019, 1, 20, 8), end=datetime(2019, 1, 20, 12))
+        self.db.add(added)
+        self.db.commit()
+        self.assertEqual(sorted(self.drift()),
+                         [('added', added.id), ('changed', changed.id), ('removed', removed.id)])
+        # Refreshing creates a new invoice that matches again
+        self.export()
+        self.assertEqual(self.drift(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
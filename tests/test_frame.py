@@ -0,0 +1,69 @@
+import sys
+import unittest
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+
+sys.path.append('../stamp')
+
+from stamp.rollup import get_summary # NOQA
+from stamp.helpers import calculate_workhours
+from stamp.mappings import Workday
+from tests.helpers import create_database, remove_database, workday
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+WORKDAYS = [workday('Frame Company %d' % customer, 'Frame Project',
+                    datetime(2018, 12, 1, 8) + timedelta(days=day), 7.5)
+            for customer in range(3) for day in range(40)]
+
+
+@unittest.skipUnless(numpy, 'numpy is not installed')
+class TestWorkdayFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.db, self.db_name = create_database(WORKDAYS)
+
+    def tearDown(self):
+        self.db.session.close()
+        remove_database(self.db.engine.url.database)
+
+    def test_hours_match_workdays(self):
+        frame = self.db.load_workday_frame()
+        workdays = self.db.session.query(Workday).order_by(Workday.start, Workday.id).all()
+        self.assertEqual(list(frame.id), [workday.id for workday in workdays])
+        self.assertEqual(list(frame.hours()),
+                         [calculate_workhours(workday.start, workday.end) for workday in workdays])
+        self.assertEqual(frame.total_hours(), 3 * 40 * 7.5)
+
+    def test_group_by_matches_rollup(self):
+        frame = self.db.load_workday_frame(since=date(2019, 1, 1), until=date(2019, 12, 31))
+        self.assertEqual(frame.group_by('customer'), get_summary(self.db, 2019, 'customer'))
+        self.assertEqual(frame.group_by('month'), get_summary(self.db, 2019, 'month'))
+
+    def test_since_and_until_days_are_included(self):
+        frame = self.db.load_workday_frame(since=date(2018, 12, 31), until=date(2019, 1, 1))
+        self.assertEqual(len(frame), 3 * 2)
+        self.assertEqual(len(self.db.load_workday_frame(until=date(2018, 12, 1))), 3)
+
+    def test_group_by_week(self):
+        frame = self.db.load_workday_frame(customer_id=1)
+        weeks = defaultdict(int)
+        for workday in self.db.session.query(Workday).filter(Workday.customer_id == 1):
+            monday = workday.start.date().toordinal() - workday.start.weekday()
+            weeks[str(workday.start.date().fromordinal(monday))] += 1
+        self.assertEqual([(week, count) for week, seconds, count in frame.group_by('week')],
+                         sorted(weeks.items()))
+
+    def test_missing_end_is_left_out(self):
+        workday = self.db.session.query(Workday).first()
+        workday.end = None
+        self.db.commit()
+        self.assertEqual(len(self.db.load_workday_frame()), 3 * 40 - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
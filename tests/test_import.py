@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import unittest
+import subprocess
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from datetime import date
+from unittest.mock import patch
+from uuid import uuid4
+from contextlib import redirect_stdout
+
+sys.path.append('../stamp')
+
+from stamp.constants import DATA_DIR # NOQA
+from stamp.db import Database
+from stamp.importer import import_workdays
+from stamp.dump import dump_workdays
+from stamp.config import Config
+from stamp.exceptions import InvalidImportRowError
+from stamp.mappings import Workday, Customer, Project, Tag
+
+TESTING_DB = 'test_%s' % uuid4().hex
+TESTING_DB_PATH = os.path.join(DATA_DIR, TESTING_DB) + '.db'
+
+CSV_FILE = '''customer,project,start,end,tags
+Import Company,Import Project,2019-01-01 08:00,2019-01-01 16:00,"Fixed the VPN
+Wrote docs"
+Import Company,Other Project,2019-01-02 08:00,2019-01-02 12:30,
+Second Company,Import Project,2019-01-03 09:00,2019-01-03 10:00,Meeting
+'''
+
+
+class TestImport(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(TESTING_DB_PATH, ask=False)
+
+    def tearDown(self):
+        self.db.session.close()
+        os.remove(TESTING_DB_PATH)
+
+    def import_file(self, content, file_format, batch_size=2):
+        with redirect_stdout(StringIO()):
+            result = import_workdays(self.db, StringIO(content), file_format, batch_size)
+        self.db.commit()
+        return result
+
+    def test_csv_import(self):
+        self.assertEqual(self.import_file(CSV_FILE, 'csv'), (3, 3))
+        self.assertEqual(self.db.session.query(Customer).count(), 2)
+        # Projects are per customer
+        self.assertEqual(self.db.session.query(Project).count(), 3)
+        workday = self.db.session.query(Workday).get(1)
+        self.assertEqual(workday.customer.name, 'Import Company')
+        self.assertEqual([tag.tag for tag in workday.tags], ['Fixed the VPN', 'Wrote docs'])
+        self.assertEqual(self.db.session.query(Workday).get(3).tags.one().tag, 'Meeting')
+
+    def test_jsonl_import_reuses_existing_names(self):
+        self.import_file(CSV_FILE, 'csv')
+        rows = [{'customer': 'Import Company', 'project': 'Import Project',
+                 'start': '2019-02-0%d 08:00' % day, 'end': '2019-02-0%d 15:00' % day,
+                 'tags': [{'recorded': '2019-02-0%d 09:00' % day, 'tag': 'Day %d' % day}, 'Plain']}
+                for day in range(1, 6)]
+        content = '\n'.join(json.dumps(row) for row in rows)
+        self.assertEqual(self.import_file(content, 'jsonl'), (5, 10))
+        self.assertEqual(self.db.session.query(Customer).count(), 2)
+        self.assertEqual(self.db.session.query(Workday).filter(Workday.customer_id == 1).count(), 7)
+        tags = self.db.session.query(Tag).filter(Tag.tag == 'Day 5').one()
+        self.assertEqual(tags.workday.start.day, 5)
+
+    def test_invalid_row(self):
+        content = 'customer,project,start,end\nCompany,Project,2019-01-01 16:00,2019-01-01 08:00\n'
+        with self.assertRaises(InvalidImportRowError):
+            self.import_file(content, 'csv')
+
+
+class TestImportCommand(unittest.TestCase):
+
+    def tearDown(self):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.isfile(TESTING_DB_PATH + suffix):
+                os.remove(TESTING_DB_PATH + suffix)
+
+    def test_import_into_new_database_without_terminal(self):
+        with NamedTemporaryFile('w', suffix='.csv') as csv_file:
+            csv_file.write(CSV_FILE)
+            csv_file.flush()
+            result = subprocess.run([sys.executable, '-m', 'stamp.stamp', '--db', TESTING_DB,
+                                     'import', csv_file.name],
+                                    env=dict(os.environ, STAMP_NO_DAEMON='1'), stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    universal_newlines=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        db = Database(TESTING_DB_PATH, ask=False)
+        try:
+            self.assertEqual(db.session.query(Workday).count(), 3)
+        finally:
+            db.session.close()
+
+
+class TestDump(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(TESTING_DB_PATH, ask=False)
+        with redirect_stdout(StringIO()):
+            import_workdays(self.db, StringIO(CSV_FILE), 'csv')
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.session.close()
+        os.remove(TESTING_DB_PATH)
+
+    def dump(self, file_format, **filters):
+        output = StringIO()
+        dump_workdays(self.db, Config(None), output, file_format, **filters)
+        return output.getvalue()
+
+    def test_jsonl_dump(self):
+        records = [json.loads(line) for line in self.dump('jsonl').splitlines()]
+        self.assertEqual([record['id'] for record in records], [1, 2, 3])
+        self.assertEqual(records[1]['hours'], 4.5)
+        self.assertEqual(records[0]['customer'], 'Import Company')
+        self.assertEqual([tag['tag'] for tag in records[0]['tags']], ['Fixed the VPN', 'Wrote docs'])
+
+    def test_filters(self):
+        records = self.dump('jsonl', customer='Second Company').splitlines()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(self.dump('jsonl', customer='Nobody'), '')
+        records = [json.loads(line) for line in self.dump('jsonl', since=date(2019, 1, 2)).splitlines()]
+        self.assertEqual([record['id'] for record in records], [2, 3])
+
+    def test_dump_continues_across_batches(self):
+        with patch('stamp.dump.BATCH_SIZE', 2):
+            records = [json.loads(line) for line in self.dump('jsonl').splitlines()]
+        self.assertEqual([record['id'] for record in records], [1, 2, 3])
+
+    def test_csv_dump_can_be_imported(self):
+        dumped = self.dump('csv')
+        with redirect_stdout(StringIO()):
+            self.assertEqual(import_workdays(self.db, StringIO(dumped), 'csv'), (3, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
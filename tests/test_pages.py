@@ -0,0 +1,64 @@
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.append('../stamp')
+
+from stamp.mappings import Workday # NOQA
+from stamp.ui.pages import Pages, workday_rows, WORKDAY_KEY, FIRST, LAST
+from tests.helpers import create_database, remove_database, workday
+
+
+# Pairs of workdays share a start so the id has to break the tie
+WORKDAYS = [workday('Pages Company', 'Pages Project %d' % (day % 3),
+                    datetime(2019, 1, 1, 8) + timedelta(days=day // 2), 2)
+            for day in range(250)]
+
+
+class TestPages(unittest.TestCase):
+
+    def setUp(self):
+        self.db, self.db_name = create_database(WORKDAYS)
+        self.ids = [row.id for row in self.db.session.query(Workday.id).order_by(Workday.start, Workday.id)]
+        self.pages = Pages(self.db, workday_rows, WORKDAY_KEY, page_size=20, kept_pages=2)
+
+    def tearDown(self):
+        self.pages.close()
+        self.db.session.close()
+        remove_database(self.db.engine.url.database)
+
+    def walk(self, position, step):
+        ids = []
+        window = 0
+        while True:
+            row = self.pages.get(position)
+            if row is None:
+                return ids, window
+            ids.append(row.id)
+            self.pages.move_to(position)
+            window = max(window, len(self.pages.rows))
+            position += step
+
+    def test_walk_forward(self):
+        self.pages.load(FIRST)
+        ids, window = self.walk(self.pages.first_position(), 1)
+        self.assertEqual(ids, self.ids)
+        # Pages far behind the cursor are dropped
+        self.assertLessEqual(window, 20 * 6)
+        self.assertEqual(self.pages.last_position(), len(self.ids) - 1)
+
+    def test_walk_backward_from_last(self):
+        self.pages.load(LAST)
+        ids, window = self.walk(self.pages.last_position(), -1)
+        self.assertEqual(ids[::-1], self.ids)
+        self.assertLessEqual(window, 20 * 6)
+
+    def test_jump_past_window(self):
+        self.pages.load(FIRST)
+        self.assertEqual(self.pages.get(130).id, self.ids[130])
+        self.assertIsNone(self.pages.get(len(self.ids)))
+        self.assertIsNone(self.pages.get(-1))
+
+
+if __name__ == '__main__':
+    unittest.main()
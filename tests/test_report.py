@@ -0,0 +1,90 @@
+import sys
+import unittest
+from io import StringIO
+from argparse import Namespace
+from contextlib import redirect_stdout
+from datetime import datetime, date, time, timedelta
+
+sys.path.append('../stamp')
+
+from stamp.db import Database # NOQA
+from stamp.main import report
+from stamp.report import get_report
+from stamp.mappings import Workday, Invoice
+from stamp.exceptions import NoMatchingDatabaseEntryError
+from tests.helpers import create_database, remove_database, workday
+
+
+# Two customers, 2019-01-01 (a Tuesday) to 2019-02-09, 08:00-15:30,
+# the second customer starts at 12:00 on its odd days
+WORKDAYS = [workday('Report Company %d' % customer, 'Report Project %d' % (day % 2),
+                    datetime(2019, 1, 1, 12 if customer and day % 2 else 8) + timedelta(days=day), 7.5)
+            for customer in range(2) for day in range(40)]
+
+
+class TestReport(unittest.TestCase):
+
+    def setUp(self):
+        self.db, self.db_name = create_database(WORKDAYS)
+
+    def tearDown(self):
+        self.db.session.close()
+        remove_database(self.db.engine.url.database)
+
+    def test_month_per_customer(self):
+        hours = 7.5 * 60 * 60
+        self.assertEqual(get_report(self.db),
+                         [('2019-01', 'Report Company 0', 31 * hours, 31),
+                          ('2019-01', 'Report Company 1', 31 * hours, 31),
+                          ('2019-02', 'Report Company 0', 9 * hours, 9),
+                          ('2019-02', 'Report Company 1', 9 * hours, 9)])
+
+    def test_week_per_project(self):
+        rows = get_report(self.db, 'week', 'project', customer='Report Company 0')
+        self.assertEqual(rows[:2], [('2018-12-31', 'Report Company 0 / Report Project 0', 3 * 27000, 3),
+                                    ('2018-12-31', 'Report Company 0 / Report Project 1', 3 * 27000, 3)])
+        self.assertEqual(rows[2][0], '2019-01-07')
+        self.assertEqual(sum(row[3] for row in rows), 40)
+
+    def test_date_and_time_filters(self):
+        rows = get_report(self.db, 'year', 'customer', date_from=date(2019, 1, 10),
+                          date_to=date(2019, 1, 19))
+        self.assertEqual([row[3] for row in rows], [10, 10])
+        rows = get_report(self.db, 'year', 'customer', time_to=time(16))
+        self.assertEqual([row[3] for row in rows], [40, 20])
+        rows = get_report(self.db, 'year', 'customer', time_from=time(12))
+        self.assertEqual([row[1:] for row in rows], [('Report Company 1', 20 * 27000, 20)])
+
+    def test_paid_state(self):
+        invoice = Invoice(customer_id=1, paid=True, year=2019, month='January')
+        self.db.add(invoice)
+        self.db.session.flush()
+        self.db.session.query(Workday).filter(Workday.customer_id == 1,
+                                              Workday.start < datetime(2019, 2, 1)).update(
+                                                  {'invoice_id': invoice.id})
+        self.db.commit()
+        self.db.session.expunge_all()
+        rows = get_report(self.db, 'year', 'paid')
+        self.assertEqual([(row[1], row[3]) for row in rows], [('Not invoiced', 49), ('Paid', 31)])
+        # Only aggregate rows are read, no workdays are loaded
+        self.assertEqual(len(self.db.session.identity_map), 0)
+
+    def test_unknown_customer(self):
+        with self.assertRaises(NoMatchingDatabaseEntryError):
+            get_report(self.db, customer='Nobody')
+
+    def test_new_database_is_not_reported(self):
+        db_path = self.db.engine.url.database[:-len('.db')] + '_new.db'
+        args = Namespace(db=Database(db_path, ask=False))
+        output = StringIO()
+        try:
+            with redirect_stdout(output), self.assertRaises(SystemExit):
+                report(args)
+        finally:
+            args.db.session.close()
+            remove_database(db_path)
+        self.assertIn('cannot be run before the selected database is populated', output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import sys
+import unittest
+from io import StringIO
+from contextlib import redirect_stdout
+from datetime import datetime, date, time, timedelta
+
+sys.path.append('../stamp')
+
+from stamp.delete import delete_workday_or_tag # NOQA
+from stamp.mappings import Tag
+from stamp.search import search_tags, rebuild_search_index
+from stamp.status import SearchResults
+from stamp.exceptions import InvalidSearchQueryError
+from tests.helpers import create_database, remove_database, workday
+
+TAGS = ['Meeting with the café team',
+        'Fixed bug-123 in the parser',
+        'Parser review meeting',
+        'Deployed the new parser']
+
+
+# One workday a day from 2019-01-01, alternating between two customers
+WORKDAYS = [workday('Search Company %d' % (day % 2), 'Search Project',
+                    datetime(2019, 1, 1, 8) + timedelta(days=day), 8, [tag])
+            for day, tag in enumerate(TAGS)]
+
+
+class TestSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.db, self.db_name = create_database(WORKDAYS)
+
+    def tearDown(self):
+        self.db.session.close()
+        remove_database(self.db.engine.url.database)
+
+    def tags(self, query, **kwargs):
+        return [row.tag for row in search_tags(self.db, query, **kwargs)]
+
+    def test_words(self):
+        self.assertCountEqual(self.tags('meeting'), ['Meeting with the café team', 'Parser review meeting'])
+        # Every word has to match, in any order
+        self.assertEqual(self.tags('meeting parser'), ['Parser review meeting'])
+        self.assertEqual(self.tags('cafe'), ['Meeting with the café team'])
+        self.assertEqual(self.tags('bug-123'), ['Fixed bug-123 in the parser'])
+        self.assertEqual(self.tags('meet'), [])
+
+    def test_prefix(self):
+        self.assertCountEqual(self.tags('meet*'), ['Meeting with the café team', 'Parser review meeting'])
+        self.assertEqual(self.tags('dep* pars*'), ['Deployed the new parser'])
+
+    def test_rank(self):
+        self.db.session.add(Tag(recorded=datetime(2019, 1, 5, 9), tag='parser parser parser',
+                                workday_id=1))
+        self.db.commit()
+        self.assertEqual(self.tags('parser')[0], 'parser parser parser')
+        self.assertEqual(self.tags('parser', order='date'), ['Deployed the new parser',
+                                                             'Parser review meeting',
+                                                             'Fixed bug-123 in the parser',
+                                                             'parser parser parser'])
+        self.assertEqual(len(self.tags('parser', limit=2)), 2)
+
+    def test_filters(self):
+        self.assertEqual(self.tags('parser', order='date', date_from=date(2019, 1, 3)),
+                         ['Deployed the new parser', 'Parser review meeting'])
+        self.assertEqual(self.tags('parser', order='date', date_to=date(2019, 1, 3)),
+                         ['Parser review meeting', 'Fixed bug-123 in the parser'])
+        self.assertEqual(self.tags('parser', order='date', customer='Search Company 1'),
+                         ['Deployed the new parser', 'Fixed bug-123 in the parser'])
+        self.assertEqual(self.tags('parser', project='Search Project', time_from=time(9)), [])
+        self.assertEqual(self.tags('parser', customer='No Company'), [])
+
+    def test_result(self):
+        row = search_tags(self.db, 'cafe')[0]
+        self.assertEqual((row.workday_id, row.customer, row.project, row.invoice_id),
+                         (1, 'Search Company 0', 'Search Project', None))
+        self.assertEqual(row.start, datetime(2019, 1, 1, 8))
+        self.assertIn('Not invoiced', str(SearchResults([row])))
+
+    def test_triggers(self):
+        tag = self.db.session.query(Tag).filter(Tag.tag == 'Deployed the new parser').one()
+        tag.tag = 'Released the new parser'
+        self.db.commit()
+        self.assertEqual(self.tags('deployed'), [])
+        self.assertEqual(self.tags('released'), ['Released the new parser'])
+        with redirect_stdout(StringIO()):
+            delete_workday_or_tag(self.db, None, tag.id, force=True)
+        self.db.commit()
+        self.assertEqual(self.tags('released'), [])
+        # Rebuilding gives the same index
+        rebuild_search_index(self.db.session.connection())
+        self.db.commit()
+        self.assertCountEqual(self.tags('parser'), ['Fixed bug-123 in the parser', 'Parser review meeting'])
+
+    def test_query_syntax(self):
+        # Plain words are never read as FTS5 syntax
+        self.assertEqual(self.tags('"parser" OR ('), [])
+        self.assertEqual(len(self.tags('meeting OR deployed', raw=True)), 3)
+        with self.assertRaises(InvalidSearchQueryError):
+            search_tags(self.db, 'meeting AND (', raw=True)
+        with self.assertRaises(InvalidSearchQueryError):
+            search_tags(self.db, ' * ')
+
+
+if __name__ == '__main__':
+    unittest.main()
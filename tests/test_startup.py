@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import unittest
+import subprocess
+from time import perf_counter
+from tempfile import mkdtemp
+from shutil import rmtree
+
+sys.path.append('../stamp')
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('reportlab', 'curses', '_curses', 'yaml')
+
+POPULATE_SCRIPT = '''
+from datetime import datetime
+from stamp.db import Database
+from stamp.add import new_stamp
+from stamp.end import end_stamp
+db = Database(%r, ask=False)
+now = datetime.now()
+new_stamp(db, 'Startup Company', 'Startup Project', now.date(), now.time(), ask=False)
+end_stamp(db, now.date(), now.time())
+db.commit()
+'''
+
+# The browser needs a terminal, a stand-in reads the database instead
+PROFILE_BROWSER_SCRIPT = '''
+import curses
+from stamp.stamp import run
+curses.wrapper = lambda interface, db: db.session.execute('SELECT count(*) FROM workday').scalar()
+run(['--profile-output', %r])
+'''
+
+
+class TestStartupImports(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.home = mkdtemp()
+        cls.env = {key: value for key, value in os.environ.items()
+                   if not key.startswith(('XDG_', 'STAMP_'))}
+        cls.env.update(HOME=cls.home, PYTHONPATH=PACKAGE_DIR)
+        db_dir = os.path.join(cls.home, '.local/share/stamp')
+        os.makedirs(db_dir)
+        subprocess.run([sys.executable, '-c', POPULATE_SCRIPT % os.path.join(db_dir, 'default.db')],
+                       env=cls.env, check=True, stdout=subprocess.DEVNULL)
+
+    @classmethod
+    def tearDownClass(cls):
+        rmtree(cls.home)
+
+    def imported_modules(self, *args):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'stamp.stamp'] + list(args),
+                                env=self.env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, universal_newlines=True, cwd=self.home)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        modules = set()
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                modules.add(line.split('|')[-1].strip().split('.')[0])
+        return modules
+
+    def test_stamp_in_and_out_skip_heavy_modules(self):
+        for command in ('in', 'out'):
+            modules = self.imported_modules(command)
+            self.assertIn('sqlalchemy', modules)
+            for module in HEAVY_MODULES:
+                self.assertNotIn(module, modules, '`stamp %s` imported %s' % (command, module))
+
+    def test_yaml_only_imported_with_config_file(self):
+        config_file = os.path.join(self.home, 'config')
+        with open(config_file, 'w') as config:
+            config.write('currency: NOK\n')
+        try:
+            modules = self.imported_modules('--config', config_file, 'in')
+        finally:
+            os.remove(config_file)
+        self.assertIn('yaml', modules)
+        self.assertNotIn('reportlab', modules)
+
+    def test_config_snapshot_skips_yaml(self):
+        config_file = os.path.join(self.home, 'snapshot-config')
+        with open(config_file, 'w') as config:
+            config.write('currency: ISK\n')
+        try:
+            self.assertIn('yaml', self.imported_modules('--config', config_file, 'status', 'summary'))
+            self.assertNotIn('yaml', self.imported_modules('--config', config_file, 'status', 'summary'))
+            # Editing the file invalidates the snapshot
+            with open(config_file, 'a') as config:
+                config.write('wage_per_hour: 500\n')
+            self.assertIn('yaml', self.imported_modules('--config', config_file, 'status', 'summary'))
+        finally:
+            os.remove(config_file)
+
+    def test_profile(self):
+        profile_file = os.path.join(self.home, 'profile.json')
+        self.imported_modules('--profile-output', profile_file, 'status', 'workdays')
+        with open(profile_file) as profile_output:
+            profile = json.load(profile_output)
+        self.assertEqual(list(profile['phases_ms']),
+                         ['import', 'parse', 'config', 'database', 'command', 'commit'])
+        self.assertGreater(profile['sql']['statements'], 0)
+        self.assertEqual(profile['sql']['objects_loaded'], {'Workday': 1, 'Customer': 1, 'Project': 1})
+        self.assertTrue(profile['functions'])
+        result = subprocess.run([sys.executable, '-m', 'stamp.stamp', '--profile', 'status'],
+                                env=self.env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, universal_newlines=True, cwd=self.home)
+        self.assertIn('Slowest statements:', result.stderr)
+
+    def test_profile_browser(self):
+        profile_file = os.path.join(self.home, 'browser-profile.json')
+        subprocess.run([sys.executable, '-c', PROFILE_BROWSER_SCRIPT % profile_file],
+                       env=self.env, check=True, cwd=self.home, stdin=subprocess.DEVNULL)
+        with open(profile_file) as profile_output:
+            profile = json.load(profile_output)
+        self.assertIn('command', profile['phases_ms'])
+        self.assertIn('SELECT count(*) FROM workday', [statement['statement']
+                                                       for statement in profile['sql']['slowest']])
+
+
+class TestConfigOptions(unittest.TestCase):
+
+    def test_only_built_for_config_command(self):
+        from stamp.args import _config_requested
+        self.assertTrue(_config_requested(['config', 'edit']))
+        self.assertTrue(_config_requested(['--db', 'work', 'c', 'edit']))
+        self.assertFalse(_config_requested(['in', '-c', 'c']))
+        self.assertFalse(_config_requested(['tag', 'c']))
+        self.assertFalse(_config_requested(['--db', 'config', 'status']))
+        self.assertFalse(_config_requested([]))
+
+    def test_database_defaults_match_config_defaults(self):
+        from stamp.config import Config, engine_profile, ENGINE_DEFAULTS
+        self.assertEqual(engine_profile(Config(None)), ENGINE_DEFAULTS)
+
+
+class TestConfigSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.config_file = os.path.join(self.directory, 'config')
+        self.cache_file = os.path.join(self.directory, 'cache', 'config.pickle')
+        with open(self.config_file, 'w') as config:
+            config.write('currency: USD\nwage_per_hour: 450\n')
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_snapshot_matches_config(self):
+        from stamp.config import load_config
+        built = load_config(self.config_file, self.cache_file)
+        cached = load_config(self.config_file, self.cache_file)
+        self.assertIsNot(built, cached)
+        self.assertEqual({key: value.value for key, value in cached.values.__dict__.items()},
+                         {key: value.value for key, value in built.values.__dict__.items()})
+        self.assertEqual(cached.values.currency.value, 'USD')
+        self.assertEqual(cached.values.wage_per_hour.value, 450)
+
+    def test_snapshot_is_faster(self):
+        from stamp.config import Config, load_config
+
+        def best_time(function, *args):
+            times = []
+            for _ in range(20):
+                started = perf_counter()
+                function(*args)
+                times.append(perf_counter() - started)
+            return min(times)
+
+        load_config(self.config_file, self.cache_file)
+        build = best_time(Config, self.config_file)
+        snapshot = best_time(load_config, self.config_file, self.cache_file)
+        self.assertLess(snapshot, build)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import unittest
+import threading
+from io import StringIO
+from uuid import uuid4
+from tempfile import mkdtemp
+from shutil import rmtree
+from datetime import datetime, timedelta
+from contextlib import redirect_stdout
+
+sys.path.append('../stamp')
+
+from stamp.constants import DATA_DIR # NOQA
+from stamp.db import Database
+from stamp.add import new_stamp
+from stamp.end import end_stamp
+from stamp.tag import tag_stamp
+from stamp.config import Config
+from stamp.watch import watch_current_stamp, format_state
+
+TESTING_DB_PATH = os.path.join(DATA_DIR, 'test_%s' % uuid4().hex) + '.db'
+CONFIG = Config(None)
+
+
+class Lines(object):
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.extend(text.splitlines())
+
+    def flush(self):
+        pass
+
+    def wait_for(self, count, timeout=5):
+        deadline = time.time() + timeout
+        while len(self.lines) < count and time.time() < deadline:
+            time.sleep(0.01)
+        return [json.loads(line) for line in self.lines]
+
+
+class TestWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(TESTING_DB_PATH, ask=False)
+        now = datetime.now()
+        with redirect_stdout(StringIO()):
+            new_stamp(self.db, 'Watch Company', 'Watch Project', now.date(), now.time(), ask=False)
+            end_stamp(self.db, now.date(), now.time())
+        self.db.commit()
+        self.directory = mkdtemp()
+
+    def tearDown(self):
+        self.db.session.close()
+        rmtree(self.directory)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.isfile(TESTING_DB_PATH + suffix):
+                os.remove(TESTING_DB_PATH + suffix)
+
+    def test_prints_on_changes_only(self):
+        sidecar = os.path.join(self.directory, 'current')
+        lines = Lines()
+        watcher_db = Database(TESTING_DB_PATH, ask=False)
+        watcher = threading.Thread(target=watch_current_stamp,
+                                   args=(watcher_db, CONFIG, 'json', 0.01, sidecar, lines, 3))
+        watcher.start()
+        try:
+            self.assertEqual(lines.wait_for(1), [{'stamped_in': False}])
+            # Nothing changes, nothing is printed
+            time.sleep(0.1)
+            self.assertEqual(len(lines.lines), 1)
+
+            start = datetime.now() - timedelta(hours=2)
+            with redirect_stdout(StringIO()):
+                new_stamp(self.db, 'Watch Company', 'Watch Project', start.date(), start.time(), ask=False)
+            self.db.commit()
+            stamped_in = lines.wait_for(2)[1]
+            self.assertEqual(stamped_in['customer'], 'Watch Company')
+            self.assertEqual(stamped_in['tags'], 0)
+            self.assertAlmostEqual(stamped_in['elapsed_hours'], 2, places=1)
+
+            with redirect_stdout(StringIO()):
+                tag_stamp(self.db, datetime.now().date(), datetime.now().time(),
+                          self.db.current_stamp(), 'Watched')
+            self.db.commit()
+            self.assertEqual(lines.wait_for(3)[2]['tags'], 1)
+        finally:
+            watcher.join(5)
+            watcher_db.session.close()
+        self.assertFalse(watcher.is_alive())
+        with open(sidecar) as sidecar_file:
+            self.assertEqual(sidecar_file.read(), lines.lines[-1] + '\n')
+
+    def test_text_ticks_elapsed_time(self):
+        state = {'id': 1, 'start': datetime(2019, 1, 1, 8), 'customer': 'C', 'project': 'P', 'tags': 2}
+        self.assertNotEqual(format_state(state, CONFIG, now=datetime(2019, 1, 1, 9)),
+                            format_state(state, CONFIG, now=datetime(2019, 1, 1, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()